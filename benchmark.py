@@ -1,67 +1,59 @@
-import random
+from collections import defaultdict
+from pathlib import Path
+from timeit import default_timer as timer
 
 from tqdm import tqdm
 
+from game.adjudication import Adjudicator  # noqa
 from game.bot import HeuristicsBot  # noqa
 from game.bot import RandomBot
 from game.components import Board
 from game.components import Colors
-from game.components import Dice
-from game.rules import win_condition
-from game.td_model import TDBot
+from game.evaluator import NumpyEvaluator
+from game.evaluator import QuantizedEvaluator
+from game.match import recorded_decisions
+from game.search import DICE_ROLLS
+from game.search import ExpectimaxSearch
+from game.sprt import SPRT  # noqa
 from game.td_model import TDNardiModel
-
-
-def test_bots(bot_type, num_games=10):
-    board = Board()
-
-    bots = {
-        Colors.WHITE: bot_type(Colors.WHITE),
-        Colors.BLACK: TDBot(Colors.BLACK),
-    }
-
-    scores = {Colors.WHITE: 0, Colors.BLACK: 0}
+from game.tournament import BotPlayer
+from game.tournament import NetworkPlayer
+from game.tournament import Tournament
+
+
+def test_bots(bot_type, num_games=10, num_workers=None, sprt=None, adjudicator=None):
+    """
+    <num_games> pairs of games of <bot_type> against the TD model (1-ply like TDBot),
+    played by <num_workers> processes (see Tournament)
+    with an <sprt> (see game.sprt) games stop once the test decides,
+    with an <adjudicator> (see game.adjudication) decided games are not played out
+    """
+    model = TDNardiModel()
+    model.restore()
 
     print()
-    print(f'Starting bot test for {num_games} games')
-
-    pbar = tqdm(range(num_games))
-    for i in pbar:
-
-        def _run_game(dice, starting_color):
-            board.reset()
-            last_color = Colors.opponent(starting_color)
-
-            while win_condition(board, last_color) is None:
-                color_to_move = Colors.opponent(last_color)
-                dice_roll = dice.throw()
-
-                player_move = bots[color_to_move].find_a_move(board, dice_roll)
-
-                # make move
-                if player_move:
-                    for m in player_move:
-                        board.do_single_move(m)
-
-                last_color = color_to_move
+    print(f'Starting bot test for {num_games} pairs of games')
 
-                pbar.set_postfix(
-                    {
-                        'games': i,
-                        type(bots[Colors.WHITE]).__name__: scores[Colors.WHITE],
-                        type(bots[Colors.BLACK]).__name__: scores[Colors.BLACK],
-                    }
-                )
-
-            scores[last_color] += win_condition(board, last_color)
-
-        seed = random.randint(1, 10000)
-        _run_game(dice=Dice(seed=seed), starting_color=Colors.WHITE)
-        _run_game(dice=Dice(seed=seed), starting_color=Colors.BLACK)
+    with Tournament(
+        BotPlayer(bot_type), NetworkPlayer(model.model.get_weights()), num_workers
+    ) as tournament:
+        result = tournament.play(num_games, sprt=sprt, adjudicator=adjudicator)
 
+    win_low, win_high = result.win_ratio_interval
+    score_low, score_high = result.score_ratio_interval
     print(
-        f'{type(bots[Colors.WHITE]).__name__} vs {type(bots[Colors.BLACK]).__name__}: {scores[Colors.WHITE]}:{scores[Colors.BLACK]}'
+        f'{bot_type.__name__} vs TDBot: {result.score}:{result.opponent_score}, '
+        f'win ratio {result.win_ratio:.2f} [{win_low:.2f}, {win_high:.2f}], '
+        f'score ratio {result.score_ratio:.2f} [{score_low:.2f}, {score_high:.2f}]'
     )
+    if sprt is not None:
+        print(
+            f'SPRT: {result.decision or "undecided"} after {result.games} games, '
+            f'{result.games_saved} games saved'
+        )
+    if adjudicator is not None:
+        print(f'{result.adjudicated} of {result.games} games adjudicated')
+    return result
 
 
 def equity():
@@ -93,8 +85,65 @@ def equity():
     print(f'black_to_mars_equity : {black_to_mars_equity}')
 
 
+def position_decisions(folder=Path('data') / 'board_positions'):
+    """
+    every saved position with every roll for both colors
+    """
+    decisions = []
+    for file_path in sorted(Path(folder).glob('*.pos')):
+        with open(file_path, 'r') as f:
+            position = [line.strip() for line in f if line.strip()]
+        for color in Colors.colors:
+            for dice_roll in DICE_ROLLS:
+                decisions.append((position, color, dice_roll))
+    return decisions
+
+
+def quantized_move_agreement(mode='int8', decisions=None):
+    """
+    share of decisions where the quantized network picks a different move
+    than the float32 one, on recorded games and saved positions
+    """
+    model = TDNardiModel()
+    model.restore()
+    weights = model.model.get_weights()
+
+    searches = {
+        'float32': ExpectimaxSearch(NumpyEvaluator(weights)),
+        mode: ExpectimaxSearch(QuantizedEvaluator(weights, mode)),
+    }
+
+    decisions = decisions or recorded_decisions() + position_decisions()
+
+    num_decisions = 0
+    num_different = 0
+    durations = defaultdict(float)
+    for position, color, dice_roll in tqdm(decisions):
+        board = Board.generate_from_position(position)
+        moves = {}
+        for name, search in searches.items():
+            start = timer()
+            moves[name] = search.find_move(color, board, dice_roll)
+            durations[name] += timer() - start
+
+        if moves['float32'] is None:
+            continue
+        num_decisions += 1
+        num_different += moves['float32'] != moves[mode]
+
+    print(
+        f'{mode}: {num_different} of {num_decisions} decisions differ '
+        f'({num_different / max(num_decisions, 1):.2%}), time: {dict(durations)}'
+    )
+    return num_different / max(num_decisions, 1)
+
+
 if __name__ == '__main__':
 
     test_bots(RandomBot, 10)
     test_bots(HeuristicsBot, 10)
+    # test_bots(HeuristicsBot, 100, sprt=SPRT())
+    # test_bots(HeuristicsBot, 100, adjudicator=Adjudicator())
     equity()
+    # quantized_move_agreement('int8')
+    # quantized_move_agreement('float16')
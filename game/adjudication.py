@@ -0,0 +1,206 @@
+"""
+early adjudication of games whose outcome is (nearly) decided
+
+once no checker can meet an opponent's checker again (no contact) the game is
+a race. when both sides have all checkers home the race is looked up in a
+one-sided bear-off table (distribution of the number of turns each side needs
+to bear off, see bear_off_turns), other races are given to the side with a
+big enough pip lead. games with contact are played out unless a (larger)
+pip lead is given for them as well
+
+callers opt in by passing an Adjudicator to the game loop
+(see play_tournament_game, play_game)
+"""
+import functools
+from typing import Optional
+
+import numpy as np
+
+from game.components import Board
+from game.components import Colors
+from game.components import MAX_POSITION
+
+HOME_SIZE = 6
+# a turn moves at least 2 pips, 15 checkers on the furthest home point need 90
+MAX_TURNS = 46
+# pip counts of races are adjusted for the pips wasted bearing off every
+# checker and for the side on roll being half an average roll (8.17 pips) ahead
+WASTED_PIPS_PER_CHECKER = 2
+ON_ROLL_PIPS = 4
+ROLLS = [((a, b), (1 if a == b else 2) / 36) for a in range(1, 7) for b in range(a, 7)]
+
+
+def has_contact(board: Board) -> bool:
+    """
+    contact is over when both sides only have checkers in the second half
+    of their way (the opponent's first half is behind them)
+    """
+    half = MAX_POSITION // 2 + 1
+    return any(
+        board.num_checkers_before_position(color, half) for color in Colors.colors
+    )
+
+
+def home_counts(board: Board, color: str) -> tuple:
+    """
+    number of checkers of <color> on its home points, the furthest from the tray first
+    """
+    counts = []
+    for p in Board.HOME_POINTS:
+        slot = board.get_slot(color, p)
+        counts.append(slot.num_checkers if slot.color == color else 0)
+    return tuple(counts)
+
+
+def _play_die(counts: list, die: int):
+    # as the rules allow (see find_single_legal_moves): bear off a checker the die
+    # reaches exactly, otherwise move the furthest checker that can stay on the board,
+    # overshooting the tray only when no checker can
+    exact = HOME_SIZE - die
+    if counts[exact]:
+        counts[exact] -= 1
+        return
+    for i in range(exact):
+        if counts[i]:
+            counts[i] -= 1
+            counts[i + die] += 1
+            return
+    for i in range(exact + 1, HOME_SIZE):
+        if counts[i]:
+            counts[i] -= 1
+            return
+
+
+def _play_dice(counts: tuple, dice: tuple) -> tuple:
+    after = list(counts)
+    for die in dice * (2 if dice[0] == dice[1] else 1):
+        _play_die(after, die)
+    return tuple(after)
+
+
+def _bear_off_key(counts: tuple):
+    # fewer checkers left first, then fewer pips
+    return sum(counts), sum(n * (HOME_SIZE - i) for i, n in enumerate(counts))
+
+
+def _bear_off_roll(counts: tuple, dice: tuple) -> tuple:
+    return min(
+        (_play_dice(counts, order) for order in (dice, dice[::-1])), key=_bear_off_key
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def bear_off_turns(counts: tuple) -> np.ndarray:
+    """
+    probability of bearing off all checkers of <counts> (see home_counts)
+    in exactly n turns (index n), checkers are played greedily (see _play_die)
+    in the order of the dice that leaves fewer checkers (then pips).
+    the arrays are shared, don't change them
+    """
+    turns = np.zeros(MAX_TURNS)
+    if not any(counts):
+        turns[0] = 1
+        return turns
+
+    for dice, probability in ROLLS:
+        turns[1:] += probability * bear_off_turns(_bear_off_roll(counts, dice))[:-1]
+    return turns
+
+
+def bear_off_probability(counts: tuple, opponent_counts: tuple) -> float:
+    """
+    probability that the side to move with <counts> bears off first
+    """
+    opponent_turns = bear_off_turns(opponent_counts)
+    # the side to move wins if it needs at most as many turns as the opponent
+    at_least = np.cumsum(opponent_turns[::-1])[::-1]
+    return float(bear_off_turns(counts) @ at_least)
+
+
+def pips_to_home(board: Board, color: str) -> int:
+    """
+    pips <color> needs to bring all checkers home
+    """
+    home = Board.HOME_POINTS[0]
+    pips = 0
+    for p in range(1, home):
+        slot = board.get_slot(color, p)
+        if slot.color == color:
+            pips += (home - p) * slot.num_checkers
+    return pips
+
+
+def race_count(board: Board, color: str, color_to_move: str) -> float:
+    """
+    pip count of <color> adjusted for wastage and for being on roll
+    """
+    count = board.pip_count(color) + WASTED_PIPS_PER_CHECKER * board.num_checkers(color)
+    if color == color_to_move:
+        count -= ON_ROLL_PIPS
+    return count
+
+
+class Adjudicator:
+    """
+    <min_probability> - races looked up in the bear-off table are adjudicated
+    once one side wins them with at least this probability
+    <pip_lead> - other races are adjudicated when the (adjusted, see race_count)
+    pip count of one side is larger than the other's by this fraction,
+    None to play them out
+    <contact_pip_lead> - the same for positions with contact, None to play them out
+    (the side ahead by half of its pip count wins ~97% of RandomBot games)
+    <min_pips> - no pip lead is trusted while the leader has fewer pips than this,
+    short races are decided by a few rolls
+    """
+
+    def __init__(
+        self,
+        min_probability=0.99,
+        pip_lead: Optional[float] = 0.25,
+        contact_pip_lead: Optional[float] = None,
+        min_pips=30,
+    ):
+        self.min_probability = min_probability
+        self.pip_lead = pip_lead
+        self.contact_pip_lead = contact_pip_lead
+        self.min_pips = min_pips
+
+    def __call__(self, board: Board, color_to_move: str):
+        """
+        returns the winner and the score if the game can be adjudicated
+        before <color_to_move> moves, None otherwise
+        """
+        if has_contact(board):
+            return self._pip_lead_result(board, color_to_move, self.contact_pip_lead)
+
+        opponent = Colors.opponent(color_to_move)
+        if board.has_all_checkers_home(color_to_move) and board.has_all_checkers_home(
+            opponent
+        ):
+            probability = bear_off_probability(
+                home_counts(board, color_to_move), home_counts(board, opponent)
+            )
+            # the loser is home, no mars
+            if probability >= self.min_probability:
+                return color_to_move, 1
+            if 1 - probability >= self.min_probability:
+                return opponent, 1
+            return None
+
+        return self._pip_lead_result(board, color_to_move, self.pip_lead)
+
+    def _pip_lead_result(
+        self, board: Board, color_to_move: str, pip_lead: Optional[float]
+    ):
+        if pip_lead is None:
+            return None
+        counts = {
+            color: race_count(board, color, color_to_move) for color in Colors.colors
+        }
+        leader = min(Colors.colors, key=lambda color: counts[color])
+        loser = Colors.opponent(leader)
+        pips = board.pip_count(leader)
+        if pips < self.min_pips or counts[loser] < counts[leader] * (1 + pip_lead):
+            return None
+        # mars if the loser needs more pips to get home than the winner to finish
+        return leader, 2 if pips_to_home(board, loser) > pips else 1
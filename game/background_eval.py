@@ -0,0 +1,153 @@
+"""
+evaluation of training snapshots in a background process
+
+the training loop hands over a copy of the weights and the step it was taken at
+(see BackgroundEvaluation.submit) and carries on, the evaluation process
+computes the equity tests and plays against RandomBot and HeuristicsBot
+(see Tournament) and writes the same tests/* scalars as the models'
+test_* methods at that step
+
+results go to their own log folder, events written by two processes to one
+folder would reach tensorboard out of step order
+"""
+import queue
+
+import numpy as np
+
+from game.bot import HeuristicsBot
+from game.bot import RandomBot
+from game.components import Board
+from game.evaluator import NumpyEvaluator
+from game.parallel import MP_CONTEXT
+from game.telemetry import TensorBoardSink
+from game.tournament import BotPlayer
+from game.tournament import NetworkPlayer
+from game.tournament import Tournament
+
+BOTS = {'random': RandomBot, 'heuristics': HeuristicsBot}
+
+
+def equity_scalars(evaluator, equity_tests) -> dict:
+    """
+    <equity_tests> - (tag, position, turn), see TDNardiModel.EQUITY_TESTS
+    """
+    states = np.stack(
+        [
+            Board.generate_from_position(position).encode(turn)
+            for _, position, turn in equity_tests
+        ]
+    )
+    values = np.asarray(evaluator(states)).reshape(-1)
+    return {tag: float(v) for (tag, _, _), v in zip(equity_tests, values)}
+
+
+def snapshot_scalars(
+    tournament: Tournament,
+    weights,
+    equity_tests,
+    num_games,
+    bots=None,
+    adjudicator=None,
+) -> dict:
+    """
+    <bots> - name -> bot type, BOTS if None
+    <adjudicator> - decided games are not played out (see Adjudicator)
+    """
+    scalars = equity_scalars(NumpyEvaluator(weights), equity_tests)
+    for name, bot_type in (bots or BOTS).items():
+        result = tournament.play(
+            num_games, weights, opponent=BotPlayer(bot_type), adjudicator=adjudicator
+        )
+        scalars[f'tests/{name}_win_ratio'] = result.win_ratio
+        scalars[f'tests/{name}_score_ratio'] = result.score_ratio
+    return scalars
+
+
+def _evaluation_loop(snapshots, log_dir, equity_tests, num_games, bots, adjudicator):
+    # tensorflow is only needed for writing the summaries
+    import tensorflow as tf
+
+    sink = TensorBoardSink(tf.summary.create_file_writer(log_dir))
+    tournament = None
+    while True:
+        snapshot = snapshots.get()
+        if snapshot is None:
+            break
+
+        weights, step = snapshot
+        if tournament is None:
+            # a daemon process can't start a pool, games are played here
+            tournament = Tournament(
+                NetworkPlayer(weights), BotPlayer(RandomBot), num_workers=0
+            )
+        sink.write(
+            snapshot_scalars(
+                tournament, weights, equity_tests, num_games, bots, adjudicator
+            ),
+            {},
+            step,
+        )
+
+
+class BackgroundEvaluation:
+    """
+    one evaluation process writing to the tensorboard folder <log_dir>,
+    <num_games> pairs of games are played against every bot (see snapshot_scalars)
+
+    only the newest snapshot waits for evaluation, older ones are dropped
+    when training is faster than evaluation (counted in <dropped>),
+    with an <adjudicator> decided games are not played out
+    """
+
+    def __init__(
+        self, log_dir, equity_tests, num_games=10, bots=None, adjudicator=None
+    ):
+        self.dropped = 0
+        self._snapshots = MP_CONTEXT.Queue(maxsize=1)
+        self._process = MP_CONTEXT.Process(
+            target=_evaluation_loop,
+            args=(
+                self._snapshots,
+                str(log_dir),
+                equity_tests,
+                num_games,
+                bots,
+                adjudicator,
+            ),
+            daemon=True,
+        )
+        self._process.start()
+
+    def submit(self, weights: list[np.ndarray], step: int):
+        """
+        <weights> must not change afterwards, they are pickled in the background
+        """
+        try:
+            self._snapshots.put_nowait((weights, step))
+        except queue.Full:
+            try:
+                # a put is flushed to the process by a feeder thread,
+                # get_nowait could miss a snapshot submitted just before
+                self._snapshots.get(timeout=0.1)
+                self.dropped += 1
+            except queue.Empty:
+                pass
+            self._snapshots.put((weights, step))
+
+    def close(self):
+        """
+        waits until the submitted snapshots are evaluated
+        """
+        while self._process.is_alive():
+            try:
+                self._snapshots.put(None, timeout=1)
+                break
+            except queue.Full:
+                pass
+        self._process.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,6 +1,9 @@
 import random
 from functools import partial
 from typing import Callable
+from typing import Optional
+
+import numpy as np
 
 from game.components import Board
 from game.components import MAX_POSITION
@@ -76,14 +79,120 @@ def heuristics_eval_func(board: Board, moves: list[SingleMove]) -> float:
     )
 
 
+def afterstate_counts(board: Board, moves: list[list[SingleMove]]) -> np.ndarray:
+    """
+    stacks checker counts (see Board.checker_counts) of the moving color
+    for the afterstate of every move, shape is (num_moves, 25)
+    """
+    color = moves[0][0].color
+    counts = np.tile(board.checker_counts(color), (len(moves), 1))
+    for i, move in enumerate(moves):
+        for sm in move:
+            counts[i, sm.position_from - 1] -= 1
+            counts[i, min(sm.position_to, MAX_POSITION + 1) - 1] += 1
+    return counts
+
+
+def count_blocks_min_length(occupied: np.ndarray, min_length: int) -> np.ndarray:
+    """
+    number of blocks of at least <min_length> consecutive occupied points per row
+    """
+    num_rows, num_points = occupied.shape
+    cumsum = np.zeros((num_rows, num_points + 1), dtype=np.int32)
+    np.cumsum(occupied, axis=1, out=cumsum[:, 1:])
+
+    # window starting at i is fully occupied
+    full = (cumsum[:, min_length:] - cumsum[:, :-min_length]) == min_length
+
+    # and the point before it is not (so that every block is counted once)
+    previous = np.zeros_like(full)
+    previous[:, 1:] = occupied[:, : num_points - min_length]
+
+    return np.sum(full & ~previous, axis=1)
+
+
+def heuristics_eval_batch(board: Board, moves: list[list[SingleMove]]) -> np.ndarray:
+    """
+    same heuristics as heuristics_eval_func, but evaluated for all moves at once
+    from stacked checker counts of the afterstates
+    """
+    counts = afterstate_counts(board, moves)
+    on_board = counts[:, :MAX_POSITION]
+    occupied = on_board > 0
+
+    num_slots = np.sum(occupied, axis=1)
+    num_checkers = np.sum(on_board, axis=1)
+
+    h_blocks_six = count_blocks_min_length(occupied, 6)
+    h_blocks_two = count_blocks_min_length(occupied, 2)
+
+    h_from_head = -on_board[:, MIN_POSITION - 1] / 15
+
+    max_pip_count = ((MAX_POSITION + 1) - MIN_POSITION) * 15
+    pips = np.arange(MAX_POSITION, 0, -1)
+    h_pip_count = -(on_board @ pips) / max_pip_count
+
+    h_bear_off = counts[:, MAX_POSITION]
+
+    # checkers distribution
+    has_checkers = num_slots > 0
+    safe_slots = np.maximum(num_slots, 1)
+
+    h_ratio = np.where(num_checkers > 0, num_slots / np.maximum(num_checkers, 1), 1)
+    h_mean = -np.where(has_checkers, num_checkers / safe_slots, 0)
+
+    # median of the occupied points only: empty points are pushed to the end
+    occupied_sorted = np.sort(np.where(occupied, on_board, np.iinfo(np.int32).max))
+    rows = np.arange(len(moves))
+    low = occupied_sorted[rows, (safe_slots - 1) // 2]
+    high = occupied_sorted[rows, safe_slots // 2]
+    h_median = -np.where(has_checkers, (low + high) / 2, 0)
+
+    # mean distance between consecutive occupied points = span / number of gaps
+    first = np.argmax(occupied, axis=1)
+    last = MAX_POSITION - 1 - np.argmax(occupied[:, ::-1], axis=1)
+    h_distance = -np.where(
+        num_slots > 1, (last - first) / np.maximum(num_slots - 1, 1), 0
+    )
+
+    return (
+        h_blocks_six
+        + h_blocks_two
+        + h_from_head
+        + h_pip_count
+        + h_bear_off
+        + h_ratio
+        + h_mean
+        + h_median
+        + h_distance
+    )
+
+
 class Bot:
-    def __init__(self, color: str, eval_func: Callable = random_eval_func):
+    def __init__(
+        self,
+        color: str,
+        eval_func: Callable = random_eval_func,
+        batch_eval_func: Optional[Callable] = None,
+    ):
+        """
+        batch_eval_func (if given) takes the board and all candidate moves
+        and returns an array of ranks, it is used instead of eval_func
+        """
         self._eval_func = eval_func
+        self._batch_eval_func = batch_eval_func
         self.color = color
 
     def find_a_move(self, board, dice_roll) -> list[SingleMove]:
         moves = find_complete_legal_moves(board, self.color, dice_roll)
 
+        if self._batch_eval_func is not None:
+            if not moves:
+                return []
+            ranks = self._batch_eval_func(board, moves)
+            # on ties take the last one, same as sorting below
+            return moves[len(moves) - 1 - int(np.argmax(ranks[::-1]))]
+
         eval_func = partial(self._eval_func, board)
 
         # greater the evaluation the better
@@ -104,4 +213,4 @@ class RandomBot(Bot):
 
 class HeuristicsBot(Bot):
     def __init__(self, color: str):
-        super().__init__(color, heuristics_eval_func)
+        super().__init__(color, heuristics_eval_func, heuristics_eval_batch)
@@ -0,0 +1,164 @@
+"""
+checkpoint cadence and background saving
+
+training loops ask an AsyncCheckpointer after every game (maybe_save) and the
+CheckpointPolicy decides if a checkpoint is due. the training thread only takes
+a snapshot (copies of the weights and counters), writing it to disk is done by
+a background thread, so training does not wait for disk I/O. when a save is due
+while the previous one is still being written, only the newest snapshot is kept
+"""
+import threading
+import time
+from typing import Callable
+from typing import Optional
+
+
+class CheckpointPolicy:
+    """
+    checkpoint is due every <every_games> games, every <every_seconds> seconds
+    or, with <on_improvement>, when the metric passed to due() is the best so far
+    (e.g. win ratio of a test run), None disables a rule
+    """
+
+    def __init__(self, every_games=100, every_seconds=600.0, on_improvement=True):
+        self.every_games = every_games
+        self.every_seconds = every_seconds
+        self.on_improvement = on_improvement
+        self.best_metric = None
+        self._last_games = None
+        self._last_time = time.monotonic()
+
+    def due(self, games: int, metric: Optional[float] = None) -> bool:
+        # counters of a restored model don't start at 0
+        if self._last_games is None:
+            self._last_games = games
+
+        improved = False
+        if metric is not None and (
+            self.best_metric is None or metric > self.best_metric
+        ):
+            self.best_metric = metric
+            improved = True
+
+        return (
+            (self.on_improvement and improved)
+            or (
+                self.every_games is not None
+                and games - self._last_games >= self.every_games
+            )
+            or (
+                self.every_seconds is not None
+                and time.monotonic() - self._last_time >= self.every_seconds
+            )
+        )
+
+    def saved(self, games: int):
+        self._last_games = games
+        self._last_time = time.monotonic()
+
+
+class AsyncCheckpointer:
+    """
+    <save> writes a snapshot to disk, it is only called from the background thread.
+    errors of a background save are raised by the next save() or flush()
+    """
+
+    def __init__(self, save: Callable[[object], None], policy=None):
+        self._save = save
+        self.policy = policy or CheckpointPolicy()
+
+        self._pending = None
+        self._busy = False
+        self._error = None
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._save_loop, daemon=True)
+        self._thread.start()
+
+    def maybe_save(
+        self, snapshot: Callable[[], object], games: int, metric=None
+    ) -> bool:
+        """
+        <snapshot> is only called when a checkpoint is due (see CheckpointPolicy)
+        """
+        if not self.policy.due(games, metric):
+            return False
+        self.save(snapshot())
+        self.policy.saved(games)
+        return True
+
+    def save(self, snapshot):
+        with self._condition:
+            self._raise_error()
+            self._pending = snapshot
+            self._condition.notify_all()
+
+    def flush(self, snapshot=None):
+        """
+        saves the <snapshot> if given and waits until everything is written
+        """
+        if snapshot is not None:
+            self.save(snapshot)
+        with self._condition:
+            self._condition.wait_for(lambda: self._pending is None and not self._busy)
+            self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError('Saving a checkpoint failed') from error
+
+    def _save_loop(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending is not None)
+                snapshot, self._pending = self._pending, None
+                self._busy = True
+
+            error = None
+            try:
+                self._save(snapshot)
+            except Exception as e:
+                error = e
+
+            with self._condition:
+                self._busy = False
+                if error is not None:
+                    self._error = error
+                self._condition.notify_all()
+
+
+class KerasCheckpointWriter:
+    """
+    saves snapshots of a keras <model> and tf <variables> (name -> variable)
+    with a CheckpointManager in <directory>
+
+    snapshots are (weights, variable values, checkpoint number), they are assigned
+    to a copy of the model and variables first, so the live ones are never read
+    while training changes them. checkpoints are restored with
+    tf.train.Checkpoint(model=model, **variables).
+
+    the checkpoint state file only points at a checkpoint once all of its files
+    are written, so an interrupted save never replaces the latest checkpoint
+    """
+
+    def __init__(self, model, variables: dict, directory, max_to_keep=3):
+        # imported here so that checkpointing itself does not need tensorflow
+        import tensorflow as tf
+
+        self._model = tf.keras.models.clone_model(model)
+        self._variables = {
+            name: tf.Variable(variable, trainable=False)
+            for name, variable in variables.items()
+        }
+        self.manager = tf.train.CheckpointManager(
+            tf.train.Checkpoint(model=self._model, **self._variables),
+            directory,
+            max_to_keep=max_to_keep,
+        )
+
+    def __call__(self, snapshot):
+        weights, values, checkpoint_number = snapshot
+        self._model.set_weights(weights)
+        for name, value in values.items():
+            self._variables[name].assign(value)
+        self.manager.save(checkpoint_number=checkpoint_number)
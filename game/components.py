@@ -597,6 +597,19 @@ class Board:
         tray = self.off_tray[color]
         return tray.num_checkers
 
+    def checker_counts(self, color) -> np.ndarray:
+        """
+        number of checkers of <color> on each point in <color>'s coordinates
+        index 0 to 23 are board points 1 to 24, index 24 is the tray
+        """
+        counts = np.zeros(MAX_POSITION + 1, dtype=np.int32)
+        for p in self.BOARD_POINTS:
+            slot = self.get_slot(color, p)
+            if slot.color == color:
+                counts[p - 1] = slot.num_checkers
+        counts[MAX_POSITION] = self.num_on_tray(color)
+        return counts
+
     def num_opponent_behind(self, color):
         for p in self.BOARD_POINTS:
             slot = self.get_slot(color, p)
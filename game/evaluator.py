@@ -0,0 +1,254 @@
+"""
+NumPy implementation of the value network forward pass
+
+the network (see TDNardiModel and HillClimberModel) is
+input -> Dense(80, sigmoid) -> Dense(1, sigmoid)
+weights are in keras order: [hidden kernel, hidden bias, output kernel, output bias]
+"""
+import os
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+WEIGHT_NAMES = ('hidden_kernel', 'hidden_bias', 'output_kernel', 'output_bias')
+
+
+def save_weights_file(path, weights: list[np.ndarray], **counters):
+    """
+    saves weights (keras order) and training counters to a .npz file,
+    file is written next to the target first and then moved, so it's never half written
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **dict(zip(WEIGHT_NAMES, weights)), **counters)
+    os.replace(tmp_path, path)
+
+
+def load_weights_file(path) -> tuple[list[np.ndarray], dict]:
+    """
+    returns weights (keras order) and training counters
+    """
+    with np.load(path) as data:
+        weights = [data[name] for name in WEIGHT_NAMES]
+        counters = {k: data[k].item() for k in data.files if k not in WEIGHT_NAMES}
+    return weights, counters
+
+
+def flatten_weights(weights: list[np.ndarray]) -> np.ndarray:
+    return np.concatenate(
+        [np.asarray(w, dtype=np.float32).reshape(-1) for w in weights]
+    )
+
+
+def unflatten_weights(flat: np.ndarray, shapes) -> list[np.ndarray]:
+    """
+    views of <flat> with the given <shapes>, no copy is made
+    """
+    weights = []
+    offset = 0
+    for shape in shapes:
+        size = int(np.prod(shape))
+        weights.append(flat[offset : offset + size].reshape(shape))
+        offset += size
+    return weights
+
+
+def sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+class NumpyEvaluator:
+    """
+    evaluates batches of encoded positions without tensorflow,
+    so it is cheap to create in worker processes
+    """
+
+    def __init__(self, weights: list[np.ndarray]):
+        self.set_weights(weights)
+
+    @classmethod
+    def from_model(cls, model):
+        return cls(model.get_weights())
+
+    def set_weights(self, weights: list[np.ndarray]):
+        hidden_kernel, hidden_bias, output_kernel, output_bias = weights
+        self.hidden_kernel = np.asarray(hidden_kernel, dtype=np.float32)
+        self.hidden_bias = np.asarray(hidden_bias, dtype=np.float32)
+        self.output_kernel = np.asarray(output_kernel, dtype=np.float32)
+        self.output_bias = np.asarray(output_bias, dtype=np.float32)
+
+    def get_weights(self) -> list[np.ndarray]:
+        return [
+            self.hidden_kernel,
+            self.hidden_bias,
+            self.output_kernel,
+            self.output_bias,
+        ]
+
+    def __call__(self, states: np.ndarray) -> np.ndarray:
+        """
+        probability of white winning for a batch of encoded positions
+        """
+        states = np.asarray(states, dtype=np.float32)
+        hidden = sigmoid(states @ self.hidden_kernel + self.hidden_bias)
+        return sigmoid(hidden @ self.output_kernel + self.output_bias)[:, 0]
+
+
+def quantize_int8(weights: np.ndarray) -> tuple[np.ndarray, float]:
+    """
+    symmetric per-layer quantization, weights ~= quantized * scale
+    """
+    max_abs = float(np.max(np.abs(weights)))
+    scale = max_abs / 127 if max_abs > 0 else 1.0
+    quantized = np.clip(np.round(weights / scale), -127, 127).astype(np.int8)
+    return quantized, scale
+
+
+class QuantizedEvaluator(NumpyEvaluator):
+    """
+    network with reduced precision weights
+
+    'int8': kernels are stored as int8 with one float scale per layer
+    'float16': all weights are stored as float16
+
+    the reduced weights are what is stored and pickled (4x / 2x smaller kernels
+    to ship to worker processes). NumPy has no fast int8 / float16 matrix
+    products (a float16 one is ~200x slower than float32), so every instance
+    converts them to float32 once and the forward pass costs the same as
+    NumpyEvaluator's, with the precision of the reduced weights
+    (see benchmark.quantized_move_agreement). biases stay float32 in int8 mode
+    """
+
+    MODES = ('int8', 'float16')
+
+    def __init__(self, weights: list[np.ndarray], mode='int8'):
+        if mode not in self.MODES:
+            raise ValueError(
+                f'Unknown quantization mode {mode}, use one of {self.MODES}'
+            )
+        self.mode = mode
+        super().__init__(weights)
+
+    @classmethod
+    def from_model(cls, model, mode='int8'):
+        return cls(model.get_weights(), mode)
+
+    def set_weights(self, weights: list[np.ndarray]):
+        hidden_kernel, hidden_bias, output_kernel, output_bias = weights
+        if self.mode == 'int8':
+            self.hidden_kernel, self.hidden_scale = quantize_int8(
+                np.asarray(hidden_kernel)
+            )
+            self.output_kernel, self.output_scale = quantize_int8(
+                np.asarray(output_kernel)
+            )
+            self.hidden_bias = np.asarray(hidden_bias, dtype=np.float32)
+            self.output_bias = np.asarray(output_bias, dtype=np.float32)
+        else:
+            (
+                self.hidden_kernel,
+                self.hidden_bias,
+                self.output_kernel,
+                self.output_bias,
+            ) = (np.asarray(w, dtype=np.float16) for w in weights)
+            self.hidden_scale = self.output_scale = 1.0
+        self._float_weights = None
+
+    def get_weights(self) -> list[np.ndarray]:
+        """
+        dequantized float32 weights, shared with the forward pass, don't change them
+        """
+        if self._float_weights is None:
+            self._float_weights = [
+                self.hidden_kernel.astype(np.float32) * np.float32(self.hidden_scale),
+                self.hidden_bias.astype(np.float32),
+                self.output_kernel.astype(np.float32) * np.float32(self.output_scale),
+                self.output_bias.astype(np.float32),
+            ]
+        return self._float_weights
+
+    def __getstate__(self):
+        # the float32 copy is rebuilt after unpickling
+        return {**self.__dict__, '_float_weights': None}
+
+    def __call__(self, states: np.ndarray) -> np.ndarray:
+        hidden_kernel, hidden_bias, output_kernel, output_bias = self.get_weights()
+        states = np.asarray(states, dtype=np.float32)
+        hidden = sigmoid(states @ hidden_kernel + hidden_bias)
+        return sigmoid(hidden @ output_kernel + output_bias)[:, 0]
+
+
+class StackedEvaluator:
+    """
+    evaluates a batch of positions with several networks at once,
+    weights have a leading model axis (see stack_weights)
+
+    kernels of all models are laid side by side, so the hidden layer
+    of every model is computed with a single matrix product.
+    evaluate_models runs every position through one model only
+    """
+
+    def __init__(self, stacked_weights: list[np.ndarray]):
+        self.set_weights(stacked_weights)
+
+    def set_weights(self, stacked_weights: list[np.ndarray]):
+        hidden_kernel, hidden_bias, output_kernel, output_bias = (
+            np.asarray(w, dtype=np.float32) for w in stacked_weights
+        )
+        self.num_models, num_inputs, self.num_hidden = hidden_kernel.shape
+        # (models, inputs, hidden), see evaluate_models
+        self.model_hidden_kernels = hidden_kernel
+        self.model_hidden_biases = hidden_bias
+        # (inputs, models * hidden)
+        self.hidden_kernel = hidden_kernel.transpose(1, 0, 2).reshape(num_inputs, -1)
+        self.hidden_bias = hidden_bias.reshape(-1)
+        self.output_kernel = output_kernel[:, :, 0]
+        self.output_bias = output_bias[:, 0]
+
+    def __call__(self, states: np.ndarray) -> np.ndarray:
+        """
+        (models, positions) probabilities of white winning
+        """
+        states = np.asarray(states, dtype=np.float32)
+        hidden = sigmoid(states @ self.hidden_kernel + self.hidden_bias)
+        hidden = hidden.reshape(len(states), self.num_models, self.num_hidden)
+        return sigmoid(
+            np.einsum('nmh,mh->mn', hidden, self.output_kernel)
+            + self.output_bias[:, None]
+        )
+
+    def evaluate_models(self, states: np.ndarray, models: np.ndarray) -> np.ndarray:
+        """
+        (positions,) probabilities of white winning,
+        position n is evaluated by model <models>[n] only
+        """
+        states = np.asarray(states, dtype=np.float32)
+        values = np.empty(len(states), dtype=np.float32)
+        for model in np.unique(models):
+            rows = models == model
+            hidden = sigmoid(
+                states[rows] @ self.model_hidden_kernels[model]
+                + self.model_hidden_biases[model]
+            )
+            values[rows] = sigmoid(
+                hidden @ self.output_kernel[model] + self.output_bias[model]
+            )
+        return values
+
+
+def stack_weights(models_weights: list[list[np.ndarray]]) -> list[np.ndarray]:
+    """
+    weights of several networks (keras order) stacked along a new first axis
+    """
+    return [np.stack(layer) for layer in zip(*models_weights)]
+
+
+# evaluators that can be built from weights, by name
+EVALUATORS = {
+    'numpy': NumpyEvaluator,
+    'int8': partial(QuantizedEvaluator, mode='int8'),
+    'float16': partial(QuantizedEvaluator, mode='float16'),
+}
@@ -42,7 +42,8 @@ class CompleteMove(NamedTuple):
         m = regex.match(move_string)
         groups = m.groups()
         color, dice_roll = groups[:2]
-        single_moves = (sm for sm in groups[2:] if sm is not None)
+        # last group is the '-' of a turn without moves
+        single_moves = (sm for sm in groups[2:-1] if sm is not None)
 
         dice_roll = tuple(int(r) for r in dice_roll.split(', '))
 
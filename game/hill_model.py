@@ -1,8 +1,10 @@
 import logging
-import multiprocessing as mp  # noqa
+import multiprocessing as mp
 import random
 import time
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Optional
 
 import numpy as np
 import tensorflow as tf
@@ -11,16 +13,36 @@ from keras.layers import Input
 from keras.models import Model
 from tqdm import tqdm
 
-from game.bot import Bot
+from game.adjudication import Adjudicator
+from game.background_eval import BackgroundEvaluation
 from game.bot import HeuristicsBot
 from game.bot import RandomBot
+from game.checkpointing import AsyncCheckpointer
+from game.checkpointing import KerasCheckpointWriter
 from game.components import Board
 from game.components import Colors
-from game.components import Dice
 from game.components import SingleMove
-from game.rules import find_complete_legal_moves
-from game.rules import has_won
-from game.rules import win_condition
+from game.evaluator import flatten_weights
+from game.evaluator import NumpyEvaluator
+from game.evaluator import StackedEvaluator
+from game.evaluator import unflatten_weights
+from game.mutant_pool import can_mutant_be_better
+from game.mutant_pool import is_mutant_better
+from game.mutant_pool import mutant_games
+from game.mutant_pool import MutantPool
+from game.mutant_pool import play_mutant_games
+from game.mutant_pool import play_population_games
+from game.rules import find_legal_afterstates
+from game.search import ANYTIME_MAX_PLIES
+from game.search import ExpectimaxSearch
+from game.sprt import SPRT
+from game.telemetry import Telemetry
+from game.telemetry import TensorBoardSink
+from game.tournament import BotPlayer
+from game.tournament import NetworkPlayer
+from game.tournament import Tournament
+from game.tournament import TournamentResult
+from game.trajectory_store import TrajectoryWriter
 
 
 class HillClimberModel:
@@ -29,13 +51,41 @@ class HillClimberModel:
     """
 
     _LOGS_PATH = Path('data') / 'logs' / 'HillClimberModel'
+    _ABSORB_RATE = 0.05
     _CHECKPOINTS_PATH = Path('data') / 'checkpoints' / 'HillClimberModel'
 
-    def __init__(self, restore=False):
+    # (tag, position, turn) of the positions logged by test_equity
+    EQUITY_TESTS = [
+        ('tests/equity_starting', ['1[W15]', '13[B15]'], Colors.WHITE),
+        ('tests/equity_white_to_win', ['24[W1]', '7[B15]'], Colors.WHITE),
+        ('tests/equity_white_to_mars', ['24[W1]', '13[B15]'], Colors.WHITE),
+        ('tests/equity black_to_win', ['12[B1]', '19[W15]'], Colors.BLACK),
+        ('tests/equity_black_to_mars', ['12[B1]', '1[W15]'], Colors.BLACK),
+    ]
+
+    def __init__(self, restore=False, num_workers=None):
+        """
+        with <num_workers> champion vs mutant games are played
+        by a pool of worker processes, call close() when done
+
+        champion and mutant weights are kept in flat float32 buffers
+        (champion_flat, mutant_flat) with per-layer views (champion_weights,
+        mutant_weights), mutation and absorption update them in place and
+        games are played by NumpyEvaluators on the views. the keras model
+        is only synced when the champion changes
+        """
         self.model = self.generate_blank_model()
 
-        self.weight_shape = [w.shape for w in self.model.trainable_variables]
-        self.total_weights = sum(tf.reduce_prod(s) for s in self.weight_shape)
+        self.weight_shape = [tuple(w.shape) for w in self.model.trainable_variables]
+        self.total_weights = sum(int(np.prod(s)) for s in self.weight_shape)
+
+        self.champion_flat = flatten_weights(self.model.get_weights())
+        self.mutant_flat = np.empty_like(self.champion_flat)
+        self.champion_weights = unflatten_weights(self.champion_flat, self.weight_shape)
+        self.mutant_weights = unflatten_weights(self.mutant_flat, self.weight_shape)
+        self.champion = NumpyEvaluator(self.champion_weights)
+        self.mutant = NumpyEvaluator(self.mutant_weights)
+        self.rng = np.random.default_rng()
 
         self._CHECKPOINTS_PATH.mkdir(parents=True, exist_ok=True)
         self._LOGS_PATH.mkdir(parents=True, exist_ok=True)
@@ -45,24 +95,89 @@ class HillClimberModel:
         self.iteration = tf.Variable(
             0, trainable=False, name='iteration', dtype='int64'
         )
+        self.telemetry = Telemetry(
+            TensorBoardSink(self.writer), step=lambda: int(self.iteration)
+        )
 
         self.checkpoint = tf.train.Checkpoint(
             iteration=self.iteration,
             model=self.model,
         )
 
-        self.manager = tf.train.CheckpointManager(
-            self.checkpoint, self._CHECKPOINTS_PATH, max_to_keep=3
+        # see TDNardiModel.checkpointer
+        checkpoint_writer = KerasCheckpointWriter(
+            self.model, {'iteration': self.iteration}, self._CHECKPOINTS_PATH
         )
+        self.manager = checkpoint_writer.manager
+        self.checkpointer = AsyncCheckpointer(checkpoint_writer)
+
+        self.search = ExpectimaxSearch(self.evaluate_batch)
+
+        # games played while evaluating mutants are stored here if set (see train)
+        self.trajectory_writer = None
+        # champion vs mutant games are ended early by this Adjudicator if set
+        self.adjudicator = None
 
         if restore:
             self.restore()
 
+        self.pool = None
+        if num_workers:
+            self.pool = MutantPool(self.champion_weights, num_workers)
+
+        # see test_against_bot
+        self.tournament = None
+        self.tournament_workers = None
+        # see train(background_eval=True)
+        self.background_evaluation = None
+
+    def close(self):
+        self.telemetry.close()
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+        if self.tournament is not None:
+            self.tournament.close()
+            self.tournament = None
+        if self.background_evaluation is not None:
+            self.background_evaluation.close()
+            self.background_evaluation = None
+
+    def evaluate_in_background(self, weights: list[np.ndarray], step: int):
+        """
+        see TDNardiModel.evaluate_in_background
+        """
+        if self.background_evaluation is None:
+            self.background_evaluation = BackgroundEvaluation(
+                self._LOGS_PATH / 'eval', self.EQUITY_TESTS
+            )
+        self.background_evaluation.submit(weights, step)
+
+    def _snapshot(self):
+        weights = unflatten_weights(self.champion_flat.copy(), self.weight_shape)
+        iteration = int(self.iteration.numpy())
+        return weights, {'iteration': iteration}, iteration
+
+    @contextmanager
+    def _checkpointing(self):
+        """
+        final checkpoint when training stops, also on errors and Ctrl-C
+        """
+        try:
+            yield
+        finally:
+            self.backup()
+
     def backup(self):
-        self.manager.save()
+        """
+        saves a checkpoint now and waits until it's written
+        """
+        self.checkpointer.flush(self._snapshot())
 
     def restore(self):
         self.checkpoint.restore(self.manager.latest_checkpoint)
+        self.champion_flat[:] = flatten_weights(self.model.get_weights())
+        self.search.clear_cache()
         if self.manager.latest_checkpoint:
             print(f'Restored from {self.manager.latest_checkpoint}')
         else:
@@ -85,34 +200,27 @@ class HillClimberModel:
         model = Model(inputs=inputs, outputs=output)
         return model
 
-    def generate_noise(self, stddev=0.05):
-        noise = [
-            tf.random.normal(
-                shape,
-                mean=0.0,
-                stddev=stddev,
-                dtype=tf.dtypes.float32,
-                seed=None,
-                name=None,
-            )
-            for shape in self.weight_shape
-        ]
-        return noise
-
-    def generate_mutant(self, stddev=0.05):
-        noise = self.generate_noise(stddev)
-        mutant_weights = [w + n for w, n in zip(self.model.trainable_variables, noise)]
-        model = self.generate_blank_model()
-        for i, w in enumerate(mutant_weights):
-            model.trainable_variables[i].assign(w)
-        return model
+    def generate_mutant(self, stddev=0.05) -> list[np.ndarray]:
+        """
+        champion + gaussian noise written into the mutant buffer,
+        returns mutant_weights
+        """
+        self.rng.standard_normal(out=self.mutant_flat, dtype=np.float32)
+        self.mutant_flat *= stddev
+        self.mutant_flat += self.champion_flat
+        return self.mutant_weights
+
+    def _champion_updated(self):
+        self.model.set_weights(self.champion_weights)
+        self.search.clear_values()
 
-    def absorb_mutant(self, mutant):
+    def absorb_mutant(self):
         # champion := 0.95*champion + 0.05*challenger
-        for i, w in enumerate(self.model.trainable_variables):
-            self.model.trainable_variables[i].assign(
-                0.95 * w + 0.05 * mutant.trainable_variables[i]
-            )
+        # (champion += 0.05*(challenger - champion), the mutant buffer is used as scratch)
+        self.mutant_flat -= self.champion_flat
+        self.mutant_flat *= self._ABSORB_RATE
+        self.champion_flat += self.mutant_flat
+        self._champion_updated()
 
     @classmethod
     def find_move_for_model(
@@ -125,23 +233,16 @@ class HillClimberModel:
                 return 1 - out[0]
 
         start = time.time()
-        moves = find_complete_legal_moves(board, color, dice_roll)
+        moves, _, states = find_legal_afterstates(board, color, dice_roll, encode=True)
         max_move = None
         max_prob = -np.inf
 
-        for move in moves:
-            afterstate = board.copy_board()
-            for sm in move:
-                afterstate.do_single_move(sm)
-
-            state = afterstate.encode(Colors.opponent(color))
-            output = model(state[np.newaxis])
-
-            prob = _get_prob(output)
-
-            if prob > max_prob:
-                max_prob = prob
-                max_move = move
+        if moves:
+            outputs = model(np.stack(states), training=False).numpy()
+            probs = [_get_prob(out) for out in outputs]
+            best = int(np.argmax(probs))
+            max_prob = probs[best]
+            max_move = moves[best]
 
         duration = time.time() - start
         logging.debug(
@@ -149,63 +250,194 @@ class HillClimberModel:
         )
         return max_move
 
-    def find_move(self, color: str, board: Board, dice_roll: tuple[int, int]):
+    def evaluate_batch(self, states: np.ndarray) -> np.ndarray:
+        """
+        probability of white winning for a batch of encoded positions
+        """
+        return self.model(states, training=False).numpy()[:, 0]
+
+    def find_move(
+        self,
+        color: str,
+        board: Board,
+        dice_roll: tuple[int, int],
+        plies=None,
+        deadline=None,
+    ):
+        """
+        see TDNardiModel.find_move
+        """
+        if deadline is not None:
+            return self.search.find_move_anytime(
+                color, board, dice_roll, deadline, max_plies=plies or ANYTIME_MAX_PLIES
+            )
+        elif plies is not None and plies > 1:
+            return self.search.find_move(color, board, dice_roll, plies)
         return self.find_move_for_model(self.model, color, board, dice_roll)
 
-    def is_mutant_good(self, mutant):
+    def is_mutant_good(self):
         """
-        plays a pair of games with mutant.
+        plays a pair of games with the current mutant (see generate_mutant).
         same dice is used, colors are switched
+        games are played by the worker pool if the model has one (see <num_workers>),
+        otherwise the remaining games are skipped once the mutant has lost too many of them
         """
-        NUM_CORE = 4  # noqa
         NUM_GAMES = 2  # (this will be played 2 times with roles switched)
 
-        dices = [Dice(seed=random.randint(1, 10000)) for _ in range(NUM_GAMES)]
-
-        params = []
-        for d in dices:
-            starting_color = random.choice(Colors.colors)
-            params.append(
-                (self.model, Colors.WHITE, mutant, Colors.BLACK, starting_color, d)
-            )
-            params.append(
-                (self.model, Colors.BLACK, mutant, Colors.WHITE, starting_color, d)
+        games = mutant_games(NUM_GAMES, random)
+        if self.pool is not None:
+            # one parallel batch, splitting it would only add rounds
+            results = self.pool.play(
+                self.champion_weights,
+                self.mutant_weights,
+                games,
+                self.trajectory_writer,
+                self.adjudicator,
             )
+        else:
+            # pair by pair, stops once the mutant can't win
+            results = []
+            for start in range(0, len(games), 2):
+                results += play_mutant_games(
+                    self.champion,
+                    self.mutant,
+                    games[start : start + 2],
+                    self.trajectory_writer,
+                    self.adjudicator,
+                )
+                if not can_mutant_be_better(results, NUM_GAMES):
+                    break
+
+        mutant_num_wins = sum(results)
+        self.telemetry.observe('train/mutant_wins', mutant_num_wins)
+        self.telemetry.observe('train/mutant_games', len(results))
+        return is_mutant_better(results, NUM_GAMES)
+
+    def population_step(
+        self, population=8, num_pairs=2, stddev=0.05, rng=None, games_rng=None
+    ):
+        """
+        <population> mutants play the same <num_pairs> pairs of games against the champion
+        (see play_population_games), champion absorbs the average of the good mutants
+        weighted by their wins. returns the number of good mutants
+        <rng> - numpy generator of the mutations, <games_rng> - random.Random
+        of the dice and starting colors (see mutant_games)
+        """
+        rng = rng or self.rng
+        games_rng = games_rng or random
+        champion = self.champion_weights
+        stacked = [
+            np.concatenate(
+                [
+                    w[np.newaxis],
+                    w + rng.normal(scale=stddev, size=(population, *w.shape)),
+                ]
+            ).astype(np.float32)
+            for w in champion
+        ]
+
+        games = mutant_games(num_pairs, games_rng)
+        population_games = [(k + 1, *game) for k in range(population) for game in games]
+        winners = play_population_games(
+            StackedEvaluator(stacked), population_games, self.adjudicator
+        )
 
-        # with mp.Pool(processes=NUM_CORE) as pool:
-        #     results = pool.starmap(
-        #         play_with_mutant,
-        #         params
-        #     )
-        results = [play_with_mutant(*p) for p in params]
+        wins = np.array(
+            [winner == game[1] for winner, game in zip(winners, population_games)]
+        ).reshape(population, len(games))
+        good = [k for k in range(population) if is_mutant_better(wins[k], num_pairs)]
+        self.telemetry.observe('train/best_mutant_wins', int(wins.sum(axis=1).max()))
+        if not good:
+            return 0
+
+        mutant_weights = wins[good].sum(axis=1)
+        mutant_weights = mutant_weights / mutant_weights.sum()
+        # champion := 0.95*champion + 0.05*(weighted average of good mutants)
+        for w, s in zip(champion, stacked):
+            w *= 1 - self._ABSORB_RATE
+            w += self._ABSORB_RATE * np.tensordot(
+                mutant_weights, s[np.array(good) + 1], axes=1
+            )
+        self._champion_updated()
+        return len(good)
 
-        mutant_num_wins = 0
-        for r in results:
-            mutant_num_wins += min(r, 1)
+    def train_population(
+        self, num_iterations, population=8, num_pairs=2, stddev=0.05, seed=None
+    ):
+        """
+        population version of train, see population_step.
+        <seed> seeds both the mutations and the games
+        """
+        rng = np.random.default_rng(seed)
+        games_rng = random.Random(seed)
+        print(f'\nStarting population training cycle for {num_iterations} episodes')
 
-        return mutant_num_wins >= NUM_GAMES * 2 - 1
+        num_absorbed = 0
+        with self._checkpointing():
+            pbar = tqdm(range(num_iterations))
+            for _ in pbar:
+                start = time.time()
+                num_good = self.population_step(
+                    population, num_pairs, stddev, rng, games_rng
+                )
+                if num_good:
+                    num_absorbed += 1
+                    self.telemetry.count('train/absorbed')
+                self.telemetry.observe('train/good_mutants', num_good)
+
+                pbar.set_postfix({'absorbed': num_absorbed})
+                self.iteration.assign_add(1)
+                self.checkpointer.maybe_save(
+                    self._snapshot, int(self.iteration.numpy())
+                )
+                self.telemetry.observe('iteration_time', time.time() - start)
+
+        self.telemetry.flush()
+
+    def train(self, num_iterations, trajectory_path=None, background_eval=False):
+        """
+        <trajectory_path> - games with mutants are appended to this TrajectoryStore
+        <background_eval> - see TDNardiModel.train
+        """
+        if trajectory_path is not None:
+            self.trajectory_writer = TrajectoryWriter(trajectory_path)
 
-    def train(self, num_iterations):
         test_every_n_iteration = 100
         print(f'\nStarting training cycle for {num_iterations} episodes')
 
         num_absorbed = 0
-        pbar = tqdm(range(num_iterations))
-        for i in pbar:
-
-            if i % test_every_n_iteration == 0 and i > 0:
-                self.test_equity()
-                self.test_against_random()
-                self.test_against_heuristics()
-
-            mutant = self.generate_mutant()
-            if self.is_mutant_good(mutant):
-                self.absorb_mutant(mutant)
-                num_absorbed += 1
-
-            pbar.set_postfix({'absorbed': num_absorbed})
-            self.iteration.assign_add(1)
-            self.backup()
+        with self._checkpointing():
+            pbar = tqdm(range(num_iterations))
+            for i in pbar:
+
+                win_ratio = None
+                if i % test_every_n_iteration == 0 and i > 0:
+                    if background_eval:
+                        self.evaluate_in_background(
+                            self._snapshot()[0], int(self.iteration.numpy())
+                        )
+                    else:
+                        self.test_equity()
+                        self.test_against_random()
+                        win_ratio = self.test_against_heuristics()
+
+                start = time.time()
+                self.generate_mutant()
+                if self.is_mutant_good():
+                    self.absorb_mutant()
+                    num_absorbed += 1
+                    self.telemetry.count('train/absorbed')
+
+                pbar.set_postfix({'absorbed': num_absorbed})
+                self.iteration.assign_add(1)
+                self.checkpointer.maybe_save(
+                    self._snapshot, int(self.iteration.numpy()), win_ratio
+                )
+                self.telemetry.observe('iteration_time', time.time() - start)
+
+        self.telemetry.flush()
+        if trajectory_path is not None:
+            self.trajectory_writer = None
 
     def equity(self, board: Board, turn: str):
         state = board.encode(turn)
@@ -213,91 +445,39 @@ class HillClimberModel:
         return output.numpy()[0]
 
     def test_equity(self):
-        board = Board.generate_from_position(['1[W15]', '13[B15]'])
-        starting_equity = self.equity(board, Colors.WHITE)
-
-        board.setup_position(['24[W1]', '7[B15]'])
-        white_to_win_equity = self.equity(board, Colors.WHITE)
-
-        board.setup_position(['24[W1]', '13[B15]'])
-        white_to_mars_equity = self.equity(board, Colors.WHITE)
-
-        board.setup_position(['12[B1]', '19[W15]'])
-        black_to_win_equity = self.equity(board, Colors.BLACK)
-
-        board.setup_position(['12[B1]', '1[W15]'])
-        black_to_mars_equity = self.equity(board, Colors.BLACK)
-
         with self.writer.as_default():
-            tf.summary.scalar(
-                'tests/equity_starting',
-                starting_equity[0],
-                step=self.iteration,
-            )
-            tf.summary.scalar(
-                'tests/equity_white_to_win',
-                white_to_win_equity[0],
-                step=self.iteration,
-            )
-            tf.summary.scalar(
-                'tests/equity_white_to_mars',
-                white_to_mars_equity[0],
-                step=self.iteration,
-            )
-            tf.summary.scalar(
-                'tests/equity black_to_win',
-                black_to_win_equity[0],
-                step=self.iteration,
-            )
-            tf.summary.scalar(
-                'tests/equity_black_to_mars',
-                black_to_mars_equity[0],
-                step=self.iteration,
-            )
+            for tag, position, turn in self.EQUITY_TESTS:
+                board = Board.generate_from_position(position)
+                tf.summary.scalar(tag, self.equity(board, turn)[0], step=self.iteration)
             self.writer.flush()
 
-    def test_against_bot(self, bot: Bot, num_games=50):
-        scores = {Colors.WHITE: 0, Colors.BLACK: 0}
-        games_won = {Colors.WHITE: 0, Colors.BLACK: 0}
-
-        def _run_game(dice, starting_color):
-            last_color = Colors.opponent(starting_color)
-            board.reset()
-
-            while win_condition(board, last_color) is None:
-                color_to_move = Colors.opponent(last_color)
-                dice_roll = dice.throw()
-
-                if color_to_move == bot.color:
-                    player_move = bot.find_a_move(board, dice_roll)
-                else:
-                    player_move = self.find_move(color_to_move, board, dice_roll)
-
-                # make move
-                if player_move:
-                    for m in player_move:
-                        board.do_single_move(m)
-
-                last_color = color_to_move
-
-            scores[last_color] += win_condition(board, last_color)
-            games_won[last_color] += min(1, win_condition(board, last_color))
-
-        board = Board()
-
-        for i in range(num_games):
-            seed = random.randint(1, 10000)
-            _run_game(Dice(seed=seed), Colors.WHITE)
-            _run_game(Dice(seed=seed), Colors.BLACK)
-
-        return (
-            games_won[Colors.opponent(bot.color)] / (num_games * 2),
-            scores[Colors.opponent(bot.color)] / scores[bot.color],
+    def test_against_bot(
+        self,
+        bot_type,
+        num_games=50,
+        sprt: Optional[SPRT] = None,
+        adjudicator: Optional[Adjudicator] = None,
+    ) -> TournamentResult:
+        """
+        see TDNardiModel.test_against_bot
+        """
+        if self.tournament is None:
+            self.tournament = Tournament(
+                NetworkPlayer(self.champion_weights),
+                BotPlayer(bot_type),
+                self.tournament_workers,
+            )
+        return self.tournament.play(
+            num_games,
+            self.champion_weights,
+            opponent=BotPlayer(bot_type),
+            sprt=sprt,
+            adjudicator=adjudicator,
         )
 
-    def test_against_random(self, num_games=10):
-        bot = RandomBot(Colors.WHITE)
-        win_ratio, score_ratio = self.test_against_bot(bot, num_games)
+    def test_against_random(self, num_games=10, sprt=None):
+        result = self.test_against_bot(RandomBot, num_games, sprt)
+        win_ratio, score_ratio = result.win_ratio, result.score_ratio
         with self.writer.as_default():
             tf.summary.scalar('tests/random_win_ratio', win_ratio, step=self.iteration)
             tf.summary.scalar(
@@ -305,9 +485,9 @@ class HillClimberModel:
             )
             self.writer.flush()
 
-    def test_against_heuristics(self, num_games=10):
-        bot = HeuristicsBot(Colors.WHITE)
-        win_ratio, score_ratio = self.test_against_bot(bot, num_games)
+    def test_against_heuristics(self, num_games=10, sprt=None):
+        result = self.test_against_bot(HeuristicsBot, num_games, sprt)
+        win_ratio, score_ratio = result.win_ratio, result.score_ratio
         with self.writer.as_default():
             tf.summary.scalar(
                 'tests/heuristics_win_ratio', win_ratio, step=self.iteration
@@ -316,46 +496,42 @@ class HillClimberModel:
                 'tests/heuristics_score_ratio', score_ratio, step=self.iteration
             )
             self.writer.flush()
-
-
-def play_with_mutant(
-    champion, champion_color, mutant, mutant_color, starting_color, dice
-):
-    board = Board()
-    board.reset()
-
-    models = {champion_color: champion, mutant_color: mutant}
-
-    last_color = Colors.opponent(starting_color)
-    while win_condition(board, last_color) is None:
-        color_to_move = Colors.opponent(last_color)
-        dice_roll = dice.throw()
-
-        move = HillClimberModel.find_move_for_model(
-            models[color_to_move], color_to_move, board, dice_roll
-        )
-
-        # make move
-        if move:
-            for m in move:
-                board.do_single_move(m)
-
-        last_color = color_to_move
-
-    return has_won(board, mutant_color)
+        return win_ratio
 
 
 class HillClimberBot:
-    def __init__(self, color: str):
+    """
+    see TDBot
+    """
+
+    def __init__(self, color: str, plies=None, top_k=5, time_budget=None):
+        if time_budget is not None and plies == 1:
+            raise ValueError('A time budget needs more than 1 ply to deepen the search')
         model = HillClimberModel()
         model.restore()
+        model.search.top_k = top_k
         self._model = model
         self._color = color
+        self._plies = plies
+        self._time_budget = time_budget
+
+    @property
+    def last_search_info(self) -> dict:
+        return self._model.search.last_search_info
 
     def find_a_move(self, board, dice_roll) -> list[SingleMove]:
-        return self._model.find_move(self._color, board, dice_roll)
+        deadline = None
+        if self._time_budget is not None:
+            deadline = time.time() + self._time_budget
+        return self._model.find_move(
+            self._color, board, dice_roll, self._plies, deadline
+        )
+
+    def close(self):
+        self._model.close()
 
 
 if __name__ == '__main__':
-    model = HillClimberModel(restore=True)
+    model = HillClimberModel(restore=True, num_workers=mp.cpu_count())
     model.train(5000)
+    model.close()
@@ -171,8 +171,37 @@ def unique_name():
     return uniq_filename
 
 
+HISTORY_FOLDER = 'data/recorded_games'
+
+
 def save_moves(moves: list[CompleteMove], file_name=None):
-    HISTORY_FOLDER = 'data/recorded_games'
     file_name = file_name or unique_name()
     with open(Path(HISTORY_FOLDER) / f'{file_name}.txt', 'w') as f:
         f.writelines([str(m) + '\n' for m in moves])
+
+
+def load_moves(file_path) -> list[CompleteMove]:
+    """
+    reads a game saved with save_moves
+    """
+    with open(file_path, 'r') as f:
+        return [
+            CompleteMove.generate_from_str(line.strip()) for line in f if line.strip()
+        ]
+
+
+def recorded_decisions(folder=HISTORY_FOLDER):
+    """
+    (position, color, dice roll) of every move of every recorded game
+    """
+    decisions = []
+    board = Board()
+    for file_path in sorted(Path(folder).glob('*.txt')):
+        board.reset()
+        for complete_move in load_moves(file_path):
+            decisions.append(
+                (board.export_position(), complete_move.color, complete_move.dice_roll)
+            )
+            for m in complete_move.moves:
+                board.do_single_move(m)
+    return decisions
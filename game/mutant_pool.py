@@ -0,0 +1,279 @@
+"""
+champion vs mutant games of the hill climber (see HillClimberModel) without tensorflow
+
+players are evaluators (callables from encoded positions to white winning
+probabilities), so games can be played in worker processes that only get
+weight arrays and keep their NumpyEvaluators for their whole life
+"""
+import multiprocessing as mp
+from typing import Callable
+
+import numpy as np
+
+from game.components import Board
+from game.components import Colors
+from game.components import Dice
+from game.evaluator import NumpyEvaluator
+from game.evaluator import StackedEvaluator
+from game.parallel import MP_CONTEXT
+from game.rules import find_legal_afterstates
+from game.rules import win_condition
+from game.search import white_prob_to_color
+from game.trajectory_store import GameRecorder
+
+
+def find_move_for_evaluator(
+    evaluator: Callable[[np.ndarray], np.ndarray],
+    color: str,
+    board: Board,
+    dice_roll: tuple[int, int],
+):
+    moves, _, states = find_legal_afterstates(board, color, dice_roll, encode=True)
+    if not moves:
+        return None
+    probs = white_prob_to_color(np.asarray(evaluator(np.stack(states))), color)
+    return moves[int(np.argmax(probs))]
+
+
+def play_game(
+    players: dict, starting_color: str, dice: Dice, writer=None, adjudicator=None
+) -> str:
+    """
+    plays a game between <players> (color -> evaluator) and returns the winner
+    <writer> - TrajectoryWriter or GameRecorder the game is recorded with
+    <adjudicator> - ends the game once its outcome is (nearly) certain (see Adjudicator),
+    the adjudicated winner and score are recorded
+    """
+    board = Board()
+    board.reset()
+
+    last_color = Colors.opponent(starting_color)
+    while win_condition(board, last_color) is None:
+        color_to_move = Colors.opponent(last_color)
+        if adjudicator is not None:
+            result = adjudicator(board, color_to_move)
+            if result is not None:
+                if writer is not None:
+                    writer.end_game(*result)
+                return result[0]
+
+        dice_roll = dice.throw()
+
+        move = find_move_for_evaluator(
+            players[color_to_move], color_to_move, board, dice_roll
+        )
+        if writer is not None:
+            writer.record(board, color_to_move, dice_roll, move)
+
+        # make move
+        if move:
+            for m in move:
+                board.do_single_move(m)
+
+        last_color = color_to_move
+
+    if writer is not None:
+        writer.end_game(last_color, win_condition(board, last_color))
+    return last_color
+
+
+def mutant_games(num_pairs: int, rng) -> list[tuple[str, str, int]]:
+    """
+    pairs of games with the same dice and starting color, the mutant plays both colors
+    """
+    games = []
+    for _ in range(num_pairs):
+        seed = rng.randint(1, 10000)
+        starting_color = rng.choice(Colors.colors)
+        for mutant_color in Colors.colors:
+            games.append((mutant_color, starting_color, seed))
+    return games
+
+
+def is_mutant_better(results: list[bool], num_pairs: int) -> bool:
+    return sum(results) >= num_pairs * 2 - 1
+
+
+def can_mutant_be_better(results: list[bool], num_pairs: int) -> bool:
+    """
+    whether is_mutant_better can still be True after the rest of the games,
+    <results> - the games played so far
+    """
+    return sum(results) + num_pairs * 2 - len(results) >= num_pairs * 2 - 1
+
+
+def play_mutant_games(
+    champion: Callable,
+    mutant: Callable,
+    games: list[tuple[str, str, int]],
+    writer=None,
+    adjudicator=None,
+) -> list[bool]:
+    """
+    serial version of MutantPool.play for any evaluators
+    """
+    results = []
+    for mutant_color, starting_color, seed in games:
+        players = {mutant_color: mutant, Colors.opponent(mutant_color): champion}
+        winner = play_game(
+            players, starting_color, Dice(seed=seed), writer, adjudicator
+        )
+        results.append(winner == mutant_color)
+    return results
+
+
+def play_population_games(
+    evaluator: StackedEvaluator,
+    games: list[tuple[int, str, str, int]],
+    adjudicator=None,
+) -> list[str]:
+    """
+    all <games> are played in lockstep, the candidate moves of every game
+    are evaluated in one call, each by the model that moves
+    (see StackedEvaluator.evaluate_models)
+
+    <games> are (model index, model color, starting color, dice seed),
+    the opponent is always model 0 (the champion), returns the winners
+    <adjudicator> - see play_game
+    """
+    boards = []
+    for _ in games:
+        board = Board()
+        board.reset()
+        boards.append(board)
+    dices = [Dice(seed=seed) for _, _, _, seed in games]
+    last_colors = [Colors.opponent(starting_color) for _, _, starting_color, _ in games]
+    winners = [None] * len(games)
+
+    active = list(range(len(games)))
+    while active:
+        if adjudicator is not None:
+            for i in active:
+                result = adjudicator(boards[i], Colors.opponent(last_colors[i]))
+                if result is not None:
+                    winners[i] = result[0]
+            active = [i for i in active if winners[i] is None]
+
+        turns = []
+        models = []
+        for i in active:
+            color = Colors.opponent(last_colors[i])
+            moves, _, states = find_legal_afterstates(
+                boards[i], color, dices[i].throw(), encode=True
+            )
+            turns.append((i, color, moves, states))
+            model, model_color, _, _ = games[i]
+            models += [model if color == model_color else 0] * len(moves)
+
+        states = [s for _, _, _, game_states in turns for s in game_states]
+        values = (
+            evaluator.evaluate_models(np.stack(states), np.array(models))
+            if states
+            else None
+        )
+
+        offset = 0
+        for i, color, moves, _ in turns:
+            if moves:
+                probs = white_prob_to_color(values[offset : offset + len(moves)], color)
+                for m in moves[int(np.argmax(probs))]:
+                    boards[i].do_single_move(m)
+                offset += len(moves)
+
+            last_colors[i] = color
+            if win_condition(boards[i], color) is not None:
+                winners[i] = color
+
+        active = [i for i in active if winners[i] is None]
+
+    return winners
+
+
+_WORKER_CHAMPION = None
+_WORKER_MUTANT = None
+
+
+def _init_mutant_worker(weights):
+    global _WORKER_CHAMPION
+    global _WORKER_MUTANT
+    _WORKER_CHAMPION = NumpyEvaluator(weights)
+    _WORKER_MUTANT = NumpyEvaluator(weights)
+
+
+def _play_mutant_game(
+    champion_weights,
+    mutant_weights,
+    mutant_color,
+    starting_color,
+    seed,
+    record,
+    adjudicator,
+):
+    _WORKER_CHAMPION.set_weights(champion_weights)
+    _WORKER_MUTANT.set_weights(mutant_weights)
+    players = {
+        mutant_color: _WORKER_MUTANT,
+        Colors.opponent(mutant_color): _WORKER_CHAMPION,
+    }
+    recorder = GameRecorder() if record else None
+    winner = play_game(players, starting_color, Dice(seed=seed), recorder, adjudicator)
+    return winner == mutant_color, recorder
+
+
+class MutantPool:
+    """
+    persistent worker pool playing champion vs mutant games,
+    only weight arrays are sent to the workers
+    """
+
+    def __init__(self, weights: list[np.ndarray], num_workers=None):
+        self.num_workers = num_workers or mp.cpu_count()
+        self._pool = MP_CONTEXT.Pool(
+            processes=self.num_workers,
+            initializer=_init_mutant_worker,
+            initargs=(weights,),
+        )
+
+    def play(
+        self,
+        champion_weights: list[np.ndarray],
+        mutant_weights: list[np.ndarray],
+        games: list[tuple[str, str, int]],
+        writer=None,
+        adjudicator=None,
+    ) -> list[bool]:
+        """
+        <games> are (mutant color, starting color, dice seed),
+        returns for every game if the mutant won it
+        games are recorded to the <writer> (TrajectoryWriter) in the parent if given
+        <adjudicator> - see play_game
+        """
+        results = self._pool.starmap(
+            _play_mutant_game,
+            [
+                (
+                    champion_weights,
+                    mutant_weights,
+                    *game,
+                    writer is not None,
+                    adjudicator,
+                )
+                for game in games
+            ],
+        )
+        if writer is not None:
+            for _, recorder in results:
+                writer.add_game(recorder)
+        return [mutant_won for mutant_won, _ in results]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,280 @@
+"""
+TD(lambda) training of the value network without tensorflow
+
+the network is small (one hidden layer of 80 sigmoids), so the gradient of the
+output w.r.t. the weights is written in closed form and weights, traces and
+gradients live in preallocated NumPy arrays that are updated in place
+
+same _LAMBDA, _ALPHA and reward as TDNardiModel, weights are saved to a .npz file
+that TDNardiModel can import (see TDNardiModel.import_weights / export_weights)
+"""
+import random
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from tqdm import tqdm
+
+from game.checkpointing import AsyncCheckpointer
+from game.components import Board
+from game.components import Colors
+from game.components import Dice
+from game.evaluator import load_weights_file
+from game.evaluator import NumpyEvaluator
+from game.evaluator import save_weights_file
+from game.evaluator import sigmoid
+from game.rules import td_reward
+from game.rules import win_condition
+from game.search import ANYTIME_MAX_PLIES
+from game.search import ExpectimaxSearch
+from game.telemetry import Telemetry
+
+HIDDEN_UNITS = 80
+
+
+def glorot_uniform(shape: tuple[int, int], rng: np.random.Generator) -> np.ndarray:
+    """
+    same initialization as keras Dense kernels
+    """
+    limit = np.sqrt(6 / sum(shape))
+    return rng.uniform(-limit, limit, size=shape).astype(np.float32)
+
+
+class NumpyTDModel:
+    _LAMBDA = 0.05
+    _ALPHA = 0.01
+
+    _CHECKPOINTS_PATH = Path('data') / 'checkpoints' / 'NumpyTDModel'
+    WEIGHTS_FILE = 'weights.npz'
+
+    def __init__(self, seed=None):
+        rng = np.random.default_rng(seed)
+        input_size = Board.encode_shape[0]
+        self.weights = [
+            glorot_uniform((input_size, HIDDEN_UNITS), rng),
+            np.zeros(HIDDEN_UNITS, dtype=np.float32),
+            glorot_uniform((HIDDEN_UNITS, 1), rng),
+            np.zeros(1, dtype=np.float32),
+        ]
+        # eligibility traces, initial value for e-> is 0
+        self.trace = [np.zeros_like(w) for w in self.weights]
+        self._grads = [np.zeros_like(w) for w in self.weights]
+        self._scratch = [np.zeros_like(w) for w in self.weights]
+
+        # evaluator shares the weight arrays, so in place updates are seen by the search
+        self.evaluator = NumpyEvaluator(self.weights)
+        self.search = ExpectimaxSearch(self.evaluator)
+
+        self.loss = np.inf
+        self.games_played = 0
+        self.total_moves_played = 0
+        self.total_white_wins = 0
+        self.total_black_wins = 0
+
+        # no tensorflow here, aggregates are only kept in memory unless a sink is set
+        self.telemetry = Telemetry(step=lambda: self.total_moves_played)
+
+        # see TDNardiModel.checkpointer
+        self.checkpointer = AsyncCheckpointer(self._save_snapshot)
+
+    def equity(self, board: Board, turn: str):
+        return self.evaluator(board.encode(turn)[np.newaxis])
+
+    def reset_episode(self):
+        for trace in self.trace:
+            trace.fill(0)
+
+    def find_move(
+        self,
+        color: str,
+        board: Board,
+        dice_roll: tuple[int, int],
+        plies=None,
+        deadline=None,
+    ):
+        """
+        see TDNardiModel.find_move
+        """
+        if deadline is not None:
+            return self.search.find_move_anytime(
+                color, board, dice_roll, deadline, max_plies=plies or ANYTIME_MAX_PLIES
+            )
+        return self.search.find_move(color, board, dice_roll, plies or 1)
+
+    def gradients(self, state: np.ndarray) -> float:
+        """
+        fills the gradient buffers with the gradient of the output w.r.t. weights
+        for a single encoded <state> and returns the output
+        """
+        hidden_kernel, hidden_bias, output_kernel, output_bias = self.weights
+        hidden = sigmoid(state @ hidden_kernel + hidden_bias)
+        value = float(sigmoid(hidden @ output_kernel[:, 0] + output_bias[0]))
+
+        d_output = value * (1 - value)
+        d_hidden = d_output * output_kernel[:, 0] * hidden * (1 - hidden)
+
+        np.outer(state, d_hidden, out=self._grads[0])
+        self._grads[1][:] = d_hidden
+        np.multiply(hidden, d_output, out=self._grads[2][:, 0])
+        self._grads[3][0] = d_output
+        return value
+
+    def update(self, color: str, board: Board, afterstate: Board, value_next: float):
+        """
+        TD(lambda) step for the move of <color> from <board> to <afterstate>
+
+        <value_next> is the probability of white winning for the <afterstate>
+        (see ExpectimaxSearch.last_value), it is replaced by the reward when the game is over
+        """
+        value_t = self.gradients(board.encode(color).astype(np.float32))
+
+        if afterstate.is_over:
+            target = td_reward(afterstate)
+            if win_condition(afterstate, Colors.WHITE):
+                self.total_white_wins += 1
+            elif win_condition(afterstate, Colors.BLACK):
+                self.total_black_wins += 1
+        else:
+            target = value_next
+
+        td_error = target - value_t
+        step = np.float32(self._ALPHA * td_error)
+        for weight, trace, grad, scratch in zip(
+            self.weights, self.trace, self._grads, self._scratch
+        ):
+            # e-> = lambda * e-> + <grad of output w.r.t weights>
+            trace *= self._LAMBDA
+            trace += grad
+
+            np.multiply(trace, step, out=scratch)
+            weight += scratch
+
+        self.loss = td_error**2
+
+        # cached evaluations are stale once weights change
+        self.search.clear_values()
+
+    def train(self, episodes=100, restore=True, backup=True):
+        if restore:
+            self.restore()
+
+        dice = Dice()
+        board = Board()
+
+        print()
+        print(f'Starting training cycle for {episodes} episodes')
+
+        with self._checkpointing(backup):
+            pbar = tqdm(range(episodes))
+            for _ in pbar:
+                board.reset()
+                self.reset_episode()
+
+                # randomly select who starts
+                starting_color = random.choice([Colors.WHITE, Colors.BLACK])
+
+                last_color = Colors.opponent(starting_color)
+                current_move = 0
+
+                while win_condition(board, last_color) is None:
+                    start_time = time.time()
+                    color_to_move = Colors.opponent(last_color)
+                    dice_roll = dice.throw()
+
+                    player_move = self.find_move(color_to_move, board, dice_roll)
+
+                    if player_move is not None:
+                        self.update(
+                            color_to_move,
+                            board,
+                            self.search.last_afterstate,
+                            self.search.last_value,
+                        )
+
+                        # make move
+                        for m in player_move:
+                            board.do_single_move(m)
+
+                    current_move += 1
+                    self.total_moves_played += 1
+
+                    last_color = color_to_move
+
+                    self.telemetry.observe('move_time', time.time() - start_time)
+
+                self.games_played += 1
+                move_time = self.telemetry.stat('move_time')
+                pbar.set_postfix(
+                    {
+                        'games': self.games_played,
+                        'moves': self.total_moves_played,
+                        'cur_moves': current_move,
+                        'avg_t': move_time.mean,
+                        'max_t': move_time.max,
+                        'loss': self.loss,
+                        'white': self.total_white_wins,
+                        'black': self.total_black_wins,
+                    }
+                )
+
+                if backup:
+                    self.checkpointer.maybe_save(self._snapshot, self.games_played)
+
+    def set_weights(self, weights: list[np.ndarray]):
+        """
+        copies <weights> (keras order) into the preallocated arrays
+        """
+        for weight, new_weight in zip(self.weights, weights):
+            weight[:] = np.asarray(new_weight, dtype=np.float32).reshape(weight.shape)
+        self.search.clear_cache()
+
+    def export(self, path):
+        save_weights_file(
+            path,
+            self.weights,
+            games_played=self.games_played,
+            total_moves_played=self.total_moves_played,
+        )
+
+    def _snapshot(self):
+        counters = {
+            'games_played': self.games_played,
+            'total_moves_played': self.total_moves_played,
+        }
+        return [w.copy() for w in self.weights], counters
+
+    def _save_snapshot(self, snapshot):
+        weights, counters = snapshot
+        save_weights_file(
+            self._CHECKPOINTS_PATH / self.WEIGHTS_FILE, weights, **counters
+        )
+
+    @contextmanager
+    def _checkpointing(self, backup=True):
+        """
+        final checkpoint when training stops, also on errors and Ctrl-C
+        """
+        try:
+            yield
+        finally:
+            if backup:
+                self.backup()
+
+    def backup(self):
+        """
+        saves a checkpoint now and waits until it's written
+        """
+        self.checkpointer.flush(self._snapshot())
+
+    def restore(self, path=None):
+        path = Path(path or self._CHECKPOINTS_PATH / self.WEIGHTS_FILE)
+        if not path.exists():
+            print('Initializing from scratch.')
+            return
+
+        weights, counters = load_weights_file(path)
+        self.set_weights(weights)
+        self.games_played = counters.get('games_played', 0)
+        self.total_moves_played = counters.get('total_moves_played', 0)
+        print(f'Restored from {path}')
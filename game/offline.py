@@ -0,0 +1,77 @@
+"""
+stored games as training trajectories for offline training (see TDNardiModel.train_offline)
+
+sources are a TrajectoryStore (self-play) or a folder of games recorded
+by game.match (HISTORY_FOLDER), both give Trajectory tuples
+where next_states of the last move is the final position
+"""
+from pathlib import Path
+
+import numpy as np
+
+from game.components import Board
+from game.components import Colors
+from game.match import HISTORY_FOLDER
+from game.match import load_moves
+from game.rules import td_reward
+from game.self_play import Trajectory
+from game.trajectory_store import TrajectoryStore
+from game.trajectory_store import unpack_board
+from game.trajectory_store import unpack_move
+
+
+def trajectory_from_boards(boards: list[Board], turns: list[str], moved: list[bool]):
+    """
+    <boards> are the positions before every turn and the final position,
+    turns where the player could not move are left out
+    """
+    encoded = [board.encode(turn) for board, turn in zip(boards, turns)]
+    final_board = boards[-1]
+    encoded.append(final_board.encode(Colors.opponent(turns[-1])))
+
+    indices = [i for i, m in enumerate(moved) if m]
+    return Trajectory(
+        np.array([encoded[i] for i in indices], dtype=np.float32),
+        np.array([encoded[i + 1] for i in indices], dtype=np.float32),
+        td_reward(final_board),
+        0,
+    )
+
+
+def store_trajectories(path):
+    store = TrajectoryStore(path)
+    for game in range(len(store)):
+        records = store.game_moves(game)
+        boards = [unpack_board(r['points'], r['tray']) for r in records]
+        turns = [Colors.colors[r['turn']] for r in records]
+
+        final_board = boards[-1].copy_board()
+        for m in unpack_move(records[-1]) or []:
+            final_board.do_single_move(m)
+
+        yield trajectory_from_boards(
+            boards + [final_board], turns, [r['move_length'] > 0 for r in records]
+        )
+
+
+def recorded_trajectories(folder=HISTORY_FOLDER):
+    """
+    games saved by game.match (see load_moves), unfinished games are skipped
+    """
+    for file_path in sorted(Path(folder).glob('*.txt')):
+        complete_moves = load_moves(file_path)
+
+        board = Board()
+        board.reset()
+        boards = [board.copy_board()]
+        for complete_move in complete_moves:
+            for m in complete_move.moves or []:
+                board.do_single_move(m)
+            boards.append(board.copy_board())
+
+        if complete_moves and board.is_over:
+            yield trajectory_from_boards(
+                boards,
+                [m.color for m in complete_moves],
+                [bool(m.moves) for m in complete_moves],
+            )
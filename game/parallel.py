@@ -0,0 +1,163 @@
+"""
+process pool backed search
+
+workers are started once and keep their own evaluator and search caches
+for their whole life, so there is no model reload per decision
+"""
+import multiprocessing as mp
+import time
+
+import numpy as np
+
+from game.components import Board
+from game.components import Colors
+from game.components import SingleMove
+from game.evaluator import EVALUATORS
+from game.search import DICE_ROLLS
+from game.search import DICE_WEIGHTS
+from game.search import ExpectimaxSearch
+from game.search import white_prob_to_color
+
+# spawned workers do not inherit tensorflow state of the parent
+MP_CONTEXT = mp.get_context('spawn')
+
+_WORKER_SEARCH = None
+
+
+def _init_search_worker(weights, evaluator, search_kwargs):
+    global _WORKER_SEARCH
+    _WORKER_SEARCH = ExpectimaxSearch(EVALUATORS[evaluator](weights), **search_kwargs)
+
+
+def _search_roll_value(search, position, turn, dice_roll, depth):
+    nodes_before = search.nodes_evaluated
+    board = Board.generate_from_position(position)
+    value = search.roll_value(board, turn, dice_roll, depth)
+    return value, search.nodes_evaluated - nodes_before
+
+
+def _roll_value(*task):
+    return _search_roll_value(_WORKER_SEARCH, *task)
+
+
+class SearchExecutor:
+    """
+    n-ply search where top level candidates (after 1-ply in the parent)
+    are split into (candidate, dice roll) tasks for the worker pool
+    and the results are merged into the expectation in the parent
+
+    <num_workers> processes, cpu count if None, with num_workers=0 the tasks
+    are run in this process. last_value is the searched probability of white
+    winning after the chosen move
+
+    <evaluator> - one of game.evaluator.EVALUATORS, used by the parent and the workers
+    <prefilter_top_n> - candidates are pre-filtered in the parent (see MovePrefilter)
+    """
+
+    def __init__(
+        self,
+        weights: list[np.ndarray],
+        num_workers=None,
+        top_k=5,
+        reply_top_k=2,
+        evaluator='numpy',
+        prefilter_top_n=None,
+    ):
+        self.num_workers = mp.cpu_count() if num_workers is None else num_workers
+        self._evaluator = evaluator
+        self._search_kwargs = {'top_k': top_k, 'reply_top_k': reply_top_k}
+        self.search = self._new_search(weights)
+        self.search.prefilter.top_n = prefilter_top_n
+        self.last_search_info = {}
+        self.last_value = None
+        self._pool = None
+        self._start(weights)
+
+    def _new_search(self, weights) -> ExpectimaxSearch:
+        return ExpectimaxSearch(
+            EVALUATORS[self._evaluator](weights), **self._search_kwargs
+        )
+
+    def _start(self, weights):
+        if not self.num_workers:
+            return
+        self._pool = MP_CONTEXT.Pool(
+            processes=self.num_workers,
+            initializer=_init_search_worker,
+            initargs=(weights, self._evaluator, self._search_kwargs),
+        )
+
+    def set_weights(self, weights: list[np.ndarray]):
+        """
+        workers are restarted, so only call it when weights actually change
+        """
+        self.close()
+        prefilter = self.search.prefilter
+        self.search = self._new_search(weights)
+        self.search.prefilter = prefilter
+        self._start(weights)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def find_move(
+        self, color: str, board: Board, dice_roll: tuple[int, int], plies=2
+    ) -> list[SingleMove]:
+        start = time.time()
+        nodes_before = self.search.nodes_evaluated
+
+        moves, afterstates = self.search.expand(board, color, dice_roll)
+        if not moves:
+            self.last_search_info = {'depth': 0, 'candidates': 0, 'nodes': 0}
+            return None
+
+        prefilter = self.search.prefilter
+        kept = prefilter.select(board, moves)
+        audited = prefilter.should_audit(len(moves), len(kept))
+        candidates = np.arange(len(moves)) if audited else kept
+
+        opponent = Colors.opponent(color)
+        probs = self.search._first_ply(afterstates, candidates, color)
+        nodes = self.search.nodes_evaluated - nodes_before
+
+        # nothing is searched deeper when a single candidate is left
+        depth = plies if len(candidates) > 1 else 1
+        if depth > 1:
+            candidates = np.argsort(-probs, kind='stable')[: self.search.top_k]
+            candidates = candidates[np.isfinite(probs[candidates])]
+            tasks = [
+                (afterstates[i].export_position(), opponent, dice_roll, plies - 1)
+                for i in candidates
+                for dice_roll in DICE_ROLLS
+            ]
+            if self._pool is not None:
+                results = self._pool.starmap(_roll_value, tasks)
+            else:
+                results = [_search_roll_value(self.search, *task) for task in tasks]
+            nodes += sum(n for _, n in results)
+
+            roll_values = np.array([v for v, _ in results]).reshape(
+                len(candidates), len(DICE_ROLLS)
+            )
+            probs = np.full(len(moves), -np.inf)
+            probs[candidates] = white_prob_to_color(roll_values @ DICE_WEIGHTS, color)
+
+        best = int(np.argmax(probs))
+        self.last_value = white_prob_to_color(probs[best], color)
+        prefilter.record(len(moves), len(kept), audited, audited and best not in kept)
+        self.last_search_info = {
+            'depth': depth,
+            'candidates': int(np.sum(np.isfinite(probs))),
+            'nodes': nodes,
+            'time': time.time() - start,
+        }
+        return moves[best]
@@ -0,0 +1,92 @@
+"""
+wall time breakdown of a piece of code by phases
+
+functions are wrapped in place (see PhaseProfiler.instrument) and the time
+between entering and leaving them is added to their phase. phases nest, time
+is only counted for the innermost one (e.g. boards copied by the move generator
+count as copying, not as move generation), so the phases and 'other'
+add up to the total
+"""
+import functools
+from collections import defaultdict
+from contextlib import contextmanager
+from timeit import default_timer as timer
+
+OTHER = 'other'
+
+
+class PhaseProfiler:
+    def __init__(self):
+        self.times = defaultdict(float)
+        self.calls = defaultdict(int)
+        self._stack = [OTHER]
+        self._last = None
+
+    def _switch(self):
+        now = timer()
+        if self._last is not None:
+            self.times[self._stack[-1]] += now - self._last
+        self._last = now
+
+    @contextmanager
+    def phase(self, name: str):
+        self._switch()
+        self._stack.append(name)
+        self.calls[name] += 1
+        try:
+            yield
+        finally:
+            self._switch()
+            self._stack.pop()
+
+    def wrap(self, func, name: str):
+        @functools.wraps(func)
+        def wrapped(*args, **kwargs):
+            with self.phase(name):
+                return func(*args, **kwargs)
+
+        return wrapped
+
+    @contextmanager
+    def instrument(self, targets):
+        """
+        <targets> are (owner, attribute name, phase), owner is a module, class or instance,
+        wrapped attributes are restored on exit
+        """
+        patched = []
+        try:
+            for owner, name, phase in targets:
+                raw = vars(owner).get(name)
+                if isinstance(raw, classmethod):
+                    wrapped = classmethod(self.wrap(raw.__func__, phase))
+                elif isinstance(raw, staticmethod):
+                    wrapped = staticmethod(self.wrap(raw.__func__, phase))
+                else:
+                    wrapped = self.wrap(getattr(owner, name), phase)
+                setattr(owner, name, wrapped)
+                patched.append((owner, name, raw))
+
+            self._switch()
+            yield self
+            self._switch()
+        finally:
+            for owner, name, raw in reversed(patched):
+                if raw is None:
+                    # instance attribute shadowing a method of the class
+                    delattr(owner, name)
+                else:
+                    setattr(owner, name, raw)
+
+    @property
+    def total(self) -> float:
+        return sum(self.times.values())
+
+    def report(self) -> str:
+        total = self.total
+        lines = []
+        for name, seconds in sorted(self.times.items(), key=lambda item: -item[1]):
+            line = f'{name:>16}: {seconds:8.2f}s {100 * seconds / total:5.1f}%'
+            if name in self.calls:
+                line += f' ({self.calls[name]} calls)'
+            lines.append(line)
+        return '\n'.join(lines)
@@ -0,0 +1,255 @@
+"""
+Monte Carlo rollouts: a position is played out many times with a bot policy
+
+to reduce variance the first roll is stratified, i.e. trial i starts with
+the (i mod 36)th of all 36 ordered dice outcomes, the rest of every game is
+played with a seeded Dice stream (trial seeds are <seed> + i)
+"""
+import random
+from typing import Callable
+from typing import NamedTuple
+from typing import Optional
+
+import numpy as np
+
+from game.components import Board
+from game.components import Colors
+from game.components import Dice
+from game.components import SingleMove
+from game.parallel import MP_CONTEXT
+from game.rules import find_legal_afterstates
+from game.rules import win_condition
+
+ALL_ROLLS = [(a, b) for a in range(1, 7) for b in range(1, 7)]
+
+
+class StratifiedDice(Dice):
+    """
+    first throw is fixed, the rest is a seeded random stream
+    """
+
+    def __init__(self, first_roll: tuple[int, int], seed=None):
+        super().__init__(seed=seed)
+        self._first_roll = first_roll
+
+    def throw(self):
+        if self._first_roll is not None:
+            first_roll, self._first_roll = self._first_roll, None
+            return first_roll
+        return super().throw()
+
+
+class RolloutResult(NamedTuple):
+    """
+    probabilities are for white, truncated games count their
+    estimated winning probability and no mars
+    """
+
+    num_games: int
+    num_truncated: int
+    white_win: float
+    white_win_se: float
+    white_mars: float
+    white_mars_se: float
+    black_mars: float
+    black_mars_se: float
+
+    @property
+    def black_win(self) -> float:
+        return 1 - self.white_win
+
+    @classmethod
+    def from_outcomes(cls, outcomes: np.ndarray, num_truncated=0):
+        """
+        outcomes is (num_games, 3) array of white win, white mars and black mars
+        """
+        num_games = len(outcomes)
+        means = outcomes.mean(axis=0)
+        errors = (
+            outcomes.std(axis=0, ddof=1) / np.sqrt(num_games)
+            if num_games > 1
+            else np.zeros(3)
+        )
+        return cls(
+            num_games,
+            num_truncated,
+            float(means[0]),
+            float(errors[0]),
+            float(means[1]),
+            float(errors[1]),
+            float(means[2]),
+            float(errors[2]),
+        )
+
+
+def play_out(
+    board: Board,
+    turn: str,
+    bots: dict,
+    dice: Dice,
+    max_moves: Optional[int] = None,
+    evaluator: Optional[Callable] = None,
+):
+    """
+    plays the game from <board> (changed in place) with <turn> to move
+
+    returns (white win, white mars, black mars, is truncated)
+    after <max_moves> the game is stopped and white winning
+    probability is taken from the <evaluator>
+    """
+    last_color = Colors.opponent(turn)
+    num_moves = 0
+    while win_condition(board, last_color) is None:
+        if max_moves is not None and num_moves >= max_moves:
+            state = board.encode(Colors.opponent(last_color))
+            white_win = float(np.asarray(evaluator(state[np.newaxis])).reshape(-1)[0])
+            return white_win, 0, 0, True
+
+        color_to_move = Colors.opponent(last_color)
+        player_move = bots[color_to_move].find_a_move(board, dice.throw())
+        if player_move:
+            for m in player_move:
+                board.do_single_move(m)
+
+        last_color = color_to_move
+        num_moves += 1
+
+    score = win_condition(board, last_color)
+    if last_color == Colors.WHITE:
+        return 1, int(score == 2), 0, False
+    else:
+        return 0, 0, int(score == 2), False
+
+
+def _run_trials(position, turn, bots, trials, seed, max_moves, evaluator):
+    outcomes = []
+    # bots that use random (e.g. RandomBot) are reproducible too,
+    # the caller's random stream is restored afterwards
+    random_state = random.getstate()
+    try:
+        for i in trials:
+            random.seed(seed + i)
+            dice = StratifiedDice(ALL_ROLLS[i % len(ALL_ROLLS)], seed=seed + i)
+            board = Board.generate_from_position(position)
+            outcomes.append(play_out(board, turn, bots, dice, max_moves, evaluator))
+    finally:
+        random.setstate(random_state)
+    return outcomes
+
+
+_WORKER_BOTS = None
+_WORKER_EVALUATOR = None
+
+
+def _init_rollout_worker(bot_type, evaluator):
+    global _WORKER_BOTS
+    global _WORKER_EVALUATOR
+    _WORKER_BOTS = {c: bot_type(c) for c in Colors.colors}
+    _WORKER_EVALUATOR = evaluator
+
+
+def _worker_trials(position, turn, trials, seed, max_moves):
+    return _run_trials(
+        position, turn, _WORKER_BOTS, trials, seed, max_moves, _WORKER_EVALUATOR
+    )
+
+
+class RolloutEngine:
+    """
+    <bot_type> is called with a color to create the policy for each side
+    (e.g. TDBot, HeuristicsBot, RandomBot or a functools.partial of them)
+
+    with <num_workers> the trials are split between long-lived worker processes,
+    each of them creates its bots once. <evaluator> is needed for truncated
+    rollouts and has to be picklable for workers (e.g. NumpyEvaluator)
+    """
+
+    def __init__(
+        self,
+        bot_type: Callable,
+        num_workers=None,
+        evaluator: Optional[Callable] = None,
+    ):
+        self._evaluator = evaluator
+        self._bots = None
+        self._pool = None
+        if num_workers:
+            self._pool = MP_CONTEXT.Pool(
+                processes=num_workers,
+                initializer=_init_rollout_worker,
+                initargs=(bot_type, evaluator),
+            )
+            self._num_workers = num_workers
+        else:
+            self._bots = {c: bot_type(c) for c in Colors.colors}
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def rollout(
+        self,
+        board: Board,
+        turn: str,
+        num_games=360,
+        seed=1,
+        max_moves: Optional[int] = None,
+    ) -> RolloutResult:
+        """
+        plays out the position <num_games> times with <turn> to move
+        (a multiple of 36 keeps the first roll stratification balanced)
+        """
+        if max_moves is not None and self._evaluator is None:
+            raise ValueError('Truncated rollouts need an evaluator')
+
+        position = board.export_position()
+        trials = list(range(num_games))
+
+        if self._pool is None:
+            outcomes = _run_trials(
+                position, turn, self._bots, trials, seed, max_moves, self._evaluator
+            )
+        else:
+            chunks = [trials[i :: self._num_workers] for i in range(self._num_workers)]
+            results = self._pool.starmap(
+                _worker_trials,
+                [(position, turn, c, seed, max_moves) for c in chunks if c],
+            )
+            outcomes = [o for r in results for o in r]
+
+        outcomes = np.array(outcomes, dtype=float)
+        return RolloutResult.from_outcomes(
+            outcomes[:, :3], num_truncated=int(np.sum(outcomes[:, 3]))
+        )
+
+    def rollout_moves(
+        self,
+        board: Board,
+        color: str,
+        dice_roll: tuple[int, int],
+        num_games=360,
+        seed=1,
+        max_moves: Optional[int] = None,
+    ) -> list[tuple[list[SingleMove], RolloutResult]]:
+        """
+        rolls out the afterstate of every legal move, best move for <color> first.
+        same seeds are used for every move so differences between moves are less noisy
+        """
+        results = []
+        moves, afterstates, _ = find_legal_afterstates(board, color, dice_roll)
+        for move, afterstate in zip(moves, afterstates):
+            result = self.rollout(
+                afterstate, Colors.opponent(color), num_games, seed, max_moves
+            )
+            results.append((move, result))
+
+        sign = 1 if color == Colors.WHITE else -1
+        return sorted(results, key=lambda r: -sign * r[1].white_win)
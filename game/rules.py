@@ -36,12 +36,13 @@ def get_board_from_cache(move):
     current_node = MOVE_CACHE
     afterstate = current_node['board']
 
+    # number of single moves already in cache
     counter = 0
-    for i, m in enumerate(move):
-        counter = i
+    for m in move:
         try:
             current_node = current_node['moves'][str(m)]
             afterstate = current_node['board']
+            counter += 1
         except KeyError:
             break
 
@@ -310,6 +311,29 @@ def find_complete_legal_moves(
     return complete_moves
 
 
+def find_legal_afterstates(
+    board: Board, color: str, dice_roll: tuple[int, int], encode=False
+):
+    """
+    same as find_complete_legal_moves, but also returns the afterstate of every move
+    (already computed by the move generator, so moves are not replayed)
+    if <encode> - afterstates are also encoded with the opponent to move
+
+    returns moves, afterstates and encoded afterstates (or None)
+    """
+    moves = find_complete_legal_moves(board, color, dice_roll)
+    afterstates = [
+        Board.generate_from_position(MOVE_BOARD_DICTIONARY[str(m)]) for m in moves
+    ]
+
+    states = None
+    if encode:
+        opponent = Colors.opponent(color)
+        states = [a.encode(opponent) for a in afterstates]
+
+    return moves, afterstates, states
+
+
 def win_condition(board: Board, color: str):
     """
     checks if any color has won
@@ -324,6 +348,13 @@ def win_condition(board: Board, color: str):
         return None
 
 
+def td_reward(after_board: Board) -> int:
+    points = {c: win_condition(after_board, c) for c in Colors.colors}
+
+    # ignoring mars for now
+    return 1 if points[Colors.WHITE] else 0
+
+
 def has_won(board, color):
     if board.num_checkers(color) == 0:
         return 0
@@ -0,0 +1,423 @@
+"""
+n-ply expectimax search on top of a batched position evaluator
+
+evaluator takes a batch of encoded positions (see Board.encode) and returns
+the probability of white winning for every position
+"""
+import logging
+import random
+import time
+from typing import Callable
+
+import numpy as np
+
+from game.bot import heuristics_eval_batch
+from game.components import Board
+from game.components import Colors
+from game.components import SingleMove
+from game.rules import find_legal_afterstates
+
+# 21 distinct rolls, doubles have probability 1/36, the rest 2/36
+DICE_ROLLS = [(a, b) for a in range(1, 7) for b in range(a, 7)]
+DICE_WEIGHTS = np.array([1 / 36 if a == b else 2 / 36 for a, b in DICE_ROLLS])
+# default depth limit of searches with a deadline (see find_move_anytime)
+ANYTIME_MAX_PLIES = 3
+
+
+class DeadlineReached(Exception):
+    pass
+
+
+def white_prob_to_color(white_prob, color: str):
+    if color == Colors.WHITE:
+        return white_prob
+    else:
+        return 1 - white_prob
+
+
+def terminal_value(board: Board):
+    """
+    probability of white winning if the game is over, None otherwise
+    """
+    if board.num_checkers(Colors.WHITE) == 0:
+        return 1.0
+    elif board.num_checkers(Colors.BLACK) == 0:
+        return 0.0
+    else:
+        return None
+
+
+class MovePrefilter:
+    """
+    cheap ranking of candidate moves before they are sent to the network
+
+    top <top_n> moves by <rank_func> (heuristics by default) are kept, plus all
+    moves ranked within <margin> of the last kept one. top_n=None disables it
+
+    to measure how often the eventual best move is thrown away, a share
+    (<audit_rate>) of decisions is made without filtering and the result
+    is checked against the moves the pre-filter would have kept
+    """
+
+    def __init__(
+        self,
+        rank_func: Callable = heuristics_eval_batch,
+        top_n=None,
+        margin=0.0,
+        audit_rate=0.1,
+        seed=None,
+    ):
+        self.rank_func = rank_func
+        self.top_n = top_n
+        self.margin = margin
+        self.audit_rate = audit_rate
+        self._random = random.Random(seed)
+
+        self.decisions = 0
+        self.candidates = 0
+        self.kept = 0
+        self.audits = 0
+        self.misses = 0
+
+    def select(self, board: Board, moves: list[list[SingleMove]]) -> np.ndarray:
+        """
+        indices of the moves that pass the filter
+        """
+        if self.top_n is None or len(moves) <= self.top_n:
+            return np.arange(len(moves))
+
+        ranks = np.asarray(self.rank_func(board, moves))
+        threshold = np.sort(ranks)[::-1][self.top_n - 1] - self.margin
+        return np.flatnonzero(ranks >= threshold)
+
+    def should_audit(self, num_moves: int, num_kept: int) -> bool:
+        return num_kept < num_moves and self._random.random() < self.audit_rate
+
+    def record(self, num_moves: int, num_kept: int, audited: bool, missed: bool):
+        self.decisions += 1
+        self.candidates += num_moves
+        self.kept += num_kept
+        self.audits += audited
+        self.misses += missed
+
+    @property
+    def stats(self) -> dict:
+        return {
+            'decisions': self.decisions,
+            'kept_ratio': self.kept / self.candidates if self.candidates else 1,
+            'audits': self.audits,
+            'misses': self.misses,
+            'miss_rate': self.misses / self.audits if self.audits else 0,
+        }
+
+
+class ExpectimaxSearch:
+    """
+    1-ply: every candidate afterstate is evaluated with a single batched call
+
+    n-ply: top <top_k> candidates after 1-ply are searched deeper,
+    for every survivor all 21 dice rolls of the opponent are expanded
+    and the opponent's best reply is taken (again pre-filtered to
+    <reply_top_k> by the static evaluation when more plies are left).
+    all leaves of one ply are evaluated with one call to the evaluator
+
+    before the 1st ply candidates can be pre-filtered with a cheap
+    ranking (see MovePrefilter, disabled by default)
+    """
+
+    def __init__(
+        self,
+        evaluator: Callable[[np.ndarray], np.ndarray],
+        top_k=5,
+        reply_top_k=2,
+        cache_size=20000,
+    ):
+        self._evaluator = evaluator
+        self.top_k = top_k
+        self.reply_top_k = reply_top_k
+        self.cache_size = cache_size
+
+        self._value_cache = {}
+        self._moves_cache = {}
+
+        self.nodes_evaluated = 0
+        self.prefilter = MovePrefilter()
+
+        # absolute time (time.time()) after which search is interrupted
+        self._deadline = None
+        self.last_search_info = {}
+        # afterstate of the last move returned by find_move(_anytime)
+        # and its static evaluation (probability of white winning)
+        self.last_afterstate = None
+        self.last_value = None
+
+    def clear_cache(self):
+        self._value_cache = {}
+        self._moves_cache = {}
+
+    def set_evaluator(self, evaluator: Callable[[np.ndarray], np.ndarray]):
+        self._evaluator = evaluator
+        self.clear_values()
+
+    def clear_values(self):
+        """
+        has to be called when the evaluator changes (e.g. after a training step)
+        """
+        self._value_cache = {}
+
+    def _store(self, cache: dict, key, value):
+        if len(cache) >= self.cache_size:
+            cache.clear()
+        cache[key] = value
+
+    def expand(self, board: Board, color: str, dice_roll: tuple[int, int]):
+        """
+        returns legal moves and their afterstates (cached)
+        """
+        if self._deadline is not None and time.time() > self._deadline:
+            raise DeadlineReached
+        key = (str(board.export_position()), color, dice_roll)
+        try:
+            return self._moves_cache[key]
+        except KeyError:
+            pass
+
+        moves, afterstates, _ = find_legal_afterstates(board, color, dice_roll)
+        self._store(self._moves_cache, key, (moves, afterstates))
+        return moves, afterstates
+
+    def evaluate(self, boards: list[Board], turn: str) -> np.ndarray:
+        """
+        static evaluation (probability of white winning) of positions with <turn> to move
+        terminal positions are scored exactly, known positions are taken from cache
+        and the rest is sent to the evaluator in one batch
+        """
+        values = np.empty(len(boards))
+        to_evaluate = []
+        keys = []
+        for i, board in enumerate(boards):
+            key = (str(board.export_position()), turn)
+            value = self._value_cache.get(key)
+            if value is None:
+                value = terminal_value(board)
+            if value is None:
+                to_evaluate.append(i)
+                keys.append(key)
+            else:
+                values[i] = value
+
+        if to_evaluate:
+            states = np.stack([boards[i].encode(turn) for i in to_evaluate])
+            outputs = np.asarray(self._evaluator(states)).reshape(-1)
+            self.nodes_evaluated += len(to_evaluate)
+            for i, key, value in zip(to_evaluate, keys, outputs):
+                values[i] = value
+                self._store(self._value_cache, key, float(value))
+
+        return values
+
+    def search(self, boards: list[Board], turn: str, depth: int) -> np.ndarray:
+        """
+        expectimax value (probability of white winning) of positions
+        with <turn> to move before the dice are thrown
+        """
+        if depth == 0:
+            return self.evaluate(boards, turn)
+
+        values = np.empty(len(boards))
+
+        # (board index, roll index) -> slice in replies
+        nodes = []
+        replies = []
+        for i, board in enumerate(boards):
+            value = terminal_value(board)
+            if value is not None:
+                values[i] = value
+                continue
+            for r, dice_roll in enumerate(DICE_ROLLS):
+                _, afterstates = self.expand(board, turn, dice_roll)
+                if not afterstates:
+                    # no legal move, turn passes with the same position
+                    afterstates = [board]
+                nodes.append((i, r, len(replies), len(replies) + len(afterstates)))
+                replies.extend(afterstates)
+
+        if not nodes:
+            return values
+
+        opponent = Colors.opponent(turn)
+        reply_values = self.evaluate(replies, opponent)
+
+        # look deeper only at the most promising replies
+        if depth > 1:
+            deeper_inds = []
+            for _, _, start, end in nodes:
+                color_values = white_prob_to_color(reply_values[start:end], turn)
+                best = np.argsort(-color_values, kind='stable')[: self.reply_top_k]
+                deeper_inds.extend(start + best)
+
+            deeper_values = self.search(
+                [replies[j] for j in deeper_inds], opponent, depth - 1
+            )
+            reply_values = np.full(len(replies), np.nan)
+            reply_values[deeper_inds] = deeper_values
+
+        expected = np.zeros(len(boards))
+        for i, r, start, end in nodes:
+            color_values = white_prob_to_color(reply_values[start:end], turn)
+            best_value = white_prob_to_color(np.nanmax(color_values), turn)
+            expected[i] += DICE_WEIGHTS[r] * best_value
+
+        searched = [i for i, *_ in nodes]
+        values[searched] = expected[searched]
+        return values
+
+    def _first_ply(self, afterstates: list[Board], candidates, color: str):
+        """
+        winning probabilities for <color> of the candidate afterstates,
+        -inf for the rest
+        """
+        probs = np.full(len(afterstates), -np.inf)
+        values = self.evaluate(
+            [afterstates[i] for i in candidates], Colors.opponent(color)
+        )
+        probs[candidates] = white_prob_to_color(values, color)
+        return probs
+
+    def roll_value(
+        self, board: Board, turn: str, dice_roll: tuple[int, int], depth: int
+    ) -> float:
+        """
+        value (probability of white winning) of a position with <turn> to move
+        after <dice_roll> is thrown, i.e. a single term of the expectation in search
+        """
+        value = terminal_value(board)
+        if value is not None:
+            return value
+
+        _, afterstates = self.expand(board, turn, dice_roll)
+        if not afterstates:
+            afterstates = [board]
+
+        opponent = Colors.opponent(turn)
+        values = self.evaluate(afterstates, opponent)
+
+        if depth > 1:
+            best = np.argsort(-white_prob_to_color(values, turn), kind='stable')
+            afterstates = [afterstates[j] for j in best[: self.reply_top_k]]
+            values = self.search(afterstates, opponent, depth - 1)
+
+        return white_prob_to_color(np.max(white_prob_to_color(values, turn)), turn)
+
+    def find_move(
+        self, color: str, board: Board, dice_roll: tuple[int, int], plies=1
+    ) -> list[SingleMove]:
+        start = time.time()
+        nodes_before = self.nodes_evaluated
+
+        moves, afterstates = self.expand(board, color, dice_roll)
+        if not moves:
+            self.last_search_info = {'depth': 0, 'candidates': 0, 'nodes': 0}
+            return None
+
+        kept = self.prefilter.select(board, moves)
+        audited = self.prefilter.should_audit(len(moves), len(kept))
+        candidates = np.arange(len(moves)) if audited else kept
+
+        opponent = Colors.opponent(color)
+        probs = self._first_ply(afterstates, candidates, color)
+        static_probs = probs
+
+        # nothing is searched deeper when a single candidate is left
+        depth = plies if len(candidates) > 1 else 1
+        if depth > 1:
+            candidates = np.argsort(-probs, kind='stable')[: self.top_k]
+            candidates = candidates[np.isfinite(probs[candidates])]
+            deep_values = self.search(
+                [afterstates[i] for i in candidates], opponent, plies - 1
+            )
+            probs = np.full(len(moves), -np.inf)
+            probs[candidates] = white_prob_to_color(deep_values, color)
+
+        best = int(np.argmax(probs))
+        self.last_afterstate = afterstates[best]
+        self.last_value = white_prob_to_color(static_probs[best], color)
+        self.prefilter.record(
+            len(moves), len(kept), audited, audited and best not in kept
+        )
+
+        self.last_search_info = {
+            'depth': depth,
+            'candidates': int(np.sum(np.isfinite(probs))),
+            'nodes': self.nodes_evaluated - nodes_before,
+            'time': time.time() - start,
+        }
+        logging.debug(
+            f'playing move {moves[best]} [winning prob = {probs[best]}] {self.last_search_info}'
+        )
+        return moves[best]
+
+    def find_move_anytime(
+        self,
+        color: str,
+        board: Board,
+        dice_roll: tuple[int, int],
+        deadline: float,
+        max_plies=ANYTIME_MAX_PLIES,
+    ) -> list[SingleMove]:
+        """
+        iterative deepening with a hard <deadline> (absolute time.time() value)
+
+        1-ply answer is always computed first. then candidates are searched
+        one by one (best first) at 2 plies, then 3 plies etc.
+        a deeper result is only used once at least two candidates are searched
+        at that depth, and only among the searched candidates
+        achieved depth and nodes evaluated are saved to last_search_info
+        """
+        start = time.time()
+        nodes_before = self.nodes_evaluated
+
+        moves, afterstates = self.expand(board, color, dice_roll)
+        if not moves:
+            self.last_search_info = {'depth': 0, 'candidates': 0, 'nodes': 0}
+            return None
+
+        opponent = Colors.opponent(color)
+        kept = self.prefilter.select(board, moves)
+        probs = self._first_ply(afterstates, kept, color)
+        ranking = list(np.argsort(-probs, kind='stable')[: len(kept)])
+        best = ranking[0]
+        depth = 1
+        num_candidates = len(kept)
+
+        self._deadline = deadline
+        try:
+            for plies in range(2, max_plies + 1):
+                if len(ranking) == 1:
+                    break
+                deep_probs = {}
+                for i in ranking:
+                    value = self.search([afterstates[i]], opponent, plies - 1)[0]
+                    deep_probs[i] = white_prob_to_color(value, color)
+                    if len(deep_probs) >= 2:
+                        best = max(deep_probs, key=deep_probs.get)
+                        depth = plies
+                        num_candidates = len(deep_probs)
+
+                # next depth starts from the best candidates of this one
+                ranking = sorted(deep_probs, key=deep_probs.get, reverse=True)
+        except DeadlineReached:
+            pass
+        finally:
+            self._deadline = None
+
+        self.last_search_info = {
+            'depth': depth,
+            'candidates': num_candidates,
+            'nodes': self.nodes_evaluated - nodes_before,
+            'time': time.time() - start,
+        }
+        self.last_afterstate = afterstates[best]
+        self.last_value = white_prob_to_color(probs[best], color)
+        logging.debug(f'playing move {moves[best]} {self.last_search_info}')
+        return moves[best]
@@ -0,0 +1,170 @@
+"""
+self-play actors for actor/learner training
+
+actor processes play games against themselves with a snapshot of the weights
+(1-ply search on a NumpyEvaluator, no tensorflow) and put the trajectories
+into a queue. the learner (see TDNardiModel.train_parallel) applies TD(lambda)
+updates and publishes new weights into shared memory, actors pick them up
+before their next game
+"""
+import queue
+import random
+from typing import NamedTuple
+
+import numpy as np
+
+from game.components import Board
+from game.components import Colors
+from game.components import Dice
+from game.evaluator import flatten_weights
+from game.evaluator import NumpyEvaluator
+from game.evaluator import unflatten_weights
+from game.parallel import MP_CONTEXT
+from game.rules import td_reward
+from game.search import ExpectimaxSearch
+
+
+class Trajectory(NamedTuple):
+    """
+    states[i] is the position before the i-th move, encoded for the color to move,
+    next_states[i] is the position after it, encoded for the opponent
+    (moves where a player could not move are left out)
+    reward is the TD reward of the final position
+    """
+
+    states: np.ndarray
+    next_states: np.ndarray
+    reward: int
+    weights_version: int
+
+
+def play_self_play_game(search: ExpectimaxSearch, dice: Dice, weights_version=0):
+    board = Board()
+    board.reset()
+
+    states = []
+    next_states = []
+    last_color = Colors.opponent(random.choice(Colors.colors))
+    while not board.is_over:
+        color_to_move = Colors.opponent(last_color)
+        player_move = search.find_move(color_to_move, board, dice.throw())
+
+        if player_move is not None:
+            states.append(board.encode(color_to_move))
+            for m in player_move:
+                board.do_single_move(m)
+            next_states.append(board.encode(Colors.opponent(color_to_move)))
+
+        last_color = color_to_move
+
+    return Trajectory(
+        np.array(states, dtype=np.float32),
+        np.array(next_states, dtype=np.float32),
+        td_reward(board),
+        weights_version,
+    )
+
+
+def _actor_loop(shared_weights, version, shapes, trajectories, stop, seed):
+    # games still buffered when stopped are dropped instead of blocking the exit
+    trajectories.cancel_join_thread()
+    random.seed(seed)
+    dice = Dice(seed=seed)
+    evaluator = NumpyEvaluator(unflatten_weights(np.zeros(len(shared_weights)), shapes))
+    search = ExpectimaxSearch(evaluator)
+
+    current_version = None
+    while not stop.is_set():
+        if version.value != current_version:
+            with shared_weights.get_lock():
+                flat = np.frombuffer(shared_weights.get_obj(), dtype=np.float32).copy()
+                current_version = version.value
+            evaluator.set_weights(unflatten_weights(flat, shapes))
+            search.clear_cache()
+
+        trajectory = play_self_play_game(search, dice, current_version)
+
+        # blocks while the learner is behind, gives up when stopped
+        while not stop.is_set():
+            try:
+                trajectories.put(trajectory, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+
+
+class SelfPlayActors:
+    """
+    <num_actors> processes playing self-play games, trajectories are read with get()
+    and new weights are sent with publish()
+
+    the queue holds at most <queue_size> games, so actors wait for a slow learner
+    instead of playing with older and older weights
+    """
+
+    def __init__(
+        self, weights: list[np.ndarray], num_actors=None, seed=1, queue_size=None
+    ):
+        self.num_actors = num_actors or MP_CONTEXT.cpu_count()
+        shapes = [np.shape(w) for w in weights]
+        flat = flatten_weights(weights)
+
+        self._shared_weights = MP_CONTEXT.Array('f', len(flat))
+        self._version = MP_CONTEXT.Value('i', 0)
+        self._trajectories = MP_CONTEXT.Queue(maxsize=queue_size or 2 * self.num_actors)
+        self._stop = MP_CONTEXT.Event()
+        self.publish(weights)
+
+        self._actors = [
+            MP_CONTEXT.Process(
+                target=_actor_loop,
+                args=(
+                    self._shared_weights,
+                    self._version,
+                    shapes,
+                    self._trajectories,
+                    self._stop,
+                    seed + i,
+                ),
+                daemon=True,
+            )
+            for i in range(self.num_actors)
+        ]
+        for actor in self._actors:
+            actor.start()
+
+    @property
+    def version(self) -> int:
+        return self._version.value
+
+    def publish(self, weights: list[np.ndarray]):
+        flat = flatten_weights(weights)
+        with self._shared_weights.get_lock():
+            np.frombuffer(self._shared_weights.get_obj(), dtype=np.float32)[:] = flat
+            self._version.value += 1
+
+    def get(self) -> Trajectory:
+        while True:
+            try:
+                return self._trajectories.get(timeout=1)
+            except queue.Empty:
+                if not any(actor.is_alive() for actor in self._actors):
+                    raise RuntimeError('All self-play actors have stopped')
+
+    def close(self):
+        self._stop.set()
+        # games nobody is going to read
+        try:
+            while True:
+                self._trajectories.get_nowait()
+        except queue.Empty:
+            pass
+        for actor in self._actors:
+            actor.join()
+        self._actors = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
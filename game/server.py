@@ -0,0 +1,243 @@
+"""
+local move evaluation service
+
+one process holds the model, clients (bots, GUIs, analysis jobs) send
+requests as single line JSON over a unix socket or localhost TCP:
+    {"position": ["1[W15]", "13[B15]"], "color": "W", "dice": [3, 4]}
+and get back the best move and its winning probability for the color:
+    {"move": ["W:1->4", "W:4->8"], "prob": 0.61}
+{"metrics": true} returns the server metrics instead
+
+afterstates of concurrent requests are put into a queue and evaluated
+together, a batch is closed after <batch_window> seconds or <max_batch_size>
+positions, whichever comes first
+"""
+import asyncio
+import json
+import logging
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import numpy as np
+
+from game.components import Board
+from game.components import SingleMove
+from game.evaluator import NumpyEvaluator
+from game.rules import find_legal_afterstates
+from game.search import white_prob_to_color
+from game.td_model import TDNardiModel
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+
+class ServerMetrics:
+    def __init__(self):
+        self.start_time = time.time()
+        self.requests = 0
+        self.positions = 0
+        self.batches = 0
+        self.max_batch_size = 0
+
+    def record_batch(self, batch_size: int):
+        self.batches += 1
+        self.positions += batch_size
+        self.max_batch_size = max(self.max_batch_size, batch_size)
+
+    def as_dict(self, queue_depth: int) -> dict:
+        uptime = time.time() - self.start_time
+        return {
+            'uptime': uptime,
+            'requests': self.requests,
+            'requests_per_sec': self.requests / uptime,
+            'positions': self.positions,
+            'positions_per_sec': self.positions / uptime,
+            'batches': self.batches,
+            'mean_batch_size': self.positions / self.batches if self.batches else 0,
+            'max_batch_size': self.max_batch_size,
+            'queue_depth': queue_depth,
+        }
+
+
+class MoveServer:
+    def __init__(
+        self,
+        evaluator: Callable[[np.ndarray], np.ndarray],
+        batch_window=0.002,
+        max_batch_size=2048,
+    ):
+        self._evaluator = evaluator
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.metrics = ServerMetrics()
+        self._queue = None
+
+        # move generator keeps global caches (see game.rules), so it runs in a single thread
+        self._moves_executor = ThreadPoolExecutor(max_workers=1)
+
+    def _prepare(self, request: dict):
+        board = Board.generate_from_position(request['position'])
+        color = request['color']
+        moves, _, states = find_legal_afterstates(
+            board, color, tuple(request['dice']), encode=True
+        )
+        return color, moves, states
+
+    async def _evaluate(self, states: list[np.ndarray]) -> np.ndarray:
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((np.stack(states), future))
+        return await future
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._queue.get()]
+            batch_size = len(items[0][0])
+            closes_at = loop.time() + self.batch_window
+
+            while batch_size < self.max_batch_size:
+                timeout = closes_at - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                items.append(item)
+                batch_size += len(item[0])
+
+            states = np.concatenate([s for s, _ in items])
+            try:
+                # forward pass runs in a thread so new requests keep coming in
+                outputs = await loop.run_in_executor(None, self._evaluator, states)
+                outputs = np.asarray(outputs).reshape(-1)
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.metrics.record_batch(len(states))
+            offset = 0
+            for s, future in items:
+                # requests cancelled meanwhile (timeout, disconnect) are skipped
+                if not future.done():
+                    future.set_result(outputs[offset : offset + len(s)])
+                offset += len(s)
+
+    async def handle_request(self, request: dict) -> dict:
+        if request.get('metrics'):
+            return self.metrics.as_dict(self._queue.qsize())
+
+        # move generation runs in a thread so that the batcher keeps collecting
+        loop = asyncio.get_running_loop()
+        color, moves, states = await loop.run_in_executor(
+            self._moves_executor, self._prepare, request
+        )
+        self.metrics.requests += 1
+        if not moves:
+            return {'move': None, 'prob': None}
+
+        probs = white_prob_to_color(await self._evaluate(states), color)
+        best = int(np.argmax(probs))
+        return {'move': [str(sm) for sm in moves[best]], 'prob': float(probs[best])}
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = await self.handle_request(json.loads(line))
+                except Exception as e:
+                    logging.exception('failed to handle request')
+                    response = {'error': str(e)}
+                writer.write((json.dumps(response) + '\n').encode())
+                await writer.drain()
+        finally:
+            writer.close()
+
+    def start_batcher(self) -> asyncio.Task:
+        self._queue = asyncio.Queue()
+        return asyncio.create_task(self._batcher())
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None):
+        batcher = self.start_batcher()
+        if unix_socket is not None:
+            server = await asyncio.start_unix_server(
+                self._handle_connection, unix_socket
+            )
+        else:
+            server = await asyncio.start_server(self._handle_connection, host, port)
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+
+class MoveClient:
+    """
+    blocking client, one connection per client
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None):
+        if unix_socket is not None:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(unix_socket)
+        else:
+            self._socket = socket.create_connection((host, port))
+        self._file = self._socket.makefile('rwb')
+
+    def request(self, request: dict) -> dict:
+        self._file.write((json.dumps(request) + '\n').encode())
+        self._file.flush()
+        response = json.loads(self._file.readline())
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response
+
+    def find_move(self, color: str, board: Board, dice_roll: tuple[int, int]):
+        response = self.request(
+            {'position': board.export_position(), 'color': color, 'dice': dice_roll}
+        )
+        if response['move'] is None:
+            return None
+        return [SingleMove.generate_from_str(sm) for sm in response['move']]
+
+    def metrics(self) -> dict:
+        return self.request({'metrics': True})
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+
+class ServerBot:
+    """
+    plays moves suggested by a running MoveServer
+    """
+
+    def __init__(self, color: str, **client_kwargs):
+        self._client = MoveClient(**client_kwargs)
+        self.color = color
+
+    def find_a_move(self, board, dice_roll) -> list[SingleMove]:
+        return self._client.find_move(self.color, board, dice_roll)
+
+
+def main():
+    model = TDNardiModel()
+    model.restore()
+    server = MoveServer(NumpyEvaluator.from_model(model.model))
+
+    print(f'Serving moves on {DEFAULT_HOST}:{DEFAULT_PORT}')
+    asyncio.run(server.serve())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+sequential probability ratio test (Wald) for comparing players
+
+games are played in batches and the test is checked after every batch, the
+comparison stops as soon as one of the hypotheses is accepted, clear cases
+(e.g. a trained network against RandomBot) are decided after a few games
+"""
+import math
+from typing import Optional
+
+BETTER = 'better'
+WORSE = 'worse'
+
+
+class SPRT:
+    """
+    H0: the player wins a game with probability <p0>, H1: with probability <p1>,
+    every game is a Bernoulli trial (games of a pair are treated as independent)
+
+    <alpha> - probability of accepting H1 (BETTER) when H0 is true
+    <beta> - probability of accepting H0 (WORSE) when H1 is true
+    """
+
+    def __init__(self, p0=0.45, p1=0.55, alpha=0.05, beta=0.05):
+        self.p0 = p0
+        self.p1 = p1
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+        self._win = math.log(p1 / p0)
+        self._loss = math.log((1 - p1) / (1 - p0))
+
+    def llr(self, wins: int, losses: int) -> float:
+        """
+        log likelihood ratio of H1 to H0
+        """
+        return wins * self._win + losses * self._loss
+
+    def decision(self, wins: int, losses: int) -> Optional[str]:
+        """
+        BETTER (H1), WORSE (H0) or None if more games are needed
+        """
+        llr = self.llr(wins, losses)
+        if llr >= self.upper:
+            return BETTER
+        if llr <= self.lower:
+            return WORSE
+        return None
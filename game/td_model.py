@@ -1,24 +1,48 @@
 import logging
 import random
 import time
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Optional
 
 import numpy as np
 import tensorflow as tf
 from keras.layers import Dense
 from keras.layers import Input
 from keras.models import Model
+from keras.optimizers import SGD
 from tqdm import tqdm
 
-from game.bot import Bot
+from game.adjudication import Adjudicator
+from game.background_eval import BackgroundEvaluation
 from game.bot import HeuristicsBot
 from game.bot import RandomBot
+from game.checkpointing import AsyncCheckpointer
+from game.checkpointing import KerasCheckpointWriter
 from game.components import Board
 from game.components import Colors
 from game.components import Dice
 from game.components import SingleMove
-from game.rules import find_complete_legal_moves
+from game.evaluator import EVALUATORS
+from game.evaluator import load_weights_file
+from game.evaluator import save_weights_file
+from game.parallel import SearchExecutor
+from game.rules import td_reward
 from game.rules import win_condition
+from game.search import ANYTIME_MAX_PLIES
+from game.search import ExpectimaxSearch
+from game.self_play import SelfPlayActors
+from game.sprt import SPRT
+from game.telemetry import Telemetry
+from game.telemetry import TensorBoardSink
+from game.tournament import BotPlayer
+from game.tournament import NetworkPlayer
+from game.tournament import Tournament
+from game.tournament import TournamentResult
+from game.trajectory_store import TrajectoryWriter
+
+# a batch of encoded positions of any length (e.g. all moves of a game)
+STATE_SPEC = tf.TensorSpec((None, *Board.encode_shape), tf.float32)
 
 
 class TDNardiModel:
@@ -28,18 +52,34 @@ class TDNardiModel:
     _CHECKPOINTS_PATH = Path('data') / 'checkpoints' / 'TDModel'
     _LOGS_PATH = Path('data') / 'logs' / 'TDModel'
 
+    # (tag, position, turn) of the positions logged by test_equity
+    EQUITY_TESTS = [
+        ('tests/equity_starting', ['1[W15]', '13[B15]'], Colors.WHITE),
+        ('tests/equity_white_to_win', ['24[W1]', '7[B15]'], Colors.WHITE),
+        ('tests/equity_white_to_mars', ['24[W1]', '13[B1]'], Colors.WHITE),
+        ('tests/equity black_to_win', ['12[B1]', '19[W15]'], Colors.BLACK),
+        ('tests/equity_black_to_mars', ['12[B1]', '1[W1]'], Colors.BLACK),
+    ]
+
     def __init__(self):
         inputs = Input(shape=Board.encode_shape, name='input')
         hidden = Dense(80, activation='sigmoid', name='hidden_layer_1')(inputs)
         outputs_single = Dense(1, activation='sigmoid', name='output')(hidden)
         self.model = Model(inputs=inputs, outputs=outputs_single)
 
-        self.trace = []
+        # eligibility traces, initial value for e-> is 0 (according to http://www.incompleteideas.net/book/ebook/node108.html#TD-Gammon)
+        self.trace = [
+            tf.Variable(tf.zeros(v.shape), trainable=False)
+            for v in self.model.trainable_variables
+        ]
         self.total_moves_played = tf.Variable(
             0, trainable=False, name='total_moves_played', dtype='int64'
         )
 
         self.writer = tf.summary.create_file_writer(str(self._LOGS_PATH))
+        self.telemetry = Telemetry(
+            TensorBoardSink(self.writer), step=lambda: int(self.total_moves_played)
+        )
 
         self.loss = tf.Variable(np.inf, trainable=False, name='loss')
         self.games_played = tf.Variable(
@@ -51,17 +91,55 @@ class TDNardiModel:
         self.total_white_wins = tf.Variable(0, trainable=False, name='total_white_wins')
         self.total_black_wins = tf.Variable(0, trainable=False, name='total_black_wins')
 
+        self._checkpoint_variables = {
+            'global_step': self.total_moves_played,
+            'loss': self.loss,
+            'games_played': self.games_played,
+            'moves_per_game': self.moves_per_game,
+        }
         self.checkpoint = tf.train.Checkpoint(
-            global_step=self.total_moves_played,
-            model=self.model,
-            loss=self.loss,
-            games_played=self.games_played,
-            moves_per_game=self.moves_per_game,
+            model=self.model, **self._checkpoint_variables
         )
 
-        self.manager = tf.train.CheckpointManager(
-            self.checkpoint, self._CHECKPOINTS_PATH, max_to_keep=3
+        # checkpoints are written by a background thread from snapshots,
+        # when is decided by checkpointer.policy (see CheckpointPolicy)
+        checkpoint_writer = KerasCheckpointWriter(
+            self.model, self._checkpoint_variables, self._CHECKPOINTS_PATH
         )
+        self.manager = checkpoint_writer.manager
+        self.checkpointer = AsyncCheckpointer(checkpoint_writer)
+
+        self.search = ExpectimaxSearch(self.evaluate_batch)
+
+        # see test_against_bot
+        self.tournament = None
+        self.tournament_workers = None
+        # see train(background_eval=True)
+        self.background_evaluation = None
+
+    def close(self):
+        """
+        stops the worker processes of test games and background evaluation
+        and the telemetry flusher (what's left is written)
+        """
+        self.telemetry.close()
+        if self.tournament is not None:
+            self.tournament.close()
+            self.tournament = None
+        if self.background_evaluation is not None:
+            self.background_evaluation.close()
+            self.background_evaluation = None
+
+    def evaluate_in_background(self, weights: list[np.ndarray], step: int):
+        """
+        tests of a weight snapshot run by a BackgroundEvaluation process,
+        results are logged to <_LOGS_PATH>/eval
+        """
+        if self.background_evaluation is None:
+            self.background_evaluation = BackgroundEvaluation(
+                self._LOGS_PATH / 'eval', self.EQUITY_TESTS
+            )
+        self.background_evaluation.submit(weights, step)
 
     def equity(self, board: Board, turn: str):
         state = board.encode(turn)
@@ -69,7 +147,8 @@ class TDNardiModel:
         return output.numpy()[0]
 
     def reset_episode(self):
-        self.trace = []
+        for trace in self.trace:
+            trace.assign(tf.zeros(trace.shape))
         self.current_move.assign(0)
         # board = Board()
         # board.reset()
@@ -77,97 +156,45 @@ class TDNardiModel:
         # self._value = tf.Variable(self.model(self._state[np.newaxis]))
 
     def test_equity(self):
-        board = Board.generate_from_position(['1[W15]', '13[B15]'])
-        starting_equity = self.equity(board, Colors.WHITE)
-
-        board.setup_position(['24[W1]', '7[B15]'])
-        white_to_win_equity = self.equity(board, Colors.WHITE)
-
-        board.setup_position(['24[W1]', '13[B1]'])
-        white_to_mars_equity = self.equity(board, Colors.WHITE)
-
-        board.setup_position(['12[B1]', '19[W15]'])
-        black_to_win_equity = self.equity(board, Colors.BLACK)
-
-        board.setup_position(['12[B1]', '1[W1]'])
-        black_to_mars_equity = self.equity(board, Colors.BLACK)
-
         with self.writer.as_default():
-            tf.summary.scalar(
-                'tests/equity_starting',
-                starting_equity[0],
-                step=self.games_played,
-            )
-            tf.summary.scalar(
-                'tests/equity_white_to_win',
-                white_to_win_equity[0],
-                step=self.games_played,
-            )
-            tf.summary.scalar(
-                'tests/equity_white_to_mars',
-                white_to_mars_equity[0],
-                step=self.games_played,
-            )
-            tf.summary.scalar(
-                'tests/equity black_to_win',
-                black_to_win_equity[0],
-                step=self.games_played,
-            )
-            tf.summary.scalar(
-                'tests/equity_black_to_mars',
-                black_to_mars_equity[0],
-                step=self.games_played,
-            )
+            for tag, position, turn in self.EQUITY_TESTS:
+                board = Board.generate_from_position(position)
+                tf.summary.scalar(
+                    tag, self.equity(board, turn)[0], step=self.games_played
+                )
             self.writer.flush()
 
-    def test_against_bot(self, bot: Bot, num_games=50):
-        scores = {Colors.WHITE: 0, Colors.BLACK: 0}
-        games_won = {Colors.WHITE: 0, Colors.BLACK: 0}
-
-        def _run_game(dice, starting_color):
-            last_color = Colors.opponent(starting_color)
-            board.reset()
-
-            while win_condition(board, last_color) is None:
-                color_to_move = Colors.opponent(last_color)
-                dice_roll = dice.throw()
-
-                if color_to_move == bot.color:
-                    player_move = bot.find_a_move(board, dice_roll)
-                else:
-                    player_move = self.find_move(color_to_move, board, dice_roll)
-
-                # make move
-                if player_move:
-                    for m in player_move:
-                        board.do_single_move(m)
-
-                last_color = color_to_move
-
-            scores[last_color] += win_condition(board, last_color)
-            games_won[last_color] += min(1, win_condition(board, last_color))
-
-        board = Board()
-
-        for i in range(num_games):
-            seed = random.randint(1, 10000)
-            _run_game(Dice(seed=seed), Colors.WHITE)
-            _run_game(Dice(seed=seed), Colors.BLACK)
-
-        try:
-            return (
-                games_won[Colors.opponent(bot.color)] / (num_games * 2),
-                scores[Colors.opponent(bot.color)] / scores[bot.color],
-            )
-        except ZeroDivisionError:
-            return (
-                games_won[Colors.opponent(bot.color)] / (num_games * 2),
-                scores[Colors.opponent(bot.color)],
+    def test_against_bot(
+        self,
+        bot_type,
+        num_games=50,
+        sprt: Optional[SPRT] = None,
+        adjudicator: Optional[Adjudicator] = None,
+    ) -> TournamentResult:
+        """
+        <num_games> pairs of games against <bot_type> (e.g. RandomBot) played by
+        a worker pool (see Tournament) that is started on the first call,
+        <tournament_workers> processes, all cpus if None
+        with an <sprt> games stop as soon as the test decides (num_games is the maximum),
+        with an <adjudicator> decided games are not played out (see Adjudicator)
+        """
+        if self.tournament is None:
+            self.tournament = Tournament(
+                NetworkPlayer(self.model.get_weights()),
+                BotPlayer(bot_type),
+                self.tournament_workers,
             )
+        return self.tournament.play(
+            num_games,
+            self.model.get_weights(),
+            opponent=BotPlayer(bot_type),
+            sprt=sprt,
+            adjudicator=adjudicator,
+        )
 
-    def test_against_random(self, num_games=10):
-        bot = RandomBot(Colors.WHITE)
-        win_ratio, score_ratio = self.test_against_bot(bot, num_games)
+    def test_against_random(self, num_games=10, sprt=None):
+        result = self.test_against_bot(RandomBot, num_games, sprt)
+        win_ratio, score_ratio = result.win_ratio, result.score_ratio
         with self.writer.as_default():
             tf.summary.scalar(
                 'tests/random_win_ratio', win_ratio, step=self.games_played
@@ -177,9 +204,9 @@ class TDNardiModel:
             )
             self.writer.flush()
 
-    def test_against_heuristics(self, num_games=10):
-        bot = HeuristicsBot(Colors.WHITE)
-        win_ratio, score_ratio = self.test_against_bot(bot, num_games)
+    def test_against_heuristics(self, num_games=10, sprt=None):
+        result = self.test_against_bot(HeuristicsBot, num_games, sprt)
+        win_ratio, score_ratio = result.win_ratio, result.score_ratio
         with self.writer.as_default():
             tf.summary.scalar(
                 'tests/heuristics_win_ratio', win_ratio, step=self.games_played
@@ -188,52 +215,41 @@ class TDNardiModel:
                 'tests/heuristics_score_ratio', score_ratio, step=self.games_played
             )
             self.writer.flush()
+        return win_ratio
 
-    def find_move(self, color: str, board: Board, dice_roll: tuple[int, int]):
+    def evaluate_batch(self, states: np.ndarray) -> np.ndarray:
         """
-        move is selected based on 1 ply depth
-        # TODO: try 2 or 3 ply, prefilter moves after 1st
+        probability of white winning for a batch of encoded positions
         """
-        start = time.time()
-
-        moves = find_complete_legal_moves(board, color, dice_roll)
-
-        end_complete_moves = time.time()
-
-        max_move = None
-        max_prob = -np.inf
-
-        def _get_prob(out):
-            if color == Colors.WHITE:
-                return out[0]
-            else:
-                return 1 - out[0]
-
-        for move in moves:
-
-            afterstate = board.copy_board()
-            for sm in move:
-                afterstate.do_single_move(sm)
-
-            state = afterstate.encode(Colors.opponent(color))
-            output = self.model(state[np.newaxis])
-
-            prob = _get_prob(output)
-
-            if prob > max_prob:
-                max_prob = prob
-                max_move = move
-
-        end_find_move = time.time()
+        return self.model(states, training=False).numpy()[:, 0]
+
+    def find_move(
+        self,
+        color: str,
+        board: Board,
+        dice_roll: tuple[int, int],
+        plies=None,
+        deadline=None,
+    ):
+        """
+        move is selected based on <plies> (1 by default) depth expectimax search
+        after the 1st ply only top moves are searched deeper (see ExpectimaxSearch)
 
-        duration = time.time() - start
-        logging.debug(
-            f'playing move {max_move} [winning prob = {max_prob}] [time to generate move = {end_complete_moves - start}] '
-            f'[time to find best move = {end_find_move - end_complete_moves}] [total time = {duration}]'
-        )
-        return max_move
+        if <deadline> (absolute time.time() value) is given, search deepens
+        until the deadline instead and <plies> is the maximum depth
+        (ANYTIME_MAX_PLIES by default)
+        """
+        if deadline is not None:
+            return self.search.find_move_anytime(
+                color, board, dice_roll, deadline, max_plies=plies or ANYTIME_MAX_PLIES
+            )
+        return self.search.find_move(color, board, dice_roll, plies or 1)
 
-    def update(self, color, board, move):
+    def update(self, color, board, move, afterstate=None):
+        """
+        TD(lambda) step for the <move> of <color> from <board>
+        <afterstate> (board after the move) is rebuilt if not given
+        """
         start = time.time()
 
         # current state s_t
@@ -247,22 +263,18 @@ class TDNardiModel:
         grads = tape.gradient(value_t, trainable_vars)
 
         # make move
-        afterstate_board = board.copy_board()
-        for m in move:
-            afterstate_board.do_single_move(m)
+        afterstate_board = afterstate
+        if afterstate_board is None:
+            afterstate_board = board.copy_board()
+            for m in move:
+                afterstate_board.do_single_move(m)
 
         state_t_next = afterstate_board.encode(Colors.opponent(color))
         value_t_next = self.model(state_t_next[np.newaxis])
 
-        def _reward(after_board):
-            points = {c: win_condition(after_board, c) for c in Colors.colors}
-
-            # ignoring mars for now
-            return 1 if points[Colors.WHITE] else 0
-
         # calculate reward and td_error (according to https://www.bkgm.com/articles/tesauro/tdl.html)
         if afterstate_board.is_over:
-            reward = _reward(afterstate_board)
+            reward = td_reward(afterstate_board)
             td_error = reward - value_t
         else:
             td_error = value_t_next - value_t
@@ -273,186 +285,422 @@ class TDNardiModel:
         # according to https://www.csd.uwo.ca/~xling/cs346a/extra/tdgammon.pdf
         td_error = tf.reduce_sum(td_error)
 
-        # initial value for e-> is 0 (according to http://www.incompleteideas.net/book/ebook/node108.html#TD-Gammon)
-        if len(self.trace) == 0:
-            for grad in grads:
-                self.trace.append(
-                    tf.Variable(tf.zeros(grad.get_shape()), trainable=False)
-                )
+        sampled = self.telemetry.should_sample()
+        for i in range(len(grads)):
 
-        with self.writer.as_default():
-            for i in range(len(grads)):
-
-                # e-> = lambda * e-> + <grad of output w.r.t weights>
-                self.trace[i].assign((self._LAMBDA * self.trace[i]) + grads[i])
-
-                grad_trace = self._ALPHA * td_error * self.trace[i]
-
-                # var_name = self.model.trainable_variables[i].name
-                # tf.summary.histogram(
-                #     var_name + '/traces', self.trace[i], step=self.total_moves_played
-                # )
-                # tf.summary.histogram(
-                #     var_name,
-                #     self.model.trainable_variables[i],
-                #     step=self.total_moves_played,
-                # )
-                # tf.summary.histogram(
-                #     var_name + '/gradients', grads[i], step=self.total_moves_played
-                # )
-                # tf.summary.histogram(
-                #     var_name + '/grad_traces',
-                #     grad_trace,
-                #     step=self.total_moves_played,
-                # )
-
-                self.model.trainable_variables[i].assign_add(grad_trace)
-
-            duration = time.time() - start
-            logging.debug(f'updating model [player = {color}] [duration = {duration}s]')
+            # e-> = lambda * e-> + <grad of output w.r.t weights>
+            self.trace[i].assign((self._LAMBDA * self.trace[i]) + grads[i])
 
-            tf.summary.scalar(
-                'game_stats/total_moves_played',
-                self.total_moves_played,
-                step=self.total_moves_played,
-            )
-            tf.summary.scalar(
-                'update_step_duration', duration, step=self.total_moves_played
-            )
+            grad_trace = self._ALPHA * td_error * self.trace[i]
 
-            # values
-            for i, v in enumerate(value_t.numpy()[0]):
-                tf.summary.scalar(
-                    f'train/value/value_{i}', v, step=self.total_moves_played
+            if sampled:
+                var_name = self.model.trainable_variables[i].name
+                self.telemetry.histogram(var_name + '/traces', self.trace[i].numpy())
+                self.telemetry.histogram(
+                    var_name, self.model.trainable_variables[i].numpy()
                 )
+                self.telemetry.histogram(var_name + '/gradients', grads[i].numpy())
+                self.telemetry.histogram(var_name + '/grad_traces', grad_trace.numpy())
 
-            for i, v in enumerate(value_t_next.numpy()[0]):
-                tf.summary.scalar(
-                    f'train/value_next/value_next_{i}', v, step=self.total_moves_played
-                )
+            self.model.trainable_variables[i].assign_add(grad_trace)
 
-            td_error_mean = tf.reduce_mean(td_error, name='td_error_mean')
-            tf.summary.scalar(
-                'train/td_error_mean', td_error_mean, step=self.total_moves_played
-            )
+        # cached evaluations are stale once weights change
+        self.search.clear_values()
 
-            # mean squared error of the difference between the next state and the current state
-            self.loss.assign(tf.reduce_mean(tf.square(value_t_next - value_t)))
-            tf.summary.scalar('train/loss', self.loss, step=self.total_moves_played)
-            tf.summary.scalar(
-                'game_stats/current_move',
-                self.current_move,
-                step=self.total_moves_played,
-            )
+        duration = time.time() - start
+        logging.debug(f'updating model [player = {color}] [duration = {duration}s]')
+
+        # mean squared error of the difference between the next state and the current state
+        self.loss.assign(tf.reduce_mean(tf.square(value_t_next - value_t)))
+
+        if win_condition(afterstate_board, Colors.WHITE):
+            self.total_white_wins.assign_add(1)
+        elif win_condition(afterstate_board, Colors.BLACK):
+            self.total_black_wins.assign_add(1)
+
+        self.telemetry.observe('update_step_duration', duration)
+        if sampled:
+            self.telemetry.observe('train/value', float(value_t[0, 0]))
+            self.telemetry.observe('train/value_next', float(value_t_next[0, 0]))
+            self.telemetry.observe('train/td_error', float(td_error))
+            self.telemetry.observe('train/loss', float(self.loss.numpy()))
+
+    @tf.function
+    def _fused_td_step(self, state_t, target):
+        """
+        forward pass, gradient, trace and weight updates in one graph
+        """
+        with tf.GradientTape() as tape:
+            value_t = self.model(state_t, training=False)
+
+        trainable_vars = self.model.trainable_variables
+        grads = tape.gradient(value_t, trainable_vars)
 
-            if win_condition(afterstate_board, Colors.WHITE):
+        td_error = tf.reduce_sum(target - value_t)
+        for trace, grad, var in zip(self.trace, grads, trainable_vars):
+            trace.assign(self._LAMBDA * trace + grad)
+            var.assign_add(self._ALPHA * td_error * trace)
+
+        self.loss.assign(tf.reduce_mean(tf.square(target - value_t)))
+        return td_error
+
+    def update_fused(self, color, board, afterstate, value_next):
+        """
+        compiled version of update
+
+        <value_next> is the probability of white winning for the <afterstate>
+        as already computed when the move was selected (see ExpectimaxSearch.last_value)
+        per move summaries are not written, only loss and number of wins are kept
+        """
+        state_t = board.encode(color)
+
+        if afterstate.is_over:
+            target = td_reward(afterstate)
+            if win_condition(afterstate, Colors.WHITE):
                 self.total_white_wins.assign_add(1)
-            elif win_condition(afterstate_board, Colors.BLACK):
+            elif win_condition(afterstate, Colors.BLACK):
                 self.total_black_wins.assign_add(1)
+        else:
+            target = value_next
 
-            tf.summary.scalar(
-                'game_stats/total_white_wins',
-                self.total_white_wins,
-                step=self.total_moves_played,
-            )
-            tf.summary.scalar(
-                'game_stats/total_black_wins',
-                self.total_black_wins,
-                step=self.total_moves_played,
-            )
+        td_error = self._fused_td_step(
+            tf.constant(state_t[np.newaxis], dtype=tf.float32),
+            tf.constant(target, dtype=tf.float32),
+        )
+        if self.telemetry.should_sample():
+            self.telemetry.observe('train/td_error', float(td_error))
+            self.telemetry.observe('train/loss', float(self.loss.numpy()))
 
-            self.writer.flush()
+        # cached evaluations are stale once weights change
+        self.search.clear_values()
+
+    @tf.function(
+        input_signature=[STATE_SPEC, STATE_SPEC, tf.TensorSpec((), tf.float32)]
+    )
+    def _td_trajectory(self, states, next_states, reward):
+        """
+        TD(lambda) updates for a whole game in one graph, target of the last move
+        is the <reward>, the others use the value of the next state after the previous updates
+        the graph is traced once for games of any length
+        """
+        num_moves = tf.shape(states)[0]
+        for t in tf.range(num_moves):
+            value_next = self.model(next_states[t : t + 1], training=False)[0, 0]
+            target = tf.where(t == num_moves - 1, reward, value_next)
+            self._fused_td_step(states[t : t + 1], target)
+
+    def train_parallel(
+        self, episodes=100, num_actors=None, publish_every=10, restore=True, backup=True
+    ):
+        """
+        actor/learner training: <num_actors> processes play self-play games
+        (see SelfPlayActors) and this model learns from their trajectories,
+        new weights are published to the actors every <publish_every> games
+        """
+        if restore:
+            self.restore()
+
+        print()
+        print(f'Starting parallel training for {episodes} episodes')
+
+        with SelfPlayActors(
+            self.model.get_weights(), num_actors
+        ) as actors, self._checkpointing(backup):
+            pbar = tqdm(range(episodes))
+            for i in pbar:
+                trajectory = actors.get()
+                start = time.time()
+
+                self.reset_episode()
+                self._td_trajectory(
+                    tf.constant(trajectory.states),
+                    tf.constant(trajectory.next_states),
+                    tf.constant(trajectory.reward, dtype=tf.float32),
+                )
+
+                num_moves = len(trajectory.states)
+                self.total_moves_played.assign_add(num_moves)
+                self.games_played.assign_add(1)
+                if trajectory.reward:
+                    self.total_white_wins.assign_add(1)
+                else:
+                    self.total_black_wins.assign_add(1)
+
+                self.telemetry.observe('learner_time', time.time() - start)
+                self.telemetry.observe('train/moves_per_game', num_moves)
+                self.telemetry.observe(
+                    'train/weights_lag', actors.version - trajectory.weights_version
+                )
+
+                if (i + 1) % publish_every == 0:
+                    actors.publish(self.model.get_weights())
+                if backup:
+                    self.checkpointer.maybe_save(
+                        self._snapshot, int(self.games_played.numpy())
+                    )
+
+                pbar.set_postfix(
+                    {
+                        'games': int(self.games_played.numpy()),
+                        'moves': int(self.total_moves_played.numpy()),
+                        'loss': self.loss.numpy(),
+                        'version': actors.version,
+                    }
+                )
+
+        self.search.clear_cache()
+        self.telemetry.flush()
+
+    def _lambda_returns(self, states, next_states, reward, lam):
+        """
+        TD(lambda) targets of a game from the current network:
+        G_t = (1 - lambda) * V(s_t+1) + lambda * G_t+1, the last move gets the <reward>
+        """
+        values_next = self.model(next_states, training=False)[:, 0]
+        returns = tf.scan(
+            lambda g, v: (1 - lam) * v + lam * g,
+            values_next[:-1],
+            initializer=reward,
+            reverse=True,
+        )
+        return states, tf.concat([returns, [reward]], axis=0)
+
+    def train_offline(
+        self,
+        trajectories,
+        epochs=1,
+        batch_size=256,
+        learning_rate=0.1,
+        lam=None,
+        shuffle_buffer=20000,
+        cache_path=None,
+        restore=True,
+        backup=True,
+    ):
+        """
+        minibatch training on stored games
+
+        <trajectories> returns an iterable of Trajectory (e.g. partial(store_trajectories, path),
+        see game.offline), games are encoded once and cached (in memory or in <cache_path>)
+        targets are recomputed with the current weights every epoch (see _lambda_returns),
+        <lam> defaults to _LAMBDA, with 1 the network learns the final outcomes (supervised)
+        """
+        if restore:
+            self.restore()
+
+        lam = self._LAMBDA if lam is None else lam
+        games = tf.data.Dataset.from_generator(
+            lambda: ((t.states, t.next_states, t.reward) for t in trajectories()),
+            output_signature=(STATE_SPEC, STATE_SPEC, tf.TensorSpec((), tf.float32)),
+        )
+        dataset = (
+            games.filter(lambda states, next_states, reward: tf.shape(states)[0] > 0)
+            .cache(cache_path or '')
+            .map(lambda *game: self._lambda_returns(*game, lam))
+            .unbatch()
+            .shuffle(shuffle_buffer)
+            .batch(batch_size)
+            .prefetch(tf.data.AUTOTUNE)
+        )
+
+        self.model.compile(optimizer=SGD(learning_rate), loss='mse')
+        history = self.model.fit(dataset, epochs=epochs)
+        self.search.clear_cache()
+
+        self.loss.assign(history.history['loss'][-1])
+        for epoch_loss in history.history['loss']:
+            self.telemetry.observe('train/offline_loss', epoch_loss)
+        self.telemetry.flush()
 
-    def train(self, episodes=100, restore=True):
+        if backup:
+            self.backup()
+        return history
+
+    def train(
+        self,
+        episodes=100,
+        restore=True,
+        fused=True,
+        test_every=100,
+        backup=True,
+        trajectory_path=None,
+        seed=None,
+        background_eval=False,
+    ):
+        """
+        <fused> - use the compiled update step (update_fused) instead of update
+        <test_every> - games between test runs, None to skip them
+        <backup> - save checkpoints in the background when checkpointer.policy says so
+            (test results against heuristics count as improvements) and when training stops
+        <trajectory_path> - played games are appended to this TrajectoryStore
+        <seed> - seed of the dice and starting colors
+        <background_eval> - tests are run by a background process while training goes on
+            (see evaluate_in_background), their results do not count as improvements
+        """
         if restore:
             self.restore()
 
-        test_every_n_moves = 100
+        writer = None
+        if trajectory_path is not None:
+            writer = TrajectoryWriter(trajectory_path)
 
-        dice = Dice()
+        test_every_n_moves = test_every
+
+        dice = Dice(seed=seed)
+        starting_colors = random.Random(seed)
         board = Board()
 
         print()
         print(f'Starting training cycle for {episodes} episodes')
 
-        move_time = []
-
-        pbar = tqdm(range(episodes))
-        for i in pbar:
+        with self._checkpointing(backup):
+            pbar = tqdm(range(episodes))
+            for i in pbar:
 
-            if i % test_every_n_moves == 0:
-                self.test_equity()
-                self.test_against_random()
-                self.test_against_heuristics()
+                win_ratio = None
+                if test_every_n_moves and i % test_every_n_moves == 0:
+                    if background_eval:
+                        self.evaluate_in_background(
+                            self.model.get_weights(), int(self.games_played.numpy())
+                        )
+                    else:
+                        self.test_equity()
+                        self.test_against_random()
+                        win_ratio = self.test_against_heuristics()
 
-            board.reset()
-            self.reset_episode()
+                board.reset()
+                self.reset_episode()
 
-            # randomly select who starts
-            starting_color = random.choice([Colors.WHITE, Colors.BLACK])
+                # randomly select who starts
+                starting_color = starting_colors.choice([Colors.WHITE, Colors.BLACK])
 
-            last_color = Colors.opponent(starting_color)
+                last_color = Colors.opponent(starting_color)
 
-            while win_condition(board, last_color) is None:
-                start_time = time.time()
-                color_to_move = Colors.opponent(last_color)
-                dice_roll = dice.throw()
+                while win_condition(board, last_color) is None:
+                    start_time = time.time()
+                    color_to_move = Colors.opponent(last_color)
+                    dice_roll = dice.throw()
 
-                player_move = self.find_move(color_to_move, board, dice_roll)
-
-                if player_move is not None:
-                    self.update(color_to_move, board, player_move)
+                    player_move = self.find_move(color_to_move, board, dice_roll)
+                    if writer is not None:
+                        writer.record(board, color_to_move, dice_roll, player_move)
+
+                    if player_move is not None and fused:
+                        self.update_fused(
+                            color_to_move,
+                            board,
+                            self.search.last_afterstate,
+                            self.search.last_value,
+                        )
+                    elif player_move is not None:
+                        self.update(
+                            color_to_move,
+                            board,
+                            player_move,
+                            afterstate=self.search.last_afterstate,
+                        )
 
                     # make move
-                    for m in player_move:
-                        board.do_single_move(m)
+                    if player_move is not None:
+                        for m in player_move:
+                            board.do_single_move(m)
+
+                    self.current_move.assign_add(1)
+                    self.total_moves_played.assign_add(1)
 
-                self.current_move.assign_add(1)
-                self.total_moves_played.assign_add(1)
+                    last_color = color_to_move
 
-                last_color = color_to_move
+                    self.telemetry.observe('move_time', time.time() - start_time)
 
-                move_time.append(time.time() - start_time)
-                avg_time_per_move = np.mean(move_time)
-                max_time_per_move = max(move_time)
+                if writer is not None:
+                    writer.end_game(last_color, win_condition(board, last_color))
 
+                self.games_played.assign_add(1)
+                moves_p_game = (
+                    self.total_moves_played.numpy() / self.games_played.numpy()
+                )
+                self.moves_per_game.assign(moves_p_game)
+
+                game_stats = {
+                    'games_played': int(self.games_played.numpy()),
+                    'total_moves_played': int(self.total_moves_played.numpy()),
+                    'moves_per_game': int(self.moves_per_game.numpy()),
+                    'current_move': int(self.current_move.numpy()),
+                    'total_white_wins': int(self.total_white_wins.numpy()),
+                    'total_black_wins': int(self.total_black_wins.numpy()),
+                }
+                for name, value in game_stats.items():
+                    self.telemetry.gauge(f'game_stats/{name}', value)
+
+                move_time = self.telemetry.stat('move_time')
                 pbar.set_postfix(
                     {
-                        'games': self.games_played.numpy(),
-                        'moves': self.total_moves_played.numpy(),
-                        'cur_moves': self.current_move.numpy(),
-                        'avg_t': avg_time_per_move,
-                        'max_t': max_time_per_move,
+                        'games': game_stats['games_played'],
+                        'moves': game_stats['total_moves_played'],
+                        'cur_moves': game_stats['current_move'],
+                        'avg_t': move_time.mean,
+                        'max_t': move_time.max,
                         'loss': self.loss.numpy(),
-                        'white': tf.reduce_sum(self.total_white_wins).numpy(),
-                        'black': tf.reduce_sum(self.total_black_wins).numpy(),
+                        'white': game_stats['total_white_wins'],
+                        'black': game_stats['total_black_wins'],
                     }
                 )
 
-            self.games_played.assign_add(1)
-            moves_p_game = self.total_moves_played.numpy() / self.games_played.numpy()
-            self.moves_per_game.assign(moves_p_game)
+                if backup:
+                    self.checkpointer.maybe_save(
+                        self._snapshot, game_stats['games_played'], win_ratio
+                    )
 
-            with self.writer.as_default():
-                tf.summary.scalar(
-                    'game_stats/games_played',
-                    self.games_played,
-                    step=self.total_moves_played,
-                )
-                tf.summary.scalar(
-                    'game_stats/moves_per_game',
-                    self.moves_per_game,
-                    step=self.total_moves_played,
-                )
-                self.writer.flush()
+        self.telemetry.flush()
 
-            self.backup()
+    def _snapshot(self):
+        values = {
+            name: variable.numpy()
+            for name, variable in self._checkpoint_variables.items()
+        }
+        return self.model.get_weights(), values, int(values['games_played'])
+
+    @contextmanager
+    def _checkpointing(self, backup=True):
+        """
+        final checkpoint when training stops, also on errors and Ctrl-C
+        """
+        try:
+            yield
+        finally:
+            if backup:
+                self.backup()
 
     def backup(self):
-        self.manager.save()
+        """
+        saves a checkpoint now and waits until it's written
+        """
+        self.checkpointer.flush(self._snapshot())
+
+    def export_weights(self, path):
+        """
+        weights and counters to a .npz file readable by NumpyTDModel
+        """
+        save_weights_file(
+            path,
+            self.model.get_weights(),
+            games_played=int(self.games_played.numpy()),
+            total_moves_played=int(self.total_moves_played.numpy()),
+        )
+
+    def import_weights(self, path):
+        """
+        weights and counters from a .npz file (e.g. written by NumpyTDModel)
+        """
+        weights, counters = load_weights_file(path)
+        self.model.set_weights(weights)
+        self.games_played.assign(counters.get('games_played', 0))
+        self.total_moves_played.assign(counters.get('total_moves_played', 0))
+        self.search.clear_cache()
 
     def restore(self):
         self.checkpoint.restore(self.manager.latest_checkpoint)
+        self.search.clear_cache()
         if self.manager.latest_checkpoint:
             print(f'Restored from {self.manager.latest_checkpoint}')
         else:
@@ -462,13 +710,78 @@ class TDNardiModel:
 class TDBot:
     """
     This bot uses TD model to play
+
+    if <time_budget> (seconds per move) is given, the bot deepens its search
+    up to <plies> (ANYTIME_MAX_PLIES by default) until the time is up
+    (see ExpectimaxSearch.find_move_anytime), otherwise <plies> defaults to 1
+
+    if <num_workers> is given, deeper than 1-ply search is spread over
+    a pool of worker processes (see SearchExecutor), call close() when done.
+    the pool has no time budget, and its workers can't run keras
+    (the 'numpy' evaluator computes the same values)
+
+    <prefilter_top_n> limits the moves sent to the network (see MovePrefilter)
+
+    <evaluator> selects the forward pass: 'keras' or one of game.evaluator.EVALUATORS
     """
 
-    def __init__(self, color: str):
+    def __init__(
+        self,
+        color: str,
+        plies=None,
+        top_k=5,
+        time_budget=None,
+        num_workers=None,
+        prefilter_top_n=None,
+        evaluator='keras',
+    ):
+        if time_budget is not None and plies == 1:
+            raise ValueError('A time budget needs more than 1 ply to deepen the search')
+        if num_workers and time_budget is not None:
+            raise ValueError('Searches in a worker pool have no time budget')
         model = TDNardiModel()
         model.restore()
+        if evaluator != 'keras':
+            model.search.set_evaluator(EVALUATORS[evaluator](model.model.get_weights()))
+        model.search.top_k = top_k
+        model.search.prefilter.top_n = prefilter_top_n
         self._model = model
         self._color = color
+        self._plies = plies
+        self._time_budget = time_budget
+
+        self._executor = None
+        if num_workers:
+            self._executor = SearchExecutor(
+                model.model.get_weights(),
+                num_workers=num_workers,
+                top_k=top_k,
+                evaluator='numpy' if evaluator == 'keras' else evaluator,
+                prefilter_top_n=prefilter_top_n,
+            )
+
+    @property
+    def last_search_info(self) -> dict:
+        """
+        achieved depth and number of nodes evaluated for the last move
+        """
+        if self._executor is not None:
+            return self._executor.last_search_info
+        return self._model.search.last_search_info
 
     def find_a_move(self, board, dice_roll) -> list[SingleMove]:
-        return self._model.find_move(self._color, board, dice_roll)
+        if self._time_budget is not None:
+            deadline = time.time() + self._time_budget
+            return self._model.find_move(
+                self._color, board, dice_roll, self._plies, deadline
+            )
+        elif self._executor is not None:
+            return self._executor.find_move(
+                self._color, board, dice_roll, self._plies or 1
+            )
+        return self._model.find_move(self._color, board, dice_roll, self._plies)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.close()
+        self._model.close()
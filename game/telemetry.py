@@ -0,0 +1,161 @@
+"""
+training telemetry with streaming aggregates
+
+values are aggregated in memory (count, mean, min, max) and written by a
+background thread every <flush_interval> seconds, so a training step only
+pays for a few additions. expensive diagnostics (histograms of weights, values
+that need a device sync) are recorded only on sampled steps, see Telemetry.should_sample
+"""
+import math
+import threading
+from typing import Callable
+from typing import Optional
+
+import numpy as np
+
+
+class RunningStat:
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.last = None
+
+    def add(self, value: float):
+        self.count += 1
+        self.mean += (value - self.mean) / self.count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.last = value
+
+
+class TensorBoardSink:
+    """
+    writes aggregates as tensorboard summaries with a tf.summary <writer>
+    """
+
+    def __init__(self, writer):
+        # imported here so that telemetry itself does not need tensorflow
+        import tensorflow as tf
+
+        self._tf = tf
+        self.writer = writer
+
+    def write(self, scalars: dict, histograms: dict, step: int):
+        with self.writer.as_default():
+            for name, value in scalars.items():
+                self._tf.summary.scalar(name, value, step=step)
+            for name, values in histograms.items():
+                self._tf.summary.histogram(name, values, step=step)
+        self.writer.flush()
+
+
+class Telemetry:
+    """
+    observe - value aggregated per flush window (written as <name>/mean, /max)
+        and over the whole run (see totals)
+    count - counter, written as is
+    gauge - last value, written as is
+    histogram - values collected on sampled steps only
+
+    <sink> has write(scalars, histograms, step), None keeps aggregates in memory only
+    <step> returns the global step the aggregates are written at
+    <sample_rate> fraction of should_sample() calls that return True
+    """
+
+    def __init__(
+        self,
+        sink=None,
+        step: Optional[Callable[[], int]] = None,
+        sample_rate=0.01,
+        flush_interval=10.0,
+        max_histogram_values=100000,
+    ):
+        self.sink = sink
+        self._step = step or (lambda: 0)
+        self._sample_every = max(1, round(1 / sample_rate)) if sample_rate else None
+        self._sample_calls = 0
+        self.max_histogram_values = max_histogram_values
+
+        self.totals = {}
+        self.counters = {}
+        self.gauges = {}
+        self._window = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+        self._stop = threading.Event()
+        self._flusher = None
+        if sink is not None and flush_interval:
+            self._flusher = threading.Thread(
+                target=self._flush_loop, args=(flush_interval,), daemon=True
+            )
+            self._flusher.start()
+
+    def should_sample(self) -> bool:
+        if self._sample_every is None:
+            return False
+        sampled = self._sample_calls % self._sample_every == 0
+        self._sample_calls += 1
+        return sampled
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            if name not in self.totals:
+                self.totals[name] = RunningStat()
+            self.totals[name].add(value)
+            if name not in self._window:
+                self._window[name] = RunningStat()
+            self._window[name].add(value)
+
+    def count(self, name: str, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name: str, value: float):
+        with self._lock:
+            self.gauges[name] = value
+
+    def histogram(self, name: str, values):
+        values = np.asarray(values).reshape(-1)
+        with self._lock:
+            collected = self._histograms.setdefault(name, [])
+            if sum(len(v) for v in collected) < self.max_histogram_values:
+                collected.append(values)
+
+    def stat(self, name: str) -> RunningStat:
+        """
+        aggregate over the whole run
+        """
+        return self.totals.get(name, RunningStat())
+
+    def flush(self):
+        with self._lock:
+            window, self._window = self._window, {}
+            histograms, self._histograms = self._histograms, {}
+            scalars = dict(self.counters)
+            scalars.update(self.gauges)
+
+        if self.sink is None:
+            return
+
+        for name, stat in window.items():
+            scalars[f'{name}/mean'] = stat.mean
+            scalars[f'{name}/max'] = stat.max
+        histograms = {k: np.concatenate(v) for k, v in histograms.items()}
+        self.sink.write(scalars, histograms, self._step())
+
+    def _flush_loop(self, flush_interval):
+        while not self._stop.wait(flush_interval):
+            self.flush()
+
+    def close(self):
+        """
+        stops the background flusher and writes what's left
+        """
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        self.flush()
@@ -0,0 +1,123 @@
+import math
+
+from game.adjudication import _bear_off_roll
+from game.adjudication import Adjudicator
+from game.adjudication import bear_off_probability
+from game.adjudication import bear_off_turns
+from game.adjudication import has_contact
+from game.adjudication import home_counts
+from game.adjudication import ROLLS
+from game.bot import RandomBot
+from game.components import Board
+from game.components import Colors
+from game.components import Dice
+from game.evaluator import NumpyEvaluator
+from game.mutant_pool import play_game
+from game.rules import find_complete_legal_moves
+from game.tests.test_evaluator import random_weights
+from game.tests.test_sprt import PassingPlayer
+from game.tournament import BotPlayer
+from game.tournament import Tournament
+from game.trajectory_store import GameRecorder
+
+
+def test_has_contact():
+    board = Board()
+    board.reset()
+    assert has_contact(board)
+    # black checkers on 12 are on the last point of their way
+    assert not has_contact(Board.generate_from_position(['13[W5]', '12[B5]']))
+    assert has_contact(Board.generate_from_position(['1[W15]', '12[B15]']))
+
+
+def test_bear_off_turns():
+    turns = bear_off_turns((0, 0, 0, 0, 0, 2))
+    assert math.isclose(turns[1], 1)
+    turns = bear_off_turns((15, 0, 0, 0, 0, 0))
+    assert math.isclose(turns.sum(), 1)
+    assert turns[:4].sum() == 0
+
+    # 3 checkers are borne off in one turn with doubles only
+    assert math.isclose(
+        bear_off_probability((0, 0, 0, 0, 0, 3), (0, 0, 0, 0, 0, 1)), 1 / 6
+    )
+
+
+def _legal_home_counts(counts, dice) -> set:
+    # home counts of white after every complete legal move
+    position = [f'{p}[W{n}]' for p, n in zip(Board.HOME_POINTS, counts) if n]
+    position.append('12[B1]')
+    results = set()
+    for move in find_complete_legal_moves(
+        Board.generate_from_position(position), Colors.WHITE, dice
+    ):
+        board = Board.generate_from_position(position)
+        for m in move:
+            board.do_single_move(m)
+        results.add(home_counts(board, Colors.WHITE))
+    return results
+
+
+def test_bear_off_turns_follow_the_rules():
+    # overshooting is only allowed when no checker further back can move
+    for counts in [(1, 0, 0, 0, 0, 1), (0, 2, 0, 1, 1, 0), (3, 0, 1, 0, 0, 2)]:
+        for dice, _ in ROLLS:
+            assert _bear_off_roll(counts, dice) in _legal_home_counts(counts, dice)
+
+    counts = (1, 0, 0, 0, 0, 1)
+    one_turn = sum(
+        probability
+        for dice, probability in ROLLS
+        if (0,) * 6 in _legal_home_counts(counts, dice)
+    )
+    assert math.isclose(bear_off_turns(counts)[1], one_turn)
+
+
+def test_adjudicate_bear_off():
+    adjudicator = Adjudicator()
+    board = Board.generate_from_position(['24[W3]', '12[B1]'])
+    assert adjudicator(board, Colors.BLACK) == (Colors.BLACK, 1)
+    assert adjudicator(board, Colors.WHITE) is None
+
+
+def test_adjudicate_pip_lead():
+    board = Board.generate_from_position(['13[W10]', '6[B5]'])
+    # white needs 60 pips to get home, black only 35 to finish
+    assert Adjudicator()(board, Colors.WHITE) == (Colors.BLACK, 2)
+    assert Adjudicator(pip_lead=None)(board, Colors.WHITE) is None
+
+    board = Board.generate_from_position(['1[W15]', '6[B15]'])
+    assert Adjudicator()(board, Colors.WHITE) is None
+    assert Adjudicator(contact_pip_lead=0.5)(board, Colors.WHITE) == (Colors.BLACK, 2)
+
+
+def test_short_races_are_not_adjudicated_by_pip_lead():
+    # one white checker 7 pips away against 5 black checkers 1 pip away,
+    # white on roll bears off first
+    board = Board.generate_from_position(['18[W1]', '12[B5]'])
+    assert Adjudicator()(board, Colors.WHITE) is None
+    assert Adjudicator(min_pips=0)(board, Colors.WHITE) == (Colors.WHITE, 1)
+
+
+def test_adjudicated_games_are_recorded():
+    recorder = GameRecorder()
+    evaluator = NumpyEvaluator(random_weights(0))
+    # any lead is enough, the game is adjudicated before the first move
+    winner = play_game(
+        {Colors.WHITE: evaluator, Colors.BLACK: evaluator},
+        Colors.WHITE,
+        Dice(seed=1),
+        recorder,
+        Adjudicator(contact_pip_lead=0),
+    )
+    assert (winner, recorder.winner, recorder.score) == (Colors.WHITE, Colors.WHITE, 1)
+
+
+def test_tournament_counts_adjudicated_games():
+    with Tournament(PassingPlayer(), BotPlayer(RandomBot), num_workers=0) as tournament:
+        result = tournament.play(
+            1, seed=1, adjudicator=Adjudicator(contact_pip_lead=0.5)
+        )
+    assert result.games == 2
+    assert result.adjudicated == 2
+    assert result.wins == 0
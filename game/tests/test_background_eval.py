@@ -0,0 +1,84 @@
+import numpy as np
+import tensorflow as tf
+
+from game.background_eval import BackgroundEvaluation
+from game.background_eval import equity_scalars
+from game.background_eval import snapshot_scalars
+from game.bot import RandomBot
+from game.components import Board
+from game.components import Colors
+from game.evaluator import NumpyEvaluator
+from game.tests.test_evaluator import random_weights
+from game.tournament import BotPlayer
+from game.tournament import NetworkPlayer
+from game.tournament import Tournament
+
+EQUITY_TESTS = [
+    ('tests/equity_starting', ['1[W15]', '13[B15]'], Colors.WHITE),
+    ('tests/equity black_to_win', ['12[B1]', '19[W15]'], Colors.BLACK),
+]
+
+
+def test_equity_scalars():
+    evaluator = NumpyEvaluator(random_weights(0))
+    scalars = equity_scalars(evaluator, EQUITY_TESTS)
+
+    assert list(scalars) == [tag for tag, _, _ in EQUITY_TESTS]
+    for tag, position, turn in EQUITY_TESTS:
+        state = Board.generate_from_position(position).encode(turn)
+        np.testing.assert_allclose(scalars[tag], evaluator(state[np.newaxis])[0])
+
+
+def test_snapshot_scalars():
+    weights = random_weights(0)
+    tournament = Tournament(
+        NetworkPlayer(random_weights(1)), BotPlayer(RandomBot), num_workers=0
+    )
+    scalars = snapshot_scalars(
+        tournament, weights, EQUITY_TESTS, 1, bots={'random': RandomBot}
+    )
+
+    assert set(scalars) == {
+        'tests/equity_starting',
+        'tests/equity black_to_win',
+        'tests/random_win_ratio',
+        'tests/random_score_ratio',
+    }
+    assert scalars['tests/random_win_ratio'] in (0, 0.5, 1)
+
+
+def _logged_steps(log_dir) -> dict:
+    # tag -> steps it was written at
+    steps = {}
+    for path in log_dir.iterdir():
+        for record in tf.data.TFRecordDataset(str(path)):
+            event = tf.compat.v1.Event.FromString(record.numpy())
+            for value in event.summary.value:
+                steps.setdefault(value.tag, []).append(event.step)
+    return steps
+
+
+def test_background_evaluation(tmp_path):
+    evaluation = BackgroundEvaluation(
+        tmp_path, EQUITY_TESTS, num_games=1, bots={'random': RandomBot}
+    )
+    submitted = [5, 7, 9]
+    for step in submitted:
+        evaluation.submit(random_weights(step), step)
+    # the evaluation process is still starting, older snapshots are dropped
+    assert evaluation.dropped
+    evaluation.close()
+
+    steps = _logged_steps(tmp_path)
+    assert set(steps) == {
+        'tests/equity_starting',
+        'tests/equity black_to_win',
+        'tests/random_win_ratio',
+        'tests/random_score_ratio',
+    }
+    evaluated = steps['tests/random_win_ratio']
+    # every snapshot is either evaluated at its own step or dropped, the newest one never
+    assert all(tag_steps == evaluated for tag_steps in steps.values())
+    assert evaluated == sorted(evaluated) and evaluated[-1] == submitted[-1]
+    assert set(evaluated) <= set(submitted)
+    assert len(evaluated) + evaluation.dropped == len(submitted)
@@ -0,0 +1,30 @@
+from numpy.testing import assert_almost_equal
+from pytest import mark
+
+from game.bot import heuristics_eval_batch
+from game.bot import heuristics_eval_func
+from game.components import Board
+from game.components import Colors
+from game.rules import find_complete_legal_moves
+
+
+@mark.parametrize(
+    'position, color, dice_roll',
+    [
+        (['1[W15]', '13[B15]'], Colors.WHITE, (3, 4)),
+        (['1[W15]', '13[B15]'], Colors.BLACK, (6, 6)),
+        (
+            ['1[W10]', '3[W2]', '5[W1]', '8[W2]', '13[B12]', '15[B2]', '20[B1]'],
+            Colors.WHITE,
+            (2, 2),
+        ),
+        (['19[W3]', '21[W2]', '24[W5]', '25[W5]', '7[B15]'], Colors.WHITE, (6, 3)),
+        (['12[B2]', '9[B1]', '0[B12]', '24[W15]'], Colors.BLACK, (5, 1)),
+    ],
+)
+def test_heuristics_eval_batch(position, color, dice_roll):
+    board = Board.generate_from_position(position)
+    moves = find_complete_legal_moves(board, color, dice_roll)
+
+    expected = [heuristics_eval_func(board, m) for m in moves]
+    assert_almost_equal(heuristics_eval_batch(board, moves), expected)
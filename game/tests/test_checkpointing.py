@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+
+from game.checkpointing import AsyncCheckpointer
+from game.checkpointing import CheckpointPolicy
+
+
+def test_policy_every_games():
+    policy = CheckpointPolicy(every_games=10, every_seconds=None, on_improvement=False)
+    # counting starts at the first game seen (e.g. of a restored model)
+    assert not policy.due(100)
+    assert not policy.due(109)
+    assert policy.due(110)
+    policy.saved(110)
+    assert not policy.due(115)
+
+
+def test_policy_every_seconds():
+    policy = CheckpointPolicy(every_games=None, every_seconds=0, on_improvement=False)
+    assert policy.due(1)
+
+    policy = CheckpointPolicy(
+        every_games=None, every_seconds=None, on_improvement=False
+    )
+    assert not policy.due(1000)
+
+
+def test_policy_on_improvement():
+    policy = CheckpointPolicy(every_games=None, every_seconds=None)
+    assert not policy.due(1)
+    assert policy.due(2, 0.5)
+    assert not policy.due(3, 0.4)
+    assert not policy.due(4, 0.5)
+    assert policy.due(5, 0.6)
+
+
+def test_async_checkpointer_keeps_newest_snapshot():
+    saved = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def save(snapshot):
+        started.set()
+        release.wait()
+        saved.append(snapshot)
+
+    checkpointer = AsyncCheckpointer(
+        save, CheckpointPolicy(every_games=1, every_seconds=None)
+    )
+    checkpointer.save('first')
+    started.wait()
+    checkpointer.maybe_save(lambda: 0, 0)
+    for games in range(1, 4):
+        assert checkpointer.maybe_save(lambda: games, games)
+
+    release.set()
+    checkpointer.flush('final')
+    # snapshots replaced while the first save was still running are never written
+    assert saved[0] == 'first'
+    assert saved[-1] == 'final'
+    assert 1 not in saved and 2 not in saved
+
+
+def test_async_checkpointer_snapshot_only_when_due():
+    snapshots = []
+    checkpointer = AsyncCheckpointer(
+        lambda snapshot: None, CheckpointPolicy(every_games=5, every_seconds=None)
+    )
+    for games in range(12):
+        checkpointer.maybe_save(lambda: snapshots.append(games), games)
+    checkpointer.flush()
+    assert snapshots == [5, 10]
+
+
+def test_async_checkpointer_raises_save_errors():
+    def save(snapshot):
+        raise OSError('disk full')
+
+    checkpointer = AsyncCheckpointer(save)
+    with pytest.raises(RuntimeError):
+        checkpointer.flush('snapshot')
+    # error is raised once
+    checkpointer.flush()
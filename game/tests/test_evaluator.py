@@ -0,0 +1,74 @@
+import pickle
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+from game.components import Board
+from game.components import Colors
+from game.evaluator import NumpyEvaluator
+from game.evaluator import QuantizedEvaluator
+from game.evaluator import stack_weights
+from game.evaluator import StackedEvaluator
+from game.rules import find_complete_legal_moves
+
+
+def random_weights(seed=0):
+    rng = np.random.default_rng(seed)
+    num_inputs = Board.encode_shape[0]
+    return [
+        rng.normal(scale=0.1, size=(num_inputs, 80)),
+        rng.normal(size=80),
+        rng.normal(size=(80, 1)),
+        rng.normal(size=1),
+    ]
+
+
+def _afterstates():
+    board = Board.generate_from_position(['1[W13]', '3[W2]', '13[B14]', '20[B1]'])
+    states = []
+    for move in find_complete_legal_moves(board, Colors.WHITE, (2, 2)):
+        afterstate = board.copy_board()
+        for sm in move:
+            afterstate.do_single_move(sm)
+        states.append(afterstate.encode(Colors.BLACK))
+    return board.encode(Colors.BLACK), np.stack(states)
+
+
+def test_quantized_evaluator_close_to_float32():
+    weights = random_weights()
+    _, afterstates = _afterstates()
+    expected = NumpyEvaluator(weights)(afterstates)
+
+    for mode in QuantizedEvaluator.MODES:
+        quantized = QuantizedEvaluator(weights, mode)
+        assert_allclose(quantized(afterstates), expected, atol=1e-2)
+
+    # the reduced weights are stored
+    quantized = QuantizedEvaluator(weights, 'int8')
+    assert quantized.hidden_kernel.dtype == np.int8
+    assert quantized.hidden_kernel.nbytes * 4 == weights[0].astype(np.float32).nbytes
+    assert_allclose(quantized.get_weights()[0], weights[0], atol=quantized.hidden_scale)
+    assert QuantizedEvaluator(weights, 'float16').hidden_kernel.dtype == np.float16
+
+    # the float32 copy is not pickled
+    quantized(afterstates)
+    state = pickle.dumps(quantized)
+    assert len(state) < weights[0].astype(np.float32).nbytes / 2
+    assert_allclose(pickle.loads(state)(afterstates), quantized(afterstates))
+
+
+def test_stacked_evaluator_matches_single_models():
+    weights = [random_weights(seed) for seed in range(3)]
+    _, afterstates = _afterstates()
+
+    values = StackedEvaluator(stack_weights(weights))(afterstates)
+    assert values.shape == (3, len(afterstates))
+    for i, w in enumerate(weights):
+        assert_allclose(values[i], NumpyEvaluator(w)(afterstates), atol=1e-6)
+
+    models = np.arange(len(afterstates)) % 3
+    assert_allclose(
+        StackedEvaluator(stack_weights(weights)).evaluate_models(afterstates, models),
+        values[models, np.arange(len(afterstates))],
+        atol=1e-6,
+    )
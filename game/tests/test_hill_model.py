@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from game.evaluator import flatten_weights
+from game.hill_model import HillClimberModel
+
+
+@pytest.fixture
+def hill_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(HillClimberModel, '_CHECKPOINTS_PATH', tmp_path / 'checkpoints')
+    monkeypatch.setattr(HillClimberModel, '_LOGS_PATH', tmp_path / 'logs')
+    model = HillClimberModel(num_workers=0)
+    yield model
+    model.close()
+
+
+def test_generate_and_absorb_mutant(hill_model):
+    champion = hill_model.champion_flat.copy()
+
+    hill_model.generate_mutant()
+    np.testing.assert_array_equal(hill_model.champion_flat, champion)
+    mutant = hill_model.mutant_flat.copy()
+    assert not np.array_equal(mutant, champion)
+
+    hill_model.absorb_mutant()
+    expected = champion + HillClimberModel._ABSORB_RATE * (mutant - champion)
+    np.testing.assert_allclose(hill_model.champion_flat, expected, rtol=1e-6, atol=1e-7)
+    # the keras model follows the champion
+    np.testing.assert_array_equal(
+        flatten_weights(hill_model.model.get_weights()), hill_model.champion_flat
+    )
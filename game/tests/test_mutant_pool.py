@@ -0,0 +1,66 @@
+import random
+
+from game.components import Colors
+from game.evaluator import NumpyEvaluator
+from game.evaluator import stack_weights
+from game.evaluator import StackedEvaluator
+from game.mutant_pool import can_mutant_be_better
+from game.mutant_pool import is_mutant_better
+from game.mutant_pool import mutant_games
+from game.mutant_pool import MutantPool
+from game.mutant_pool import play_mutant_games
+from game.mutant_pool import play_population_games
+from game.tests.test_evaluator import random_weights
+from game.trajectory_store import TrajectoryStore
+from game.trajectory_store import TrajectoryWriter
+
+
+def test_mutant_games():
+    games = mutant_games(2, random.Random(1))
+    assert len(games) == 4
+    # same dice and starting color, mutant plays both colors
+    assert games[0][1:] == games[1][1:]
+    assert {games[0][0], games[1][0]} == set(Colors.colors)
+
+    assert is_mutant_better([True, True, True, False], 2)
+    assert not is_mutant_better([True, True, False, False], 2)
+
+    assert can_mutant_be_better([True, False], 2)
+    assert not can_mutant_be_better([False, False], 2)
+
+
+def test_pool_matches_serial_games(tmp_path):
+    champion_weights = random_weights(0)
+    mutant_weights = random_weights(1)
+    games = mutant_games(2, random.Random(2))
+
+    serial = play_mutant_games(
+        NumpyEvaluator(champion_weights), NumpyEvaluator(mutant_weights), games
+    )
+    writer = TrajectoryWriter(tmp_path)
+    with MutantPool(champion_weights, num_workers=2) as pool:
+        parallel = pool.play(champion_weights, mutant_weights, games, writer)
+
+    assert parallel == serial
+    store = TrajectoryStore(tmp_path)
+    assert len(store) == len(games)
+    winners = [Colors.colors[g['winner']] for g in store.games]
+    assert [w == g[0] for w, g in zip(winners, games)] == serial
+
+
+def test_population_games_match_serial_games():
+    weights = [random_weights(seed) for seed in range(3)]
+    games = mutant_games(1, random.Random(3))
+
+    population_games = [(k, *game) for k in (1, 2) for game in games]
+    winners = play_population_games(
+        StackedEvaluator(stack_weights(weights)), population_games
+    )
+
+    serial = [
+        play_mutant_games(NumpyEvaluator(weights[0]), NumpyEvaluator(weights[k]), games)
+        for k in (1, 2)
+    ]
+    assert [w == g[1] for w, g in zip(winners, population_games)] == serial[0] + serial[
+        1
+    ]
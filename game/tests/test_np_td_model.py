@@ -0,0 +1,65 @@
+import numpy as np
+from numpy.testing import assert_allclose
+
+from game.components import Board
+from game.components import Colors
+from game.np_td_model import NumpyTDModel
+from game.rules import find_legal_afterstates
+
+
+def _position():
+    board = Board.generate_from_position(['1[W13]', '3[W2]', '13[B14]', '20[B1]'])
+    _, afterstates, _ = find_legal_afterstates(board, Colors.WHITE, (2, 2))
+    return board, afterstates[0]
+
+
+def test_gradients_match_finite_differences():
+    model = NumpyTDModel(seed=0)
+    model.weights[1][:] = np.linspace(-1, 1, 80)
+    board, _ = _position()
+    state = board.encode(Colors.WHITE).astype(np.float32)
+
+    model.gradients(state)
+    eps = 1e-2
+    for i, index in [(0, (0, 3)), (1, (5,)), (2, (7, 0)), (3, (0,))]:
+        weight = model.weights[i]
+        original = weight[index]
+        weight[index] = original + eps
+        plus = model.evaluator(state[np.newaxis])[0]
+        weight[index] = original - eps
+        minus = model.evaluator(state[np.newaxis])[0]
+        weight[index] = original
+
+        assert_allclose(model._grads[i][index], (plus - minus) / (2 * eps), atol=1e-4)
+
+
+def test_update_moves_value_towards_target():
+    model = NumpyTDModel(seed=0)
+    board, afterstate = _position()
+    state = board.encode(Colors.WHITE)[np.newaxis]
+
+    value = model.evaluator(state)[0]
+    model.update(Colors.WHITE, board, afterstate, value_next=1.0)
+    assert model.evaluator(state)[0] > value
+
+    # traces decay by lambda and accumulate gradients
+    assert_allclose(model.trace[3], model._grads[3], rtol=1e-5)
+    model.reset_episode()
+    assert not np.any(model.trace[0])
+
+
+def test_export_restore(tmp_path):
+    model = NumpyTDModel(seed=0)
+    model.games_played = 3
+    model.export(tmp_path / 'weights.npz')
+
+    restored = NumpyTDModel(seed=1)
+    restored.restore(tmp_path / 'weights.npz')
+    assert restored.games_played == 3
+    for a, b in zip(model.weights, restored.weights):
+        assert_allclose(a, b)
+
+    # evaluator still shares the restored arrays
+    board, _ = _position()
+    state = board.encode(Colors.WHITE)[np.newaxis]
+    assert_allclose(restored.evaluator(state), model.evaluator(state))
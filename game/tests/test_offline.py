@@ -0,0 +1,47 @@
+import numpy as np
+
+from game.components import Colors
+from game.gui import CompleteMove
+from game.offline import recorded_trajectories
+from game.offline import store_trajectories
+from game.tests.test_trajectory_store import _play_random_game
+from game.trajectory_store import TrajectoryStore
+from game.trajectory_store import TrajectoryWriter
+from game.trajectory_store import unpack_move
+
+
+def test_store_trajectories(tmp_path):
+    writer = TrajectoryWriter(tmp_path / 'store', features=True)
+    _, moves = _play_random_game(writer, 1)
+
+    store = TrajectoryStore(tmp_path / 'store')
+    (trajectory,) = list(store_trajectories(tmp_path / 'store'))
+
+    moved = [m is not None for m in moves]
+    assert len(trajectory.states) == sum(moved)
+    np.testing.assert_allclose(
+        trajectory.states, store.features[np.array(moved)], rtol=1e-6
+    )
+    winner = Colors.colors[store.games[0]['winner']]
+    assert trajectory.reward == int(winner == Colors.WHITE)
+
+
+def test_recorded_trajectories(tmp_path):
+    writer = TrajectoryWriter(tmp_path / 'store')
+    _play_random_game(writer, 2)
+    store = TrajectoryStore(tmp_path / 'store')
+
+    lines = []
+    for record in store.game_moves(0):
+        color = Colors.colors[record['turn']]
+        dice_roll = tuple(int(d) for d in record['dice'])
+        lines.append(str(CompleteMove(color, dice_roll, unpack_move(record))))
+    (tmp_path / 'game.txt').write_text('\n'.join(lines) + '\n')
+    # unfinished games are skipped
+    (tmp_path / 'unfinished.txt').write_text('\n'.join(lines[:10]) + '\n')
+
+    (recorded,) = list(recorded_trajectories(tmp_path))
+    (stored,) = list(store_trajectories(tmp_path / 'store'))
+    np.testing.assert_array_equal(recorded.states, stored.states)
+    np.testing.assert_array_equal(recorded.next_states, stored.next_states)
+    assert recorded.reward == stored.reward
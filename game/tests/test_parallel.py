@@ -0,0 +1,30 @@
+from game.components import Board
+from game.components import Colors
+from game.parallel import SearchExecutor
+from game.tests.test_evaluator import random_weights
+
+
+def test_pool_matches_serial_search():
+    weights = random_weights(0)
+    board = Board.generate_from_position(['1[W13]', '3[W2]', '13[B14]', '20[B1]'])
+
+    with SearchExecutor(weights, num_workers=0, top_k=3) as serial:
+        expected = serial.find_move(Colors.WHITE, board, (4, 2), plies=2)
+        assert serial.last_search_info['depth'] == 2
+    with SearchExecutor(weights, num_workers=2, top_k=3) as pool:
+        assert pool.find_move(Colors.WHITE, board, (4, 2), plies=2) == expected
+        assert pool.last_value == serial.last_value
+
+
+def test_pool_prefilters_candidates():
+    weights = random_weights(0)
+    board = Board.generate_from_position(['1[W13]', '3[W2]', '13[B14]', '20[B1]'])
+
+    with SearchExecutor(
+        weights, num_workers=0, top_k=3, evaluator='int8', prefilter_top_n=1
+    ) as executor:
+        executor.search.prefilter.audit_rate = 0
+        executor.find_move(Colors.WHITE, board, (4, 2), plies=2)
+        assert executor.last_search_info['candidates'] == 1
+        assert executor.last_search_info['depth'] == 1
+        assert executor.search.prefilter.stats['decisions'] == 1
@@ -0,0 +1,50 @@
+import time
+
+from game.components import Board
+from game.profiling import OTHER
+from game.profiling import PhaseProfiler
+
+
+class _Worker:
+    def inner(self):
+        time.sleep(0.02)
+
+    def outer(self):
+        time.sleep(0.02)
+        self.inner()
+
+
+def test_nested_phases_are_exclusive():
+    worker = _Worker()
+    profiler = PhaseProfiler()
+    with profiler.instrument([(worker, 'outer', 'outer'), (_Worker, 'inner', 'inner')]):
+        worker.outer()
+        time.sleep(0.02)
+
+    assert profiler.calls == {'outer': 1, 'inner': 1}
+    for name in ('outer', 'inner', OTHER):
+        assert 0.015 < profiler.times[name] < 0.1
+    assert abs(profiler.total - sum(profiler.times.values())) < 1e-9
+
+
+def test_instrument_restores_attributes():
+    worker = _Worker()
+    inner = _Worker.__dict__['inner']
+    generate_from_position = Board.__dict__['generate_from_position']
+
+    profiler = PhaseProfiler()
+    with profiler.instrument(
+        [
+            (worker, 'outer', 'outer'),
+            (_Worker, 'inner', 'inner'),
+            (Board, 'generate_from_position', 'copy'),
+        ]
+    ):
+        board = Board()
+        board.reset()
+        board.copy_board()
+
+    assert profiler.calls['copy'] == 1
+    assert 'outer' not in vars(worker)
+    assert _Worker.__dict__['inner'] is inner
+    assert Board.__dict__['generate_from_position'] is generate_from_position
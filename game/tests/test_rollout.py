@@ -0,0 +1,47 @@
+import random
+
+from game.bot import HeuristicsBot
+from game.bot import RandomBot
+from game.components import Board
+from game.components import Colors
+from game.rollout import RolloutEngine
+
+
+def test_rollout_certain_mars():
+    board = Board.generate_from_position(['24[W1]', '25[W14]', '13[B15]'])
+    result = RolloutEngine(RandomBot).rollout(board, Colors.WHITE, num_games=36)
+    assert result.white_win == 1
+    assert result.white_mars == 1
+    assert result.white_win_se == 0
+
+
+def test_rollout_reproducible():
+    board = Board.generate_from_position(
+        ['20[W3]', '22[W5]', '24[W7]', '8[B4]', '10[B6]', '12[B5]']
+    )
+    engine = RolloutEngine(HeuristicsBot)
+    first = engine.rollout(board, Colors.BLACK, num_games=10, seed=5)
+    second = engine.rollout(board, Colors.BLACK, num_games=10, seed=5)
+    assert first == second
+    assert first.num_games == 10
+
+
+def test_rollout_keeps_the_random_stream():
+    board = Board.generate_from_position(['20[W3]', '22[W12]', '8[B4]', '12[B11]'])
+    engine = RolloutEngine(RandomBot)
+    random.seed(0)
+    expected = [random.random() for _ in range(3)]
+
+    random.seed(0)
+    engine.rollout(board, Colors.WHITE, num_games=4)
+    assert [random.random() for _ in range(3)] == expected
+
+
+def test_truncated_rollout():
+    board = Board.generate_from_position(
+        ['20[W3]', '22[W5]', '24[W7]', '8[B4]', '10[B6]', '12[B5]']
+    )
+    engine = RolloutEngine(RandomBot, evaluator=lambda states: [0.25] * len(states))
+    result = engine.rollout(board, Colors.WHITE, num_games=4, max_moves=2)
+    assert result.num_truncated == 4
+    assert result.white_win == 0.25
@@ -5,6 +5,7 @@ from game.components import Colors
 from game.components import SingleMove
 from game.gui import CompleteMove
 from game.rules import find_complete_legal_moves
+from game.rules import find_legal_afterstates
 from game.rules import init_cache
 from game.rules import passes_rule_six_block
 from game.rules import remove_extra_from_head_moves
@@ -80,7 +81,7 @@ def test_rule_six_block_bugs(color, position, moves, expected):
     'color, dice, expected',
     [
         (Colors.WHITE, (1, 2), 27),
-        (Colors.WHITE, (3, 3), 105),
+        (Colors.WHITE, (3, 3), 104),
         (Colors.BLACK, (2, 6), 2),
         (Colors.BLACK, (2, 3), 1),
     ],
@@ -143,3 +144,31 @@ def test_game_scenario(moves, color, dice_roll):
             fake_board.do_single_move(sm)
 
     assert True
+
+
+@mark.parametrize(
+    'color, dice',
+    [(Colors.WHITE, (3, 3)), (Colors.BLACK, (2, 6)), (Colors.WHITE, (5, 2))],
+)
+def test_find_legal_afterstates(color, dice):
+    board = Board()
+    position = [
+        '1[W2]',
+        '7[B1]',
+        '5[W1]',
+        '9[W1]',
+        '10[W1]',
+        '11[B2]',
+        '13[W2]',
+        '14[W2]',
+        '23[W3]',
+    ]
+    board.setup_position(position)
+    moves, afterstates, states = find_legal_afterstates(board, color, dice, encode=True)
+
+    for move, afterstate, state in zip(moves, afterstates, states):
+        expected = board.copy_board()
+        for m in move:
+            expected.do_single_move(m)
+        assert afterstate.export_position() == expected.export_position()
+        assert (state == expected.encode(Colors.opponent(color))).all()
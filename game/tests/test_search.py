@@ -0,0 +1,103 @@
+import numpy as np
+from numpy.testing import assert_almost_equal
+
+from game.components import Board
+from game.components import Colors
+from game.search import DICE_ROLLS
+from game.search import DICE_WEIGHTS
+from game.search import ExpectimaxSearch
+from game.search import MovePrefilter
+from game.tests.utils import tray_evaluator
+
+
+def test_dice_weights():
+    assert len(DICE_ROLLS) == 21
+    assert_almost_equal(np.sum(DICE_WEIGHTS), 1)
+
+
+def test_find_move_bears_off():
+    board = Board.generate_from_position(['20[W2]', '24[W1]', '13[B15]'])
+    search = ExpectimaxSearch(tray_evaluator)
+    for plies in (1, 2):
+        move = search.find_move(Colors.WHITE, board, (5, 1), plies)
+        assert sorted(m.position_to for m in move) == [25, 25]
+
+
+def test_search_terminal_and_forced_win():
+    search = ExpectimaxSearch(tray_evaluator)
+
+    # white has no checkers left - white won
+    won = Board.generate_from_position(['25[W15]', '13[B15]'])
+    assert_almost_equal(search.search([won], Colors.BLACK, 1), [1])
+
+    # white bears off the last checker with any roll
+    last_checker = Board.generate_from_position(['24[W1]', '25[W14]', '13[B15]'])
+    assert_almost_equal(search.search([last_checker], Colors.WHITE, 1), [1])
+
+
+def test_find_move_anytime_past_deadline():
+    board = Board.generate_from_position(['20[W2]', '24[W1]', '13[B15]'])
+    search = ExpectimaxSearch(tray_evaluator)
+
+    # deadline already passed - 1-ply answer is still returned
+    move = search.find_move_anytime(Colors.WHITE, board, (5, 1), deadline=0)
+    assert sorted(m.position_to for m in move) == [25, 25]
+    assert search.last_search_info['depth'] == 1
+
+
+def test_find_move_anytime_deepens():
+    board = Board.generate_from_position(['20[W2]', '24[W1]', '13[B15]'])
+    search = ExpectimaxSearch(tray_evaluator)
+
+    move = search.find_move_anytime(
+        Colors.WHITE, board, (5, 1), deadline=np.inf, max_plies=2
+    )
+    assert sorted(m.position_to for m in move) == [25, 25]
+    assert search.last_search_info['depth'] == 2
+
+
+def test_prefilter_keeps_top_n_and_margin():
+    board = Board.generate_from_position(['1[W15]', '13[B15]'])
+    moves = [[], [], [], []]
+    prefilter = MovePrefilter(rank_func=lambda b, m: np.array([1, 3, 2.5, 0]), top_n=1)
+    assert list(prefilter.select(board, moves)) == [1]
+
+    prefilter.margin = 0.6
+    assert list(prefilter.select(board, moves)) == [1, 2]
+
+
+def test_single_prefiltered_candidate_is_not_searched():
+    board = Board.generate_from_position(['20[W2]', '24[W1]', '13[B15]'])
+    search = ExpectimaxSearch(tray_evaluator)
+    search.prefilter = MovePrefilter(
+        rank_func=lambda b, m: np.arange(len(m)), top_n=1, audit_rate=0
+    )
+
+    search.find_move(Colors.WHITE, board, (5, 1), plies=2)
+    assert search.last_search_info['depth'] == 1
+    assert search.last_search_info['candidates'] == 1
+
+
+def test_prefilter_audit():
+    board = Board.generate_from_position(['20[W2]', '24[W1]', '13[B15]'])
+    search = ExpectimaxSearch(tray_evaluator)
+
+    # pre-filter that prefers the worst moves
+    search.prefilter = MovePrefilter(
+        rank_func=lambda b, m: -tray_evaluator(
+            np.stack([_afterstate(b, move).encode(Colors.BLACK) for move in m])
+        ),
+        top_n=1,
+        audit_rate=1,
+    )
+    move = search.find_move(Colors.WHITE, board, (5, 1))
+    assert sorted(m.position_to for m in move) == [25, 25]
+    assert search.prefilter.stats['misses'] == 1
+    assert search.prefilter.stats['miss_rate'] == 1
+
+
+def _afterstate(board, move):
+    afterstate = board.copy_board()
+    for sm in move:
+        afterstate.do_single_move(sm)
+    return afterstate
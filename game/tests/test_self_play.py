@@ -0,0 +1,43 @@
+import random
+
+import numpy as np
+
+from game.components import Board
+from game.components import Dice
+from game.evaluator import flatten_weights
+from game.evaluator import NumpyEvaluator
+from game.evaluator import unflatten_weights
+from game.search import ExpectimaxSearch
+from game.self_play import play_self_play_game
+from game.self_play import SelfPlayActors
+from game.tests.test_evaluator import random_weights
+
+
+def test_flatten_weights():
+    weights = random_weights()
+    flat = flatten_weights(weights)
+    restored = unflatten_weights(flat, [w.shape for w in weights])
+    for w, r in zip(weights, restored):
+        np.testing.assert_allclose(w, r, rtol=1e-6)
+        assert np.shares_memory(r, flat)
+
+
+def test_play_self_play_game():
+    random.seed(1)
+    search = ExpectimaxSearch(NumpyEvaluator(random_weights()))
+    trajectory = play_self_play_game(search, Dice(seed=1), weights_version=3)
+
+    num_moves = len(trajectory.states)
+    assert num_moves > 0
+    assert trajectory.states.shape == (num_moves, Board.encode_shape[0])
+    assert trajectory.next_states.shape == trajectory.states.shape
+    assert trajectory.reward in (0, 1)
+    assert trajectory.weights_version == 3
+
+
+def test_self_play_actors():
+    weights = random_weights()
+    with SelfPlayActors(weights, num_actors=1) as actors:
+        assert actors.get().weights_version == 1
+        actors.publish(weights)
+        assert actors.version == 2
@@ -0,0 +1,45 @@
+import asyncio
+
+import numpy as np
+
+from game.server import MoveServer
+from game.tests.utils import tray_evaluator
+
+REQUESTS = [
+    {'position': ['20[W2]', '24[W1]', '13[B15]'], 'color': 'W', 'dice': [5, 1]},
+    {'position': ['1[W15]', '13[B15]'], 'color': 'B', 'dice': [3, 4]},
+]
+
+
+def test_requests_are_batched():
+    server = MoveServer(tray_evaluator, batch_window=0.5)
+
+    async def _run():
+        batcher = server.start_batcher()
+        responses = await asyncio.gather(*(server.handle_request(r) for r in REQUESTS))
+        batcher.cancel()
+        return responses
+
+    responses = asyncio.run(_run())
+
+    assert sorted(responses[0]['move']) == ['W:20->25', 'W:24->25']
+    assert np.isclose(responses[1]['prob'], 0.5)
+    assert server.metrics.batches == 1
+    assert server.metrics.requests == 2
+
+
+def test_cancelled_request_does_not_stop_the_batcher():
+    server = MoveServer(tray_evaluator, batch_window=0.2)
+
+    async def _run():
+        batcher = server.start_batcher()
+        cancelled = asyncio.create_task(server.handle_request(REQUESTS[0]))
+        # cancelled while its states wait in the batch
+        await asyncio.sleep(0.1)
+        cancelled.cancel()
+        response = await asyncio.wait_for(server.handle_request(REQUESTS[1]), 5)
+        batcher.cancel()
+        return response
+
+    response = asyncio.run(_run())
+    assert np.isclose(response['prob'], 0.5)
@@ -0,0 +1,31 @@
+from game.bot import RandomBot
+from game.sprt import BETTER
+from game.sprt import SPRT
+from game.sprt import WORSE
+from game.tournament import BotPlayer
+from game.tournament import Tournament
+
+
+class PassingPlayer:
+    def find_move(self, color, board, dice_roll):
+        return None
+
+
+def test_sprt_decision():
+    sprt = SPRT()
+    assert sprt.decision(0, 0) is None
+    assert sprt.decision(10, 10) is None
+    assert sprt.decision(20, 0) == BETTER
+    assert sprt.decision(0, 20) == WORSE
+    assert abs(sprt.llr(5, 5)) < 1e-12
+
+
+def test_tournament_stops_when_decided():
+    with Tournament(PassingPlayer(), BotPlayer(RandomBot), num_workers=0) as tournament:
+        result = tournament.play(20, seed=1, sprt=SPRT(), batch_pairs=1)
+        assert result.decision == WORSE
+        assert result.wins == 0
+        assert result.games + result.games_saved == 40
+        assert result.games_saved > 0
+
+        assert tournament.play(1, seed=1).decision is None
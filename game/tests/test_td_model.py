@@ -0,0 +1,85 @@
+from functools import partial
+
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from game.components import Board
+from game.components import Colors
+from game.offline import store_trajectories
+from game.td_model import TDBot
+from game.td_model import TDNardiModel
+from game.tests.test_trajectory_store import _play_random_game
+from game.trajectory_store import TrajectoryWriter
+
+
+@pytest.fixture
+def td_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(TDNardiModel, '_CHECKPOINTS_PATH', tmp_path / 'checkpoints')
+    monkeypatch.setattr(TDNardiModel, '_LOGS_PATH', tmp_path / 'logs')
+    model = TDNardiModel()
+    yield model
+    model.close()
+
+
+def test_td_trajectory_is_traced_once(td_model):
+    rng = np.random.default_rng(0)
+    for num_moves in (3, 5, 8):
+        states = rng.random((num_moves, *Board.encode_shape), dtype=np.float32)
+        td_model._td_trajectory(
+            tf.constant(states), tf.constant(states), tf.constant(1.0)
+        )
+    assert td_model._td_trajectory.experimental_get_tracing_count() == 1
+
+
+def test_train_offline(td_model, tmp_path):
+    writer = TrajectoryWriter(tmp_path / 'store', features=True)
+    for seed in (1, 2):
+        _play_random_game(writer, seed)
+    before = [w.copy() for w in td_model.model.get_weights()]
+
+    history = td_model.train_offline(
+        partial(store_trajectories, tmp_path / 'store'),
+        epochs=2,
+        batch_size=32,
+        restore=False,
+        backup=False,
+    )
+
+    assert len(history.history['loss']) == 2
+    assert np.isfinite(history.history['loss']).all()
+    assert np.isfinite(float(td_model.loss))
+    after = td_model.model.get_weights()
+    assert any(not np.array_equal(b, a) for b, a in zip(before, after))
+
+
+def test_timed_bot_deepens(td_model):
+    bot = TDBot(Colors.WHITE, time_budget=5, evaluator='numpy')
+    board = Board.generate_from_position(['20[W2]', '24[W1]', '13[B15]'])
+    bot.find_a_move(board, (2, 1))
+    bot.close()
+    assert bot.last_search_info['depth'] >= 2
+
+    with pytest.raises(ValueError):
+        TDBot(Colors.WHITE, plies=1, time_budget=5)
+
+
+def test_bot_pool_has_no_time_budget():
+    with pytest.raises(ValueError):
+        TDBot(Colors.WHITE, time_budget=5, num_workers=2)
+
+
+def test_close_flushes_telemetry(td_model, tmp_path):
+    flusher = td_model.telemetry._flusher
+    td_model.telemetry.observe('train/loss', 0.5)
+    td_model.close()
+
+    assert not flusher.is_alive()
+    tags = {
+        value.tag
+        for path in (tmp_path / 'logs').iterdir()
+        if path.is_file()
+        for record in tf.data.TFRecordDataset(str(path))
+        for value in tf.compat.v1.Event.FromString(record.numpy()).summary.value
+    }
+    assert 'train/loss/mean' in tags
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from game.telemetry import Telemetry
+
+
+class MemorySink:
+    def __init__(self):
+        self.writes = []
+
+    def write(self, scalars, histograms, step):
+        self.writes.append((scalars, histograms, step))
+
+
+def test_streaming_aggregates():
+    sink = MemorySink()
+    telemetry = Telemetry(sink, step=lambda: 7, flush_interval=None)
+
+    for v in [1.0, 3.0, 2.0]:
+        telemetry.observe('move_time', v)
+    telemetry.count('absorbed')
+    telemetry.count('absorbed')
+    telemetry.gauge('games', 5)
+    telemetry.histogram('weights', np.ones((2, 3)))
+    telemetry.flush()
+
+    scalars, histograms, step = sink.writes[0]
+    assert step == 7
+    assert scalars['move_time/mean'] == pytest.approx(2.0)
+    assert scalars['move_time/max'] == 3.0
+    assert scalars['absorbed'] == 2
+    assert scalars['games'] == 5
+    assert histograms['weights'].shape == (6,)
+
+    # windows are reset on flush, totals are kept
+    telemetry.observe('move_time', 10.0)
+    telemetry.flush()
+    assert sink.writes[1][0]['move_time/mean'] == 10.0
+    assert telemetry.stat('move_time').count == 4
+    assert telemetry.stat('move_time').max == 10.0
+
+
+def test_sampling_rate():
+    telemetry = Telemetry(sample_rate=0.25)
+    assert sum(telemetry.should_sample() for _ in range(100)) == 25
+    assert not any(Telemetry(sample_rate=0).should_sample() for _ in range(10))
+
+
+def test_background_flusher():
+    sink = MemorySink()
+    telemetry = Telemetry(sink, flush_interval=0.01)
+    telemetry.observe('x', 1.0)
+    telemetry.close()
+    assert any('x/mean' in scalars for scalars, _, _ in sink.writes)
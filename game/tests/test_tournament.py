@@ -0,0 +1,56 @@
+import math
+
+import numpy as np
+
+from game.bot import RandomBot
+from game.tests.test_evaluator import random_weights
+from game.tournament import BotPlayer
+from game.tournament import NetworkPlayer
+from game.tournament import ratio_interval
+from game.tournament import Tournament
+from game.tournament import TournamentResult
+from game.tournament import wilson_interval
+
+
+def test_wilson_interval():
+    low, high = wilson_interval(7, 10)
+    assert low < 0.7 < high
+    assert math.isclose(low, 0.3968, abs_tol=1e-4)
+    assert math.isclose(high, 0.8922, abs_tol=1e-4)
+
+    low, high = wilson_interval(0, 10)
+    assert abs(low) < 1e-12 and 0 < high < 0.35
+
+
+def test_ratio_interval():
+    scores = np.array([2, 1, 1, 2, 3, 1])
+    opponent_scores = np.array([1, 1, 2, 1, 0, 1])
+    low, high = ratio_interval(scores, opponent_scores)
+    assert low < scores.sum() / opponent_scores.sum() < high
+    assert all(math.isnan(x) for x in ratio_interval(scores, np.zeros(6)))
+
+
+def test_tournament_result():
+    result = TournamentResult.from_games([(True, 2), (False, 1), (True, 1), (True, 1)])
+    assert result.games == 4
+    assert result.wins == 3
+    assert (result.score, result.opponent_score) == (4, 1)
+    assert result.win_ratio == 0.75
+    assert result.score_ratio == 4
+
+
+def test_pool_matches_serial_games():
+    player = NetworkPlayer(random_weights(0))
+    opponent = NetworkPlayer(random_weights(1))
+
+    with Tournament(player, opponent, num_workers=0) as serial:
+        expected = serial.play(1, seed=3)
+    with Tournament(player, opponent, num_workers=1) as pool:
+        assert pool.play(1, seed=3) == expected
+        # weights replace the preloaded ones, other opponents only for these games
+        assert pool.play(1, random_weights(1), seed=3).win_ratio == 0.5
+        against_bot = pool.play(1, opponent=BotPlayer(RandomBot), seed=3)
+        assert against_bot.games == 2
+        assert pool.play(1, random_weights(0), seed=3) == expected
+        # weights are shared with the workers once per play
+        assert pool._weights_version == 2
@@ -0,0 +1,113 @@
+import random
+
+import numpy as np
+import pytest
+
+from game.components import Board
+from game.components import Colors
+from game.components import Dice
+from game.rules import find_complete_legal_moves
+from game.rules import win_condition
+from game.trajectory_store import GAMES_FILE
+from game.trajectory_store import MOVES_FILE
+from game.trajectory_store import pack_board
+from game.trajectory_store import TrajectoryStore
+from game.trajectory_store import TrajectoryWriter
+from game.trajectory_store import unpack_board
+from game.trajectory_store import unpack_move
+
+
+def _play_random_game(writer, seed):
+    random.seed(seed)
+    dice = Dice(seed=seed)
+    board = Board()
+    board.reset()
+    positions, moves = [], []
+
+    last_color = Colors.BLACK
+    while win_condition(board, last_color) is None:
+        color = Colors.opponent(last_color)
+        dice_roll = dice.throw()
+        legal_moves = find_complete_legal_moves(board, color, dice_roll)
+        move = random.choice(legal_moves) if legal_moves else None
+
+        writer.record(board, color, dice_roll, move)
+        positions.append(board.export_position())
+        moves.append(move)
+        if move:
+            for m in move:
+                board.do_single_move(m)
+        last_color = color
+
+    writer.end_game(last_color, win_condition(board, last_color))
+    return positions, moves
+
+
+def test_pack_board():
+    board = Board.generate_from_position(
+        ['1[W5]', '3[B2]', '13[B12]', '25[W10]', '0[B1]']
+    )
+    points, tray = pack_board(board)
+    assert points[0] == 5 and points[2] == -2 and points[12] == -12
+    assert list(tray) == [10, 1]
+    assert unpack_board(points, tray).export_position() == board.export_position()
+
+
+def test_write_and_read(tmp_path):
+    writer = TrajectoryWriter(tmp_path, features=True)
+    games = [_play_random_game(writer, seed) for seed in (1, 2)]
+
+    store = TrajectoryStore(tmp_path)
+    assert len(store) == 2
+    assert store.games[0]['first_move'] == 0
+    assert store.games[1]['first_move'] == len(games[0][0])
+
+    positions, moves = games[1]
+    assert [b.export_position() for b in store.boards(1)] == positions
+    assert [unpack_move(r) for r in store.game_moves(1)] == moves
+
+    # slices are views of the mapped files
+    assert np.shares_memory(store.game_moves(0, 2), store.moves)
+    assert len(store.game_moves(0, 2)) == len(store.moves)
+    board = Board.generate_from_position(positions[3])
+    color = Colors.colors[store.game_moves(1)[3]['turn']]
+    np.testing.assert_allclose(
+        store.game_features(1)[3], board.encode(color), rtol=1e-6
+    )
+
+
+def test_unfinished_game_is_dropped(tmp_path):
+    writer = TrajectoryWriter(tmp_path)
+    positions, _ = _play_random_game(writer, 1)
+
+    # moves of a game that never ended
+    with open(tmp_path / MOVES_FILE, 'ab') as f:
+        f.write(b'\0' * 100)
+
+    writer = TrajectoryWriter(tmp_path)
+    _play_random_game(writer, 2)
+    store = TrajectoryStore(tmp_path)
+    assert len(store) == 2
+    assert [b.export_position() for b in store.boards(0)] == positions
+
+    with pytest.raises(ValueError):
+        TrajectoryWriter(tmp_path, features=True)
+
+
+def test_torn_game_record_is_dropped(tmp_path):
+    writer = TrajectoryWriter(tmp_path)
+    positions, _ = _play_random_game(writer, 1)
+
+    # a writer died while writing the record of the next game
+    with open(tmp_path / MOVES_FILE, 'ab') as f:
+        f.write(b'\0' * 100)
+    with open(tmp_path / GAMES_FILE, 'ab') as f:
+        f.write(b'\1' * 5)
+
+    writer = TrajectoryWriter(tmp_path)
+    second_positions, _ = _play_random_game(writer, 2)
+    store = TrajectoryStore(tmp_path)
+    assert len(store) == 2
+    assert store.games[1]['first_move'] == len(positions)
+    assert [b.export_position() for b in store.boards(0)] == positions
+    assert [b.export_position() for b in store.boards(1)] == second_positions
@@ -1,6 +1,18 @@
 import itertools
 
+from game.components import Board
+
 
 def assert_no_duplicated_moves(moves):
     duplicates_removed = list(moves for moves, _ in itertools.groupby(moves))
     assert len(duplicates_removed) == len(moves)
+
+
+TRAY_INDEX = Board.BITS_PER_COLOR_SLOT * 24 * 2
+
+
+def tray_evaluator(states):
+    """
+    the more white checkers are born off compared to black, the better for white
+    """
+    return 0.5 + (states[:, TRAY_INDEX] - states[:, TRAY_INDEX + 1]) / 2
@@ -0,0 +1,322 @@
+"""
+evaluation tournaments between two players
+
+games are played in pairs with the same dice and starting color, the player
+plays white in one game of a pair and black in the other (see mutant_games).
+players are sent to the worker processes once, a NetworkPlayer only sends its
+weights, so no tensorflow model is loaded in the workers
+"""
+import math
+import random
+from statistics import NormalDist
+from typing import NamedTuple
+from typing import Optional
+
+import numpy as np
+
+from game.adjudication import Adjudicator
+from game.components import Board
+from game.components import Colors
+from game.components import Dice
+from game.evaluator import flatten_weights
+from game.evaluator import NumpyEvaluator
+from game.evaluator import unflatten_weights
+from game.mutant_pool import mutant_games
+from game.parallel import MP_CONTEXT
+from game.rules import win_condition
+from game.search import ExpectimaxSearch
+from game.sprt import SPRT
+
+
+class NetworkPlayer:
+    """
+    1-ply search on a NumpyEvaluator, same moves as TDBot / HillClimberBot with plies=1
+    """
+
+    def __init__(self, weights: list[np.ndarray]):
+        self.set_weights(weights)
+
+    def set_weights(self, weights: list[np.ndarray]):
+        self.weights = weights
+        self._search = None
+
+    def __getstate__(self):
+        return {'weights': self.weights}
+
+    def __setstate__(self, state):
+        self.set_weights(state['weights'])
+
+    def find_move(self, color: str, board: Board, dice_roll: tuple[int, int]):
+        if self._search is None:
+            self._search = ExpectimaxSearch(NumpyEvaluator(self.weights))
+        return self._search.find_move(color, board, dice_roll)
+
+
+class BotPlayer:
+    """
+    <bot_type> is created with the color it plays (e.g. RandomBot, HeuristicsBot)
+    """
+
+    def __init__(self, bot_type):
+        self.bot_type = bot_type
+        self._bots = {}
+
+    def find_move(self, color: str, board: Board, dice_roll: tuple[int, int]):
+        if color not in self._bots:
+            self._bots[color] = self.bot_type(color)
+        return self._bots[color].find_a_move(board, dice_roll)
+
+
+def play_tournament_game(
+    players: dict, starting_color: str, dice: Dice, adjudicator=None
+):
+    """
+    <players> - color -> player, returns the winner, the score and
+    whether the game was ended by the <adjudicator> (see Adjudicator)
+    """
+    board = Board()
+    board.reset()
+
+    last_color = Colors.opponent(starting_color)
+    while win_condition(board, last_color) is None:
+        color_to_move = Colors.opponent(last_color)
+        if adjudicator is not None:
+            result = adjudicator(board, color_to_move)
+            if result is not None:
+                return (*result, True)
+        move = players[color_to_move].find_move(color_to_move, board, dice.throw())
+
+        # make move
+        if move:
+            for m in move:
+                board.do_single_move(m)
+
+        last_color = color_to_move
+
+    return last_color, win_condition(board, last_color), False
+
+
+def wilson_interval(successes: int, trials: int, confidence=0.95):
+    if trials == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = successes / trials
+    denominator = 1 + z**2 / trials
+    center = (p + z**2 / (2 * trials)) / denominator
+    half_width = (
+        z * math.sqrt(p * (1 - p) / trials + z**2 / (4 * trials**2)) / denominator
+    )
+    return center - half_width, center + half_width
+
+
+def ratio_interval(scores: np.ndarray, opponent_scores: np.ndarray, confidence=0.95):
+    """
+    interval of sum(scores) / sum(opponent_scores) by the delta method,
+    <scores> are per independent unit (pair of games)
+    """
+    n = len(scores)
+    if n < 2 or opponent_scores.sum() == 0:
+        return math.nan, math.nan
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    ratio = scores.sum() / opponent_scores.sum()
+    residuals = scores - ratio * opponent_scores
+    std = np.std(residuals, ddof=1) / (np.mean(opponent_scores) * math.sqrt(n))
+    return ratio - z * std, ratio + z * std
+
+
+class TournamentResult(NamedTuple):
+    """
+    results of the player against the opponent, intervals are (low, high)
+    with an SPRT (see Tournament.play) also its decision (BETTER, WORSE or None)
+    and the number of games that were not needed, <adjudicated> games were
+    ended early (see Adjudicator)
+    """
+
+    games: int
+    wins: int
+    score: int
+    opponent_score: int
+    win_ratio: float
+    win_ratio_interval: tuple[float, float]
+    score_ratio: float
+    score_ratio_interval: tuple[float, float]
+    decision: Optional[str] = None
+    games_saved: int = 0
+    adjudicated: int = 0
+
+    @classmethod
+    def from_games(cls, results: list[tuple[bool, int]], confidence=0.95):
+        """
+        <results> - (player won, score of the winner) of every game, pairs are consecutive,
+        optionally followed by whether the game was adjudicated
+        """
+        won = np.array([result[0] for result in results], dtype=bool)
+        points = np.array([result[1] for result in results])
+        scores = np.where(won, points, 0)
+        opponent_scores = np.where(won, 0, points)
+
+        score, opponent_score = int(scores.sum()), int(opponent_scores.sum())
+        return cls(
+            games=len(results),
+            wins=int(won.sum()),
+            score=score,
+            opponent_score=opponent_score,
+            win_ratio=float(won.mean()) if len(results) else 0.0,
+            win_ratio_interval=wilson_interval(
+                int(won.sum()), len(results), confidence
+            ),
+            # same as the old test_against_bot when the opponent did not score
+            score_ratio=score / opponent_score if opponent_score else float(score),
+            score_ratio_interval=ratio_interval(
+                scores.reshape(-1, 2).sum(axis=1),
+                opponent_scores.reshape(-1, 2).sum(axis=1),
+                confidence,
+            ),
+            adjudicated=sum(bool(result[2]) for result in results if len(result) > 2),
+        )
+
+
+_WORKER_PLAYERS = None
+# shared weights of the player, their shapes and the version the player has
+_WORKER_WEIGHTS = None
+
+
+def _init_tournament_worker(player, opponent, shared_weights, shapes):
+    global _WORKER_PLAYERS
+    global _WORKER_WEIGHTS
+    _WORKER_PLAYERS = (player, opponent)
+    _WORKER_WEIGHTS = [shared_weights, shapes, 0]
+
+
+def _play_paired_game(
+    players, other_opponent, adjudicator, player_color, starting_color, seed
+):
+    player, opponent = players
+    if other_opponent is not None:
+        opponent = other_opponent
+    winner, score, adjudicated = play_tournament_game(
+        {player_color: player, Colors.opponent(player_color): opponent},
+        starting_color,
+        Dice(seed=seed),
+        adjudicator,
+    )
+    return winner == player_color, score, adjudicated
+
+
+def _play_tournament_game(weights_version, *task):
+    shared_weights, shapes, version = _WORKER_WEIGHTS
+    if weights_version != version:
+        flat = np.frombuffer(shared_weights.get_obj(), dtype=np.float32).copy()
+        _WORKER_PLAYERS[0].set_weights(unflatten_weights(flat, shapes))
+        _WORKER_WEIGHTS[2] = weights_version
+    return _play_paired_game(_WORKER_PLAYERS, *task)
+
+
+class Tournament:
+    """
+    paired games between <player> and <opponent> (NetworkPlayer, BotPlayer)
+    played by a persistent pool of <num_workers> processes (cpu count if None),
+    with num_workers=0 games are played in this process. call close() when done
+
+    new weights of a NetworkPlayer (see play) are copied to shared memory once
+    and every worker loads them before its first game with them
+    """
+
+    def __init__(self, player, opponent, num_workers=None):
+        self.num_workers = (
+            MP_CONTEXT.cpu_count() if num_workers is None else num_workers
+        )
+        self._players = (player, opponent)
+        self._pool = None
+        self._shared_weights = None
+        self._weights_version = 0
+        if self.num_workers:
+            shapes = None
+            if isinstance(player, NetworkPlayer):
+                shapes = [np.shape(w) for w in player.weights]
+                self._shared_weights = MP_CONTEXT.Array(
+                    'f', sum(int(np.prod(shape)) for shape in shapes)
+                )
+            self._pool = MP_CONTEXT.Pool(
+                processes=self.num_workers,
+                initializer=_init_tournament_worker,
+                initargs=(*self._players, self._shared_weights, shapes),
+            )
+
+    def _set_weights(self, weights: list[np.ndarray]):
+        if self._pool is None:
+            self._players[0].set_weights(weights)
+            return
+        if self._shared_weights is None:
+            raise ValueError('Only the weights of a NetworkPlayer can be replaced')
+        # no games are running between calls of play
+        np.frombuffer(self._shared_weights.get_obj(), dtype=np.float32)[:] = (
+            flatten_weights(weights)
+        )
+        self._weights_version += 1
+
+    def play(
+        self,
+        num_pairs: int,
+        weights: Optional[list[np.ndarray]] = None,
+        opponent=None,
+        seed=None,
+        confidence=0.95,
+        sprt: Optional[SPRT] = None,
+        batch_pairs=None,
+        adjudicator: Optional[Adjudicator] = None,
+    ) -> TournamentResult:
+        """
+        <weights> replace the weights of the player (a NetworkPlayer) from now on,
+        <opponent> is played instead of the preloaded one in these games only
+        (a BotPlayer is cheap to send with every game)
+
+        with an <sprt> at most <num_pairs> pairs are played in batches of <batch_pairs>
+        (one per worker if None) until the test decides
+
+        with an <adjudicator> games are ended as soon as their outcome is (nearly) certain
+        """
+        if weights is not None:
+            self._set_weights(weights)
+        tasks = [
+            (opponent, adjudicator, player_color, starting_color, game_seed)
+            for player_color, starting_color, game_seed in mutant_games(
+                num_pairs, random.Random(seed)
+            )
+        ]
+        if sprt is None:
+            return TournamentResult.from_games(self._play(tasks), confidence)
+
+        batch_size = 2 * (batch_pairs or max(1, self.num_workers))
+        results = []
+        decision = None
+        for start in range(0, len(tasks), batch_size):
+            results.extend(self._play(tasks[start : start + batch_size]))
+            wins = sum(result[0] for result in results)
+            decision = sprt.decision(wins, len(results) - wins)
+            if decision is not None:
+                break
+
+        return TournamentResult.from_games(results, confidence)._replace(
+            decision=decision, games_saved=len(tasks) - len(results)
+        )
+
+    def _play(self, tasks):
+        if self._pool is not None:
+            return self._pool.starmap(
+                _play_tournament_game,
+                [(self._weights_version, *task) for task in tasks],
+            )
+        return [_play_paired_game(self._players, *task) for task in tasks]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
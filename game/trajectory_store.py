@@ -0,0 +1,293 @@
+"""
+append-only on-disk store of played games
+
+a store is a folder with fixed-width binary files:
+    moves.bin - one MOVE_DTYPE record per turn (position before the move, dice, move)
+    games.bin - one GAME_DTYPE record per game (first move record, number of moves, outcome)
+    features.bin - optional, encoded position before the move as float32 rows
+
+records of a game are appended when the game ends and its games.bin record is
+written last, so a crashed writer never leaves a half written game behind
+(stray move records after the last game are ignored by the reader,
+a new writer cuts them off together with a torn trailing games.bin record)
+
+readers memory-map the files, slices of games are NumPy views, not copies.
+there can only be one writer per store at a time
+"""
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from game.components import Board
+from game.components import Colors
+from game.components import convert_coordinates
+from game.components import MAX_POSITION
+from game.components import SingleMove
+
+MAX_SINGLE_MOVES = 4
+
+# colors are stored as their index in Colors.colors
+MOVE_DTYPE = np.dtype(
+    [
+        ('game', '<u4'),
+        ('turn', 'u1'),
+        # checkers on points 1-24 in white coordinates, white positive, black negative
+        ('points', 'i1', (MAX_POSITION,)),
+        # checkers in the white and black trays
+        ('tray', 'u1', (2,)),
+        ('dice', 'u1', (2,)),
+        # (from, to) in the coordinates of the color to move, padded with zeros
+        ('move', 'u1', (MAX_SINGLE_MOVES, 2)),
+        ('move_length', 'u1'),
+    ]
+)
+
+GAME_DTYPE = np.dtype(
+    [
+        ('first_move', '<u8'),
+        ('num_moves', '<u4'),
+        ('winner', 'u1'),
+        ('score', 'u1'),
+    ]
+)
+
+# index of black's point for every white point
+_BLACK_POINTS = np.array([convert_coordinates(p) - 1 for p in Board.BOARD_POINTS])
+
+MOVES_FILE = 'moves.bin'
+GAMES_FILE = 'games.bin'
+FEATURES_FILE = 'features.bin'
+
+
+def pack_board(board: Board) -> tuple[np.ndarray, np.ndarray]:
+    white = board.checker_counts(Colors.WHITE)
+    black = board.checker_counts(Colors.BLACK)
+    points = white[:MAX_POSITION] - black[_BLACK_POINTS]
+    tray = np.array([white[MAX_POSITION], black[MAX_POSITION]])
+    return points.astype(np.int8), tray.astype(np.uint8)
+
+
+def unpack_board(points: np.ndarray, tray: np.ndarray) -> Board:
+    position = []
+    for i, n in enumerate(points):
+        if n > 0:
+            position.append(f'{i + 1}[W{n}]')
+        elif n < 0:
+            position.append(f'{i + 1}[B{-n}]')
+    if tray[0]:
+        position.append(f'{MAX_POSITION + 1}[W{tray[0]}]')
+    if tray[1]:
+        position.append(f'0[B{tray[1]}]')
+    return Board.generate_from_position(position)
+
+
+def unpack_move(record: np.void) -> Optional[list[SingleMove]]:
+    if record['move_length'] == 0:
+        return None
+    color = Colors.colors[record['turn']]
+    return [
+        SingleMove(color, int(position_from), int(position_to))
+        for position_from, position_to in record['move'][: record['move_length']]
+    ]
+
+
+def pack_move(
+    board: Board,
+    color: str,
+    dice_roll: tuple[int, int],
+    move: Optional[list[SingleMove]],
+) -> np.ndarray:
+    record = np.zeros((), dtype=MOVE_DTYPE)
+    record['turn'] = Colors.colors.index(color)
+    record['points'], record['tray'] = pack_board(board)
+    record['dice'] = dice_roll
+    if move:
+        record['move'][: len(move)] = [(m.position_from, m.position_to) for m in move]
+        record['move_length'] = len(move)
+    return record
+
+
+class GameRecorder:
+    """
+    same interface as TrajectoryWriter for a single game kept in memory,
+    it can be sent between processes and written with TrajectoryWriter.add_game
+    """
+
+    def __init__(self):
+        self.moves = []
+        self.winner = None
+        self.score = None
+
+    def record(
+        self,
+        board: Board,
+        color: str,
+        dice_roll: tuple[int, int],
+        move: Optional[list[SingleMove]],
+    ):
+        self.moves.append(pack_move(board, color, dice_roll, move))
+
+    def end_game(self, winner: str, score: int):
+        self.winner = winner
+        self.score = score
+
+
+class TrajectoryWriter:
+    """
+    moves are buffered with record() and written to the store at <path> by end_game(),
+    with <features> the encoded positions are stored as well
+    """
+
+    def __init__(self, path, features=False):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.features = features
+
+        # a previous writer may have died in the middle of a game or its record
+        num_games, num_moves = TrajectoryStore.committed_size(self.path)
+        has_features = (self.path / FEATURES_FILE).exists()
+        if num_moves and has_features != features:
+            raise ValueError(
+                f'Store {self.path} was written {"with" if has_features else "without"} features'
+            )
+        self._truncate(GAMES_FILE, num_games * GAME_DTYPE.itemsize)
+        self._truncate(MOVES_FILE, num_moves * MOVE_DTYPE.itemsize)
+        if features:
+            self._truncate(
+                FEATURES_FILE, num_moves * Board.encode_shape[0] * np.float32().itemsize
+            )
+
+        self.num_games = num_games
+        self.num_moves = num_moves
+        self._moves = []
+        self._features = []
+
+    def _truncate(self, name, size):
+        file_path = self.path / name
+        if file_path.exists() and file_path.stat().st_size > size:
+            with open(file_path, 'r+b') as f:
+                f.truncate(size)
+
+    def record(
+        self,
+        board: Board,
+        color: str,
+        dice_roll: tuple[int, int],
+        move: Optional[list[SingleMove]],
+    ):
+        """
+        <board> is the position before the <move> of <color>
+        """
+        self._moves.append(pack_move(board, color, dice_roll, move))
+        if self.features:
+            self._features.append(board.encode(color).astype(np.float32))
+
+    def add_game(self, recorder: GameRecorder):
+        """
+        writes a game recorded elsewhere (e.g. in a worker process)
+        """
+        self._moves = list(recorder.moves)
+        if self.features:
+            self._features = [
+                unpack_board(r['points'], r['tray']).encode(Colors.colors[r['turn']])
+                for r in recorder.moves
+            ]
+        self.end_game(recorder.winner, recorder.score)
+
+    def end_game(self, winner: str, score: int):
+        moves = np.array(self._moves, dtype=MOVE_DTYPE)
+        moves['game'] = self.num_games
+        with open(self.path / MOVES_FILE, 'ab') as f:
+            f.write(moves.tobytes())
+        if self.features:
+            with open(self.path / FEATURES_FILE, 'ab') as f:
+                f.write(np.array(self._features, dtype=np.float32).tobytes())
+
+        game = np.array(
+            [(self.num_moves, len(moves), Colors.colors.index(winner), score)],
+            dtype=GAME_DTYPE,
+        )
+        with open(self.path / GAMES_FILE, 'ab') as f:
+            f.write(game.tobytes())
+
+        self.num_games += 1
+        self.num_moves += len(moves)
+        self._moves = []
+        self._features = []
+
+    def discard_game(self):
+        self._moves = []
+        self._features = []
+
+
+class TrajectoryStore:
+    """
+    memory-mapped reader, games written after it was opened are not seen
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        num_games, num_moves = self.committed_size(self.path)
+        self.games = self._map(GAMES_FILE, GAME_DTYPE, (num_games,))
+        self.moves = self._map(MOVES_FILE, MOVE_DTYPE, (num_moves,))
+        self.features = None
+        if (self.path / FEATURES_FILE).exists():
+            self.features = self._map(
+                FEATURES_FILE, np.float32, (num_moves, Board.encode_shape[0])
+            )
+
+    @staticmethod
+    def committed_size(path: Path) -> tuple[int, int]:
+        """
+        number of complete games and their moves in the store
+        """
+        games_path = path / GAMES_FILE
+        if not games_path.exists():
+            return 0, 0
+        num_games = games_path.stat().st_size // GAME_DTYPE.itemsize
+        if num_games == 0:
+            return 0, 0
+        last = np.fromfile(
+            games_path,
+            dtype=GAME_DTYPE,
+            count=1,
+            offset=(num_games - 1) * GAME_DTYPE.itemsize,
+        )[0]
+        return num_games, int(last['first_move'] + last['num_moves'])
+
+    def _map(self, name, dtype, shape):
+        if shape[0] == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self.path / name, dtype=dtype, mode='r', shape=shape)
+
+    def __len__(self):
+        return len(self.games)
+
+    def _move_range(self, start: int, stop: int) -> slice:
+        games = self.games[start:stop]
+        if len(games) == 0:
+            return slice(0, 0)
+        return slice(
+            int(games[0]['first_move']),
+            int(games[-1]['first_move'] + games[-1]['num_moves']),
+        )
+
+    def game_moves(self, start: int, stop: Optional[int] = None) -> np.ndarray:
+        """
+        move records of games <start> to <stop> (exclusive, one game if not given)
+        """
+        stop = start + 1 if stop is None else stop
+        return self.moves[self._move_range(start, stop)]
+
+    def game_features(self, start: int, stop: Optional[int] = None) -> np.ndarray:
+        if self.features is None:
+            raise ValueError(f'Store {self.path} has no encoded features')
+        stop = start + 1 if stop is None else stop
+        return self.features[self._move_range(start, stop)]
+
+    def boards(self, game: int) -> list[Board]:
+        """
+        positions before every move of the <game>
+        """
+        return [unpack_board(r['points'], r['tray']) for r in self.game_moves(game)]
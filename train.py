@@ -1,44 +1,139 @@
-import multiprocessing as mp
 import time
-from collections import defaultdict
+from contextlib import nullcontext
 from timeit import default_timer as timer
 
-from game.bot import Bot
-from game.bot import heuristics_eval_func
-from game.bot import random_eval_func
+import tensorflow as tf
+
+from game import rules
+from game.bot import HeuristicsBot
+from game.bot import RandomBot
 from game.components import Board
 from game.components import Colors
-from game.match import play_match
+from game.np_td_model import NumpyTDModel
+from game.profiling import PhaseProfiler
 from game.rules import find_complete_legal_moves
 from game.td_model import TDNardiModel
+from game.telemetry import Telemetry
+from game.tournament import BotPlayer
+from game.tournament import Tournament
 
 
-def compare_bots(num_games=10):
-    NUM_CORE = 10
-
-    scores = defaultdict(int)
-
-    bot_a = Bot(Colors.WHITE, eval_func=random_eval_func)
-    bot_b = Bot(Colors.BLACK, eval_func=heuristics_eval_func)
-
+def compare_bots(num_games=10, num_workers=None, sprt=None):
+    """
+    RandomBot against HeuristicsBot, <num_games> pairs of games (see Tournament),
+    with an <sprt> (see game.sprt) games stop once the test decides
+    """
     start_time = time.time()
-    with mp.Pool(processes=NUM_CORE) as pool:
-        results = pool.starmap(
-            play_match, ((bot_a, bot_b, False) for _ in range(num_games))
-        )
+    with Tournament(
+        BotPlayer(RandomBot), BotPlayer(HeuristicsBot), num_workers
+    ) as tournament:
+        result = tournament.play(num_games, sprt=sprt)
 
     elapsed_time = time.time() - start_time
     print(f'total time: {elapsed_time / 60} min')
 
-    for r in results:
-        _, game_result = r
-        scores[game_result['winner']] += game_result['score']
+    scores = {
+        RandomBot.__name__: result.score,
+        HeuristicsBot.__name__: result.opponent_score,
+    }
     print(scores)
+    if sprt is not None:
+        print(
+            f'SPRT: RandomBot is {result.decision or "undecided"} after {result.games} games, '
+            f'{result.games_saved} games saved'
+        )
+    return result
 
 
 def train(num_games=1):
     model = TDNardiModel()
     model.train(num_games, restore=True)
+    model.close()
+
+
+def training_throughput(num_games=5):
+    """
+    moves per second of TD(lambda) training with keras and NumPy backends,
+    models start from scratch and nothing is saved
+    """
+    keras_model = TDNardiModel()
+    numpy_model = NumpyTDModel()
+    numpy_model.set_weights(keras_model.model.get_weights())
+
+    for name, run, model in [
+        (
+            'keras',
+            lambda: keras_model.train(
+                num_games, restore=False, test_every=None, backup=False
+            ),
+            keras_model,
+        ),
+        (
+            'numpy',
+            lambda: numpy_model.train(num_games, restore=False, backup=False),
+            numpy_model,
+        ),
+    ]:
+        start = timer()
+        run()
+        elapsed = timer() - start
+        moves = int(model.total_moves_played)
+        print(f'{name}: {moves} moves in {elapsed:.1f}s, {moves / elapsed:.1f} moves/s')
+
+
+def _training_phases(model: TDNardiModel):
+    return [
+        (rules, 'find_complete_legal_moves', 'move_generation'),
+        (Board, 'copy_board', 'board_copy'),
+        (Board, 'generate_from_position', 'board_copy'),
+        (Board, 'encode', 'encoding'),
+        (model.search, '_evaluator', 'inference'),
+        (model, 'update', 'td_update'),
+        (model, 'update_fused', 'td_update'),
+        (model.telemetry, 'observe', 'logging'),
+        (model.telemetry, 'count', 'logging'),
+        (model.telemetry, 'gauge', 'logging'),
+        (model.telemetry, 'histogram', 'logging'),
+        (model.telemetry, 'flush', 'logging'),
+    ]
+
+
+def training_benchmark(num_games=10, seed=1):
+    """
+    <num_games> self-play games of TDNardiModel.train with seeded dice, starting colors
+    and initial weights, so the numbers are comparable between versions of the code
+
+    games are played twice, without instrumentation for games/s and moves/s
+    and with a PhaseProfiler for the split of the time between phases
+    (move generation, board copying, encoding, inference, TD update, logging)
+    nothing is saved and telemetry is kept in memory
+    """
+
+    def _run(profiler=None):
+        tf.keras.utils.set_random_seed(seed)
+        model = TDNardiModel()
+        model.telemetry = Telemetry(step=lambda: int(model.total_moves_played))
+        targets = _training_phases(model) if profiler is not None else []
+
+        start = timer()
+        with profiler.instrument(targets) if profiler is not None else nullcontext():
+            model.train(
+                num_games, restore=False, test_every=None, backup=False, seed=seed
+            )
+        return model, timer() - start
+
+    model, elapsed = _run()
+    moves = int(model.total_moves_played)
+    print(
+        f'{num_games} games, {moves} moves in {elapsed:.1f}s: '
+        f'{num_games / elapsed:.3f} games/s, {moves / elapsed:.1f} moves/s'
+    )
+
+    profiler = PhaseProfiler()
+    _, profiled_elapsed = _run(profiler)
+    print(f'time split (instrumented run, {profiled_elapsed:.1f}s):')
+    print(profiler.report())
+    return profiler
 
 
 def double_benchmark():
@@ -84,6 +179,8 @@ if __name__ == '__main__':
     train(5000)
 
     # benchmark(double_benchmark)
+    # training_throughput()
+    # training_benchmark()
     #
     # board = Board()
     #